@@ -12,9 +12,13 @@ from datetime import date, timedelta
 # ==============================================================================
 import pandas as pd
 from datetime import timedelta
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
-from core.models import Collaborateur, Anomalie, Direction, Departement
+from core.models import AnomalyDailyStat, Collaborateur, Anomalie, Direction, Departement
+
+# Toutes les statistiques d'anomalies sont lues dans le cube AnomalyDailyStat (une ligne par
+# jour × direction × département × type, tenu à jour par l'import) : le coût dépend du nombre
+# de jours et de cellules, pas du nombre d'anomalies.
 
 # --- SERVICE POUR LE DASHBOARD PRINCIPAL RH (rh_dashboard.html) ---
 
@@ -24,23 +28,27 @@ def generate_rh_dashboard_stats():
     C'est la SEULE fonction à appeler pour cette page.
     """
     total_collaborateurs = Collaborateur.objects.count()
-    total_anomalies = Anomalie.objects.count()
-
-    # Agrégation par Direction
-    stats_direction = list(Anomalie.objects
-        .values('pointage__direction__nom')  # On groupe par le nom de la direction
-        .annotate(total=Count('id'))         # On compte les anomalies
-        .filter(total__gt=0)                 # On exclut les directions sans anomalies
-        .order_by('-total')                  # On trie par le plus grand nombre
-    )
+    total_anomalies = AnomalyDailyStat.objects.aggregate(total=Sum('count'))['total'] or 0
+
+    # Agrégation par Direction (clés historiques "pointage__..." lues par le template)
+    stats_direction = [
+        {'pointage__direction__nom': row['direction__nom'], 'total': row['total']}
+        for row in AnomalyDailyStat.objects
+        .values('direction__nom')             # On groupe par le nom de la direction
+        .annotate(total=Sum('count'))         # On cumule les anomalies
+        .filter(total__gt=0)                  # On exclut les directions sans anomalies
+        .order_by('-total')                   # On trie par le plus grand nombre
+    ]
 
     # Agrégation par Département (Top 5)
-    stats_departement = list(Anomalie.objects
-        .values('pointage__departement__nom') # On groupe par le nom du département
-        .annotate(total=Count('id'))
+    stats_departement = [
+        {'pointage__departement__nom': row['departement__nom'], 'total': row['total']}
+        for row in AnomalyDailyStat.objects
+        .values('departement__nom')           # On groupe par le nom du département
+        .annotate(total=Sum('count'))
         .filter(total__gt=0)
         .order_by('-total')[:5]               # On ne garde que les 5 premiers
-    )
+    ]
     
     return {
         "total_collaborateurs": total_collaborateurs,
@@ -68,27 +76,30 @@ def generate_performance_dashboard_stats():
     end_date_previous = start_date_current - timedelta(days=1)
     start_date_previous = end_date_previous - timedelta(days=29)
 
-    def get_timeseries_data(qs_base):
-        # MODIFIÉ : On filtre sur `pointage__date` qui est la date de l'événement.
-        timeseries = (qs_base
-            .filter(pointage__date__range=[start_date_current, end_date_current])
-            .values('pointage__date')
-            .annotate(y=Count('id'))
-            .order_by('pointage__date')
+    def daily_counts(field):
+        """Une requête sur le cube : anomalies par (clé, jour) sur les deux périodes."""
+        rows = (AnomalyDailyStat.objects
+            .filter(date__range=[start_date_previous, end_date_current], **{f'{field}__isnull': False})
+            .values(field, 'date')
+            .annotate(y=Sum('count'))
+            .order_by()
         )
-        df = pd.DataFrame(list(timeseries))
-        if not df.empty:
-            df['pointage__date'] = pd.to_datetime(df['pointage__date'])
-            df = df.set_index('pointage__date').rename(columns={'pointage__date': 'ds'})
+        df = pd.DataFrame(list(rows), columns=[field, 'date', 'y'])
+        df['date'] = pd.to_datetime(df['date'])
+        return {key: group.set_index('date')['y'].sort_index() for key, group in df.groupby(field)}
+
+    def get_timeseries_data(series):
+        # MODIFIÉ : On filtre sur la date du pointage, qui est la date de l'événement.
+        current = series[str(start_date_current):str(end_date_current)]
+        if not current.empty:
             date_range = pd.date_range(start=start_date_current, end=end_date_current, freq='D')
-            df = df.reindex(date_range, fill_value=0)
-            return {'ds': df.index.strftime('%Y-%m-%d').tolist(), 'y': df['y'].tolist()}
+            current = current.reindex(date_range, fill_value=0)
+            return {'ds': current.index.strftime('%Y-%m-%d').tolist(), 'y': [int(y) for y in current]}
         return {'ds': [], 'y': []}
 
-    def calculate_kpis(qs_base):
-        # MODIFIÉ : On filtre sur `pointage__date` pour des calculs précis.
-        current_count = qs_base.filter(pointage__date__range=[start_date_current, end_date_current]).count()
-        previous_count = qs_base.filter(pointage__date__range=[start_date_previous, end_date_previous]).count()
+    def calculate_kpis(series):
+        current_count = int(series[str(start_date_current):str(end_date_current)].sum())
+        previous_count = int(series[str(start_date_previous):str(end_date_previous)].sum())
         
         if previous_count > 0:
             trend = round(((current_count - previous_count) / previous_count) * 100, 1)
@@ -104,24 +115,24 @@ def generate_performance_dashboard_stats():
         }
 
     direction_stats = []
+    by_direction = daily_counts('direction_id')
     for direction in Direction.objects.all().order_by('nom'):
-        qs_base = Anomalie.objects.filter(pointage__direction=direction)
         # On ne calcule que s'il y a des anomalies dans les deux périodes concernées
-        if qs_base.filter(pointage__date__range=[start_date_previous, end_date_current]).exists():
+        if direction.id in by_direction:
             direction_stats.append({
                 'name': direction.nom,
-                'kpis': calculate_kpis(qs_base),
-                'timeseries': get_timeseries_data(qs_base)
+                'kpis': calculate_kpis(by_direction[direction.id]),
+                'timeseries': get_timeseries_data(by_direction[direction.id])
             })
 
     departement_stats = []
+    by_departement = daily_counts('departement_id')
     for departement in Departement.objects.all().order_by('nom'):
-        qs_base = Anomalie.objects.filter(pointage__departement=departement)
-        if qs_base.filter(pointage__date__range=[start_date_previous, end_date_current]).exists():
+        if departement.id in by_departement:
              departement_stats.append({
                 'name': departement.nom,
-                'kpis': calculate_kpis(qs_base),
-                'timeseries': get_timeseries_data(qs_base)
+                'kpis': calculate_kpis(by_departement[departement.id]),
+                'timeseries': get_timeseries_data(by_departement[departement.id])
             })
 
     return {
@@ -135,14 +146,14 @@ def generate_performance_dashboard_stats():
 
 # --- FONCTIONS POUR L'ANALYSE TEMPORELLE (analytics/dashboard) ---
 def anomalies_timeseries(level="global", key_id=None, freq="W"):
-    qs = Anomalie.objects.all()
-    if level == "direction" and key_id: qs = qs.filter(pointage__direction_id=key_id)
-    elif level == "departement" and key_id: qs = qs.filter(pointage__departement_id=key_id)
+    qs = AnomalyDailyStat.objects.all()
+    if level == "direction" and key_id: qs = qs.filter(direction_id=key_id)
+    elif level == "departement" and key_id: qs = qs.filter(departement_id=key_id)
     
-    df = pd.DataFrame(list(qs.values("pointage__date").annotate(n=Count("id")).order_by("pointage__date")))
+    df = pd.DataFrame(list(qs.values("date").annotate(n=Sum("count")).order_by("date")))
     if df.empty: return pd.DataFrame(columns=["ds", "y"])
     
-    df = df.rename(columns={"pointage__date": "ds", "n": "y"})
+    df = df.rename(columns={"date": "ds", "n": "y"})
     df['ds'] = pd.to_datetime(df['ds'])
     series = df.set_index("ds")["y"].resample(freq).sum().fillna(0)
     return series.reset_index()
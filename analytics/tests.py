@@ -5,6 +5,7 @@
 from django.test import TestCase
 from datetime import date
 from core.models import Direction, Departement, Collaborateur, Pointage, Anomalie
+from core.utils.cube import rebuild_cube
 from .services import generate_rh_dashboard_stats, generate_performance_dashboard_stats
 
 class AnalyticsServicesTestCase(TestCase):
@@ -44,6 +45,9 @@ class AnalyticsServicesTestCase(TestCase):
         # Période précédente (Novembre) : 1 anomalie pour Corporate
         Anomalie.objects.create(pointage=p4, type=Anomalie.LATE, detail="Test")
 
+        # Les statistiques sont lues dans le cube : les anomalies créées directement y sont agrégées
+        rebuild_cube()
+
     def test_generate_rh_dashboard_stats(self):
         """Test unitaire : Vérifie les calculs globaux du dashboard RH."""
         print("Test : Calculs du Dashboard RH")
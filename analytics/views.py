@@ -5,6 +5,7 @@ from django.http import JsonResponse
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from core.models import Direction, Departement, Collaborateur, Anomalie
+from core.utils.dimensions import dimension_cache
 
 # --- IMPORT CORRIGÉ ---
 # On n'importe que les fonctions "chef d'orchestre"
@@ -18,11 +19,11 @@ from core.models import Direction, Departement, Collaborateur, Anomalie
 def dashboard(request):
     """Affiche la page principale du dashboard d'analyse."""
 
-    # La conversion des QuerySets en listes de dictionnaires est la solution.
-    # On sélectionne uniquement les champs 'id' et 'nom' qui sont nécessaires
-    # pour le JavaScript du dashboard. C'est plus performant.
-    directions_list = list(Direction.objects.values('id', 'nom'))
-    departements_list = list(Departement.objects.values('id', 'nom'))
+    # Listes de dictionnaires (id, nom) pour le JavaScript du dashboard, servies par le cache
+    # de dimensions du processus : aucune requête tant qu'aucune dimension n'a changé.
+    dimensions = dimension_cache.dimensions()
+    directions_list = dimensions.direction_list
+    departements_list = dimensions.departement_list
 
     context = {
         # On passe les listes au lieu des QuerySets
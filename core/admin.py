@@ -1,3 +1,32 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AnomalyRule, ImportBatch, QuarantinedRow
+from .tasks import reprocess_quarantine_task
+
+
+@admin.register(ImportBatch)
+class ImportBatchAdmin(admin.ModelAdmin):
+    list_display = ("filename", "created_at", "uploaded_by", "status", "rows_committed", "rows_quarantined")
+    list_filter = ("status", "lenient")
+    search_fields = ("filename", "checksum")
+    readonly_fields = ("metrics",)
+    actions = ["reprocess_quarantine"]
+
+    @admin.action(description="Re-traiter les lignes en quarantaine")
+    def reprocess_quarantine(self, request, queryset):
+        for batch in queryset.filter(quarantine__isnull=False).distinct():
+            reprocess_quarantine_task.delay(str(batch.id))
+
+
+@admin.register(QuarantinedRow)
+class QuarantinedRowAdmin(admin.ModelAdmin):
+    list_display = ("batch", "member", "line", "__str__", "updated_at")
+    list_filter = ("batch",)
+    search_fields = ("raw__MATRICULE",)
+
+
+@admin.register(AnomalyRule)
+class AnomalyRuleAdmin(admin.ModelAdmin):
+    list_display = ("type", "threshold_minutes", "direction", "departement", "enabled", "updated_at")
+    list_filter = ("type", "enabled", "direction")
+    list_editable = ("threshold_minutes", "enabled")
@@ -1,6 +1,7 @@
 # core/apps.py
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.conf import settings
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -10,6 +11,25 @@ class CoreConfig(AppConfig):
         # Connecte le signal post_migrate pour créer les groupes et permissions
         post_migrate.connect(create_default_groups, sender=self)
 
+        # Toute écriture sur une dimension invalide le cache de dimensions (core.utils.dimensions)
+        from .utils.dimensions import invalidate_dimensions, invalidate_manager_email
+        for model in ("core.Direction", "core.Departement", "core.Collaborateur", settings.AUTH_USER_MODEL):
+            post_delete.connect(invalidate_dimensions, sender=model, dispatch_uid=f"dimensions-delete-{model}")
+        for model in ("core.Direction", "core.Departement", "core.Collaborateur"):
+            post_save.connect(invalidate_dimensions, sender=model, dispatch_uid=f"dimensions-save-{model}")
+        # Un utilisateur n'invalide le cache que si son email change, pas à chaque connexion (last_login)
+        post_save.connect(invalidate_manager_email, sender=settings.AUTH_USER_MODEL, dispatch_uid="dimensions-save-user")
+
+        # ... et toute écriture sur HolidayMA reconstruit le calendrier ouvré (core.utils.business_calendar)
+        from .utils.business_calendar import invalidate_calendar
+        post_save.connect(invalidate_calendar, sender="core.HolidayMA", dispatch_uid="calendar-save")
+        post_delete.connect(invalidate_calendar, sender="core.HolidayMA", dispatch_uid="calendar-delete")
+
+        # ... et les règles de détection sont recompilées quand AnomalyRule change (core.utils.rules)
+        from .utils.rules import invalidate_rules
+        post_save.connect(invalidate_rules, sender="core.AnomalyRule", dispatch_uid="rules-save")
+        post_delete.connect(invalidate_rules, sender="core.AnomalyRule", dispatch_uid="rules-delete")
+
 
 def create_default_groups(sender, **kwargs):
     """
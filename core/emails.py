@@ -6,6 +6,7 @@ from django.conf import settings
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from .models import Pointage, EmailHistory, Collaborateur
+from .utils.dimensions import dimension_cache
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +29,10 @@ def send_anomaly_notification_and_log(pointage: Pointage) -> bool:
         logger.warning(f"Envoi annulé : pas d'email pour le collaborateur {collaborateur.matricule}.")
         return False
 
-    # --- 2. Récupération des informations du Manager (INCHANGÉ) ---
-    manager_email = None
-    manager_user = None
-    try:
-        if collaborateur.departement and collaborateur.departement.manager:
-            manager_user = collaborateur.departement.manager
-            if manager_user.email:
-                manager_email = manager_user.email
-    except Exception as e:
-        logger.error(f"Erreur lors de la récupération du manager pour {collaborateur.matricule}: {e}")
+    # --- 2. Récupération des informations du Manager (cache de dimensions : aucune requête) ---
+    departement = dimension_cache.departement(collaborateur.departement_id)
+    manager_id = departement.manager_id if departement else None
+    manager_email = (departement.manager_email or None) if departement else None
 
     # --- 3. Construction du contenu de l'email (INCHANGÉ) ---
     subject = f"Anomalies de pointage - {pointage.date.strftime('%d/%m/%Y')}"
@@ -63,7 +58,7 @@ def send_anomaly_notification_and_log(pointage: Pointage) -> bool:
         # --- 6. Journalisation de l'envoi réussi (MODIFIÉ) ---
         EmailHistory.objects.create(
             collaborator=collaborateur,
-            manager=manager_user,
+            manager_id=manager_id,
             to_email=collaborateur.email,
             cc_manager=manager_email,
             subject=subject,
@@ -80,7 +75,7 @@ def send_anomaly_notification_and_log(pointage: Pointage) -> bool:
         # --- 7. Journalisation de l'échec (MODIFIÉ) ---
         EmailHistory.objects.create(
             collaborator=collaborateur,
-            manager=manager_user,
+            manager_id=manager_id,
             to_email=collaborateur.email,
             cc_manager=manager_email,
             subject=subject,
@@ -3,6 +3,12 @@
 # ==============================================================================
 from django import forms
 
+from .models import ImportBatch
+from .utils.parsing import DAY_COLUMNS
+from .utils.sources import UnsupportedFormat, detect_format, source_columns
+from .utils.staging import file_checksum
+from .utils.validation import validate_rows
+
 # Les en-têtes requis ne changent pas
 REQUIRED_HEADERS = [
     "MATRICULE", "NOM", "PRENOM", "Date", "Entrée", "Sortie",
@@ -15,30 +21,91 @@ REQUIRED_HEADERS = [
 
 class CSVUploadForm(forms.Form):
     file = forms.FileField(
-        label="Sélectionnez votre rapport de présence (CSV)",
+        label="Sélectionnez votre rapport de présence (CSV, Excel, Parquet ou Arrow)",
         widget=forms.FileInput(attrs={'class': 'form-control'})
     )
     
-    # La case à cocher a été supprimée, ce champ n'existe plus.
+    # Un fichier identique (même checksum) à un import précédent n'est réimporté que sur demande.
+    force = forms.BooleanField(required=False, label="Forcer la réimportation")
+    # Mode tolérant : les lignes invalides sont mises en quarantaine, le reste est importé.
+    lenient = forms.BooleanField(required=False, label="Mettre les lignes invalides en quarantaine")
 
     def clean_file(self):
         f = self.cleaned_data.get("file")
         if not f:
             raise forms.ValidationError("Aucun fichier sélectionné.")
-        
-        try:
-            # lecture rapide des en-têtes pour validation
-            head = f.read(4096).decode('utf-8-sig', errors="ignore").splitlines()[0]
-            f.seek(0) # Très important de rembobiner le fichier après lecture
-            
-            missing_headers = [h for h in REQUIRED_HEADERS if h not in head]
-            if missing_headers:
-                raise forms.ValidationError(f"Colonne(s) manquante(s) dans le CSV : {', '.join(missing_headers)}")
-        
-        except Exception:
-            raise forms.ValidationError("Impossible de lire le fichier. Assurez-vous qu'il est au format CSV et encodé en UTF-8.")
-            
+        validate_source(f, f.name)
         return f
+
+    # Lot déjà importé depuis un fichier identique (sans « forcer ») : la vue y renvoie directement.
+    previous = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        f = cleaned_data.get("file")
+        if f and not self.errors:
+            # Doublon d'abord : le checksum (une lecture séquentielle) coûte bien moins que la validation
+            if not cleaned_data.get("force"):
+                self.previous = ImportBatch.find_upload(file_checksum(f))
+                if self.previous:
+                    return cleaned_data
+            # Passe complète sur le fichier (types et bornes) : un fichier invalide est refusé ici,
+            # avant d'occuper un worker. Le résumé est affiché après la mise en file.
+            self.summary = validate_content(f, f.name, cleaned_data.get("lenient"))
+        return cleaned_data
+
+
+class DayUploadForm(forms.Form):
+    """Fichier de congés ou de télétravail planifié (voir core.utils.day_import)."""
+    file = forms.FileField(label="Fichier de congés ou de télétravail (CSV, Excel, Parquet ou Arrow)")
+
+    def clean_file(self):
+        f = self.cleaned_data["file"]
+        validate_source(f, f.name, DAY_COLUMNS)
+        return f
+
+
+def validate_source(f, filename, required_headers=REQUIRED_HEADERS):
+    """
+    Vérifie le format et les en-têtes d'un fichier d'import (lève ValidationError). Utilisé par
+    CSVUploadForm et par l'upload reprenable, une fois le fichier assemblé, ainsi que par
+    DayUploadForm avec ses propres colonnes.
+    """
+    try:
+        # lecture rapide des en-têtes (ou du schéma Parquet/Arrow) pour validation ; le fichier est rembobiné
+        # (compressé : seul le début du flux décompressé est lu ; zip : chaque CSV de l'archive)
+        headers = source_columns(f, *detect_format(filename))
+    except UnsupportedFormat as e:
+        raise forms.ValidationError(str(e))
+    except Exception:
+        raise forms.ValidationError(
+            "Impossible de lire le fichier. Assurez-vous qu'il est au format CSV (UTF-8, éventuellement "
+            "compressé .gz/.zst/.zip), Excel (.xlsx), Parquet ou Arrow."
+        )
+
+    if not headers:
+        raise forms.ValidationError("L'archive ne contient aucun fichier CSV.")
+    for name, columns in headers:
+        missing_headers = [h for h in required_headers if h not in columns]
+        if missing_headers:
+            where = f" « {name} »" if len(headers) > 1 else ""
+            raise forms.ValidationError(f"Colonne(s) manquante(s) dans le fichier{where} : {', '.join(missing_headers)}")
+
+def validate_content(f, filename, lenient=False):
+    """
+    Vérifie chaque ligne du fichier (voir validate_rows) et retourne le résumé. En mode strict,
+    un fichier contenant des erreurs est refusé (ValidationError avec quelques exemples) ; en
+    mode tolérant, ces lignes iront en quarantaine.
+    """
+    summary = validate_rows(f, *detect_format(filename))
+    if not summary.ok and not lenient:
+        examples = [str(e) for e in summary.errors[:5]]
+        raise forms.ValidationError(
+            [f"Fichier refusé : {summary}."] + examples
+            + ["Corrigez le fichier ou cochez « Mettre les lignes invalides en quarantaine »."]
+        )
+    return summary
+
 # Formulaire pour filtrer l'historique des emails/anomalies (inchangé)
 class HistoriqueFilterForm(forms.Form):
     start_date = forms.DateField(
@@ -0,0 +1,203 @@
+# ==============================================================================
+# FICHIER : core/management/commands/explain_hot_queries.py
+# ==============================================================================
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from core.models import (
+    Anomalie, AnomalyDailyStat, Collaborateur, Departement, Direction, EmailHistory, Pointage,
+)
+from core.utils.cube import CUBE_KEYS, rebuild_cube
+from core.views import ANOMALY_PAGE_SIZE, day_range, filter_anomaly_pointages
+
+# Pointages écrits par transaction lors de la génération du jeu synthétique
+GENERATE_CHUNK_SIZE = 50_000
+# Part des pointages synthétiques anormaux, puis part de ceux-ci ayant donné lieu à un email
+ANOMALY_RATE = 0.2
+EMAIL_RATE = 0.1
+
+
+def generate_dataset(rows, collaborateurs=2000, directions=8, departements=6, last_day=date(2024, 12, 31), seed=0,
+                     progress=None):
+    """
+    Jeu synthétique en masse : `rows` pointages répartis sur `collaborateurs` (un par jour
+    et par collaborateur, en remontant depuis `last_day`), leurs anomalies (ANOMALY_RATE), des
+    emails (EMAIL_RATE des pointages anormaux) et le cube. Les ids sont attribués ici pour
+    écrire les anomalies sans relire les pointages. Noms et matricules préfixés « SYN<horodatage> ».
+    """
+    rng = np.random.default_rng(seed)
+    tag = f"SYN{int(time.time())}"
+    # Relectures après chaque bulk_create : tous les moteurs ne renvoient pas les ids générés
+    Direction.objects.bulk_create([Direction(nom=f"{tag} D{i}") for i in range(directions)])
+    dirs = list(Direction.objects.filter(nom__startswith=f"{tag} "))
+    Departement.objects.bulk_create([Departement(nom=f"{tag} S{j}", direction=d) for d in dirs for j in range(departements)])
+    depts = list(Departement.objects.filter(direction__in=dirs).order_by("id").values_list("id", "direction_id"))
+    Collaborateur.objects.bulk_create([
+        Collaborateur(matricule=f"{tag}-{k:06d}", nom=f"Nom {k}", prenom=f"Prénom {k}",
+                      departement_id=depts[k % len(depts)][0], direction_id=depts[k % len(depts)][1])
+        for k in range(collaborateurs)
+    ], batch_size=1000)
+    collabs = list(Collaborateur.objects.filter(matricule__startswith=f"{tag}-")
+                   .order_by("matricule").values_list("id", "departement_id", "direction_id"))
+
+    bits = np.array(list(Anomalie.TYPE_BITS.values()))
+    types = list(Anomalie.TYPE_BITS)
+    next_id = (Pointage.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+    email_id = (EmailHistory.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+    written = 0
+    while written < rows:
+        n = min(GENERATE_CHUNK_SIZE, rows - written)
+        index = np.arange(written, written + n)
+        days, who = index // len(collabs), index % len(collabs)
+        masks = np.where(rng.random(n) < ANOMALY_RATE, rng.integers(1, 1 << len(bits), n), 0)
+        ids = np.arange(next_id, next_id + n)
+        pointages, anomalies = [], []
+        for pk, day, k, mask in zip(ids.tolist(), days.tolist(), who.tolist(), masks.tolist()):
+            collab_id, departement_id, direction_id = collabs[k]
+            pointages.append(Pointage(
+                id=pk, collaborateur_id=collab_id, date=last_day - timedelta(days=day), departement_id=departement_id,
+                direction_id=direction_id, anomaly_mask=mask, anomaly_count=bin(mask).count("1"),
+            ))
+            for code, bit in zip(types, bits.tolist()):
+                if mask & bit:
+                    magnitude = float(rng.integers(60, 4 * 3600))
+                    anomalies.append(Anomalie(
+                        pointage_id=pk, type=code, magnitude=magnitude, severity=min(magnitude / 28800, 1.0),
+                    ))
+        anormaux = ids[masks > 0]
+        emails = anormaux[rng.random(len(anormaux)) < EMAIL_RATE].tolist()
+        with transaction.atomic():
+            Pointage.objects.bulk_create(pointages, batch_size=1000)
+            Anomalie.objects.bulk_create(anomalies, batch_size=1000)
+            EmailHistory.objects.bulk_create([
+                EmailHistory(id=email_id + i, to_email="synthetique@example.com", subject="Anomalie", body="",
+                             collaborator_id=pointages[pk - next_id].collaborateur_id, pointage_id=pk)
+                for i, pk in enumerate(emails)
+            ], batch_size=1000)
+            # created_at est posé par auto_now_add : un UPDATE par jour ramène chaque email au jour de son pointage
+            par_jour = {}
+            for i, pk in enumerate(emails):
+                par_jour.setdefault(pointages[pk - next_id].date, []).append(email_id + i)
+            for day, email_ids in par_jour.items():
+                EmailHistory.objects.filter(id__in=email_ids).update(
+                    created_at=timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=10))
+                )
+        next_id += n
+        email_id += len(emails)
+        written += n
+        if progress:
+            progress(written)
+    rebuild_cube(last_day - timedelta(days=int((rows - 1) // len(collabs))), last_day)
+    return written
+
+
+def sample_keys():
+    """Valeurs réelles de la base (pointage le plus récent, sa direction, ses départements) pour paramétrer les requêtes."""
+    latest = (Pointage.objects.exclude(departement=None).order_by("-date")
+              .values("id", "date", "direction_id", "departement_id").first())
+    if latest is None:
+        raise CommandError("Aucun pointage en base : utilisez --generate N.")
+    email = EmailHistory.objects.order_by("-created_at").values("created_at", "pointage_id").first()
+    email_day = timezone.localdate(email["created_at"]) if email else latest["date"]
+    return SimpleNamespace(
+        day=latest["date"], month_start=latest["date"] - timedelta(days=30),
+        direction_id=latest["direction_id"], departement_id=latest["departement_id"],
+        departements=list(Departement.objects.filter(direction_id=latest["direction_id"]).values_list("id", flat=True)[:3]),
+        email_day=email_day, email_pointage_id=email["pointage_id"] if email else latest["id"],
+    )
+
+
+# (libellé, requête paramétrée par sample_keys) : les requêtes des pages et traitements les plus sollicités
+HOT_QUERIES = [
+    ("Anomalies : première page", lambda s: filter_anomaly_pointages({}).order_by("-date", "id")[:ANOMALY_PAGE_SIZE]),
+    ("Anomalies : un type sur un mois", lambda s: filter_anomaly_pointages(
+        {"type": Anomalie.LATE, "start": s.month_start}).order_by("-date", "id")[:ANOMALY_PAGE_SIZE]),
+    ("Pointages d'un jour (sans tri demandé)", lambda s: Pointage.objects.filter(date=s.day)
+        .values_list("id", "collaborateur_id")),
+    ("Nouvelle détection : une direction sur un mois", lambda s: Pointage.objects
+        .filter(direction_id=s.direction_id, date__gte=s.month_start).order_by("id").values_list("id")[:5000]),
+    ("Manager : collaborateurs en anomalie", lambda s: Pointage.objects
+        .filter(departement__in=s.departements, anomaly_count__gt=0).values("collaborateur_id").distinct()),
+    ("Manager : pointages anormaux des départements sur un mois", lambda s: Pointage.objects
+        .filter(departement__in=s.departements, date__gte=s.month_start, anomaly_count__gt=0)
+        .values_list("id", "anomaly_count")),
+    ("Manager : anomalies de l'équipe depuis un mois", lambda s: Anomalie.objects
+        .filter(pointage__collaborateur__departement__in=s.departements, pointage__date__gte=s.month_start)
+        .order_by("-pointage__date", "pointage__collaborateur__nom")),
+    ("Séries : un département", lambda s: AnomalyDailyStat.objects.filter(departement_id=s.departement_id)
+        .values("date").annotate(n=Sum("count")).order_by("date")),
+    ("Séries : une direction", lambda s: AnomalyDailyStat.objects.filter(direction_id=s.direction_id)
+        .values("date").annotate(n=Sum("count")).order_by("date")),
+    ("Statistiques : deux périodes par département", lambda s: AnomalyDailyStat.objects
+        .filter(date__range=(s.day - timedelta(days=59), s.day), departement_id__isnull=False)
+        .values("departement_id", "date").annotate(y=Sum("count")).order_by()),
+    ("Cube : agrégat d'un mois d'anomalies", lambda s: Anomalie.objects
+        .filter(pointage__date__range=(s.month_start, s.day)).values(*CUBE_KEYS)
+        .annotate(n=Count("id"), magnitude_totale=Sum("magnitude"), severite_totale=Sum("severity")).order_by()),
+    ("Historique : un jour (created_at__date)", lambda s: EmailHistory.objects
+        .filter(created_at__date=s.email_day).order_by("-created_at")),
+    ("Historique : un jour (plage)", lambda s: EmailHistory.objects
+        .filter(created_at__gte=day_range(s.email_day)[0], created_at__lt=day_range(s.email_day)[1])
+        .order_by("-created_at")),
+    ("Email déjà envoyé pour un pointage", lambda s: EmailHistory.objects
+        .filter(pointage_id=s.email_pointage_id, status="SENT")),
+    ("Historique de l'équipe", lambda s: EmailHistory.objects
+        .filter(collaborator__departement__in=s.departements).order_by("-created_at")[:100]),
+]
+
+
+def best_time(queryset, repeat):
+    """Meilleur temps (ms) d'évaluation complète du queryset sur `repeat` exécutions, et le nombre de lignes."""
+    best, rows = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(list(queryset.all()))
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, rows
+
+
+class Command(BaseCommand):
+    """
+    Plan d'exécution (EXPLAIN) et meilleur temps des requêtes les plus sollicitées : à lancer
+    avant puis après une migration d'index pour comparer. --generate ajoute d'abord un jeu
+    synthétique en masse (à réserver à une base de test).
+
+    Utilisation :
+        python manage.py explain_hot_queries --generate 10000000
+        python manage.py explain_hot_queries --repeat 5 --no-plan
+    """
+    help = "EXPLAIN et temps des requêtes chaudes (liste des anomalies, tableaux de bord, historique des emails)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, default=0, metavar='N', help='Génère N pointages synthétiques')
+        parser.add_argument('--collaborateurs', type=int, default=2000, help='Collaborateurs du jeu synthétique')
+        parser.add_argument('--repeat', type=int, default=3, help='Exécutions par requête (meilleur temps retenu)')
+        parser.add_argument('--no-plan', action='store_true', help="N'affiche que les temps")
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            start = time.perf_counter()
+            written = generate_dataset(
+                options['generate'], collaborateurs=options['collaborateurs'],
+                progress=lambda n: self.stdout.write(f"  {n} pointage(s) générés...") if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{written} pointage(s) synthétique(s) générés en {time.perf_counter() - start:.1f} s."
+            ))
+
+        keys = sample_keys()
+        for label, build in HOT_QUERIES:
+            queryset = build(keys)
+            elapsed, rows = best_time(queryset, options['repeat'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f"── {label}"))
+            if not options['no_plan']:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f"   {line}")
+            self.stdout.write(f"   {elapsed:.1f} ms, {rows} ligne(s)")
@@ -0,0 +1,39 @@
+# ==============================================================================
+# FICHIER : core/management/commands/import_leaves.py
+# ==============================================================================
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.day_import import DAY_KINDS, import_days
+from core.utils.sources import UnsupportedFormat, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe en masse des congés (colonnes MATRICULE, Date, Heures) depuis un fichier CSV, Excel, "
+        "Parquet ou Arrow, puis ré-analyse les pointages concernés."
+    )
+    kind = "conges"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Chemin du fichier à importer')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        try:
+            detect_format(path)
+        except UnsupportedFormat as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            summary = import_days(f, self.kind)
+        for error in summary.errors:
+            self.stdout.write(self.style.WARNING(f"Ligne ignorée : {error}"))
+        if summary.unknown:
+            exemples = ", ".join(sorted(summary.unknown)[:10])
+            self.stdout.write(self.style.WARNING(f"Matricules inconnus (lignes ignorées) : {exemples}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Import ({DAY_KINDS[self.kind].label}) terminé en {time.perf_counter() - start:.1f} s : {summary}."
+        ))
@@ -5,6 +5,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from core.models import Departement, Direction
+from core.utils.dimensions import dimension_cache
 
 User = get_user_model()
 
@@ -22,49 +23,55 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('Groupe "Manager" créé.'))
 
         with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                direction_nom = row['direction_nom']
-                departement_nom = row['departement_nom']
-                manager_email = row['manager_email']
+            rows = list(csv.DictReader(file))
 
-                try:
-                    # ÉTAPE 1 : On crée ou on récupère la Direction. C'est la nouveauté.
-                    direction, _ = Direction.objects.get_or_create(
-                        nom__iexact=direction_nom, 
-                        defaults={'nom': direction_nom}
-                    )
-                    
-                    # ÉTAPE 2 : On crée ou on récupère le Département EN LE LIANT À SA DIRECTION.
-                    departement, _ = Departement.objects.get_or_create(
-                        nom__iexact=departement_nom, 
-                        defaults={'nom': departement_nom, 'direction': direction} # <-- La correction est ici !
-                    )
+        # ÉTAPES 1 et 2 : le département est cherché par son seul nom (insensible à la casse), quelle
+        # que soit sa direction, comme le faisait get_or_create(nom__iexact=...) : la direction du
+        # fichier ne sert qu'à créer un département manquant. Les départements existants sont lus
+        # en une requête (le plus ancien l'emporte en cas d'homonymes).
+        departements = {}
+        for departement_id, nom in Departement.objects.order_by('-id').values_list('id', 'nom'):
+            departements[nom.strip().lower()] = departement_id
 
-                    # ÉTAPE 3 : On crée ou on récupère l'utilisateur Manager.
-                    manager_user, created = User.objects.get_or_create(
-                        email=manager_email,
-                        defaults={'username': manager_email}
-                    )
-                    
-                    if created:
-                        manager_user.set_unusable_password()
-                        manager_user.save()
-                        self.stdout.write(self.style.NOTICE(f"Utilisateur manager créé : {manager_email}"))
+        for row in rows:
+            direction_nom = row['direction_nom'].strip()
+            departement_nom = row['departement_nom'].strip()
+            manager_email = row['manager_email']
 
-                    manager_user.groups.add(manager_group)
-                    
-                    # ÉTAPE 4 : On assigne le manager au département.
-                    departement.manager = manager_user
-                    departement.save()
+            try:
+                departement_id = departements.get(departement_nom.lower())
+                if departement_id is None:
+                    direction = Direction.objects.filter(nom__iexact=direction_nom).order_by('id').first()
+                    if direction is None:
+                        direction = Direction.objects.create(nom=direction_nom)
+                    departement_id = Departement.objects.create(nom=departement_nom, direction=direction).id
+                    departements[departement_nom.lower()] = departement_id
 
-                    self.stdout.write(self.style.SUCCESS(
-                        f"'{manager_email}' assigné avec succès au département '{departement_nom}' (Direction: {direction_nom})"
-                    ))
+                # ÉTAPE 3 : On crée ou on récupère l'utilisateur Manager.
+                manager_user, created = User.objects.get_or_create(
+                    email=manager_email,
+                    defaults={'username': manager_email}
+                )
 
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(
-                        f"Erreur pour la ligne du département '{departement_nom}'. Détail : {e}"
-                    ))
-        
-        self.stdout.write(self.style.SUCCESS('Importation des managers terminée.'))
\ No newline at end of file
+                if created:
+                    manager_user.set_unusable_password()
+                    manager_user.save()
+                    self.stdout.write(self.style.NOTICE(f"Utilisateur manager créé : {manager_email}"))
+
+                manager_user.groups.add(manager_group)
+
+                # ÉTAPE 4 : On assigne le manager au département.
+                Departement.objects.filter(id=departement_id).update(manager=manager_user)
+
+                self.stdout.write(self.style.SUCCESS(
+                    f"'{manager_email}' assigné avec succès au département '{departement_nom}' (Direction: {direction_nom})"
+                ))
+
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(
+                    f"Erreur pour la ligne du département '{departement_nom}'. Détail : {e}"
+                ))
+
+        # update() n'émet pas de signal : les emails des managers changent dans le cache de dimensions
+        dimension_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS('Importation des managers terminée.'))
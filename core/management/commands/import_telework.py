@@ -0,0 +1,12 @@
+# ==============================================================================
+# FICHIER : core/management/commands/import_telework.py
+# ==============================================================================
+from .import_leaves import Command as ImportLeavesCommand
+
+
+class Command(ImportLeavesCommand):
+    help = (
+        "Importe en masse des jours de télétravail planifié (colonnes MATRICULE, Date) depuis un fichier "
+        "CSV, Excel, Parquet ou Arrow, puis ré-analyse les pointages concernés."
+    )
+    kind = "teletravail"
@@ -0,0 +1,29 @@
+# ==============================================================================
+# FICHIER : core/management/commands/purge_upload_sessions.py
+# ==============================================================================
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.staging import purge_upload_sessions
+
+
+class Command(BaseCommand):
+    """
+    Supprime les sessions d'upload reprenable expirées et leurs morceaux dans la zone de
+    transit. Lancée aussi toutes les heures par Celery beat (purge_upload_sessions_task).
+
+    Utilisation :
+        python manage.py purge_upload_sessions
+        python manage.py purge_upload_sessions --hours 2
+    """
+    help = "Purge les sessions d'upload reprenable sans activité (et leurs morceaux)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, help="Délai d'inactivité (défaut : UPLOAD_SESSION_EXPIRY_HOURS)")
+
+    def handle(self, *args, **options):
+        if options['hours'] is not None and options['hours'] < 0:
+            raise CommandError("--hours doit être positif.")
+        sessions, chunks = purge_upload_sessions(options['hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{sessions} session(s) expirée(s) supprimée(s), {chunks} morceau(x) retiré(s) de la zone de transit."
+        ))
@@ -0,0 +1,37 @@
+# ==============================================================================
+# FICHIER : core/management/commands/rebuild_anomaly_cube.py
+# ==============================================================================
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.redetect_anomalies import iso_date
+from core.utils.cube import rebuild_cube
+
+
+class Command(BaseCommand):
+    """
+    Reconstruit le cube des anomalies (AnomalyDailyStat) depuis les anomalies en base.
+    Utile après une suppression massive de pointages ou une modification hors application.
+
+    Utilisation :
+        python manage.py rebuild_anomaly_cube
+        python manage.py rebuild_anomaly_cube --from 2024-01-01 --to 2024-12-31
+    """
+    help = "Reconstruit le cube des anomalies par jour, direction, département et type."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Première date (AAAA-MM-JJ)')
+        parser.add_argument('--to', dest='date_to', help='Dernière date (AAAA-MM-JJ)')
+
+    def handle(self, *args, **options):
+        date_from = iso_date(options['date_from']) if options['date_from'] else None
+        date_to = iso_date(options['date_to']) if options['date_to'] else None
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from doit précéder --to.")
+
+        start = time.perf_counter()
+        written = rebuild_cube(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"Cube reconstruit en {time.perf_counter() - start:.1f} s : {written} cellule(s)."
+        ))
@@ -0,0 +1,65 @@
+# ==============================================================================
+# FICHIER : core/management/commands/redetect_anomalies.py
+# ==============================================================================
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Anomalie, Direction
+from core.utils.redetection import REDETECTION_CHUNK_SIZE, redetect
+
+
+def iso_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide « {value} » (format attendu : AAAA-MM-JJ).")
+
+
+class Command(BaseCommand):
+    """
+    Recalcule les anomalies des pointages déjà en base (règles, fériés, congés actuels),
+    sans réimporter de fichier. Seules les anomalies qui changent sont écrites.
+
+    Utilisation :
+        python manage.py redetect_anomalies --from 2024-01-01 --to 2024-03-31 --direction DSI --dry-run
+    """
+    help = "Nouvelle détection des anomalies sur une période et/ou une direction, à partir des pointages en base."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Première date (AAAA-MM-JJ)')
+        parser.add_argument('--to', dest='date_to', help='Dernière date (AAAA-MM-JJ)')
+        parser.add_argument('--direction', help='Nom ou id de la direction')
+        parser.add_argument('--chunk-size', type=int, default=REDETECTION_CHUNK_SIZE, help='Pointages par transaction')
+        parser.add_argument('--dry-run', action='store_true', help="Calcule l'écart sans rien écrire")
+
+    def handle(self, *args, **options):
+        date_from = iso_date(options['date_from']) if options['date_from'] else None
+        date_to = iso_date(options['date_to']) if options['date_to'] else None
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from doit précéder --to.")
+
+        direction_id = None
+        if options['direction']:
+            value = options['direction']
+            direction = Direction.objects.filter(nom=value).first()
+            if direction is None and value.isdigit():
+                direction = Direction.objects.filter(id=int(value)).first()
+            if direction is None:
+                raise CommandError(f"Direction inconnue : {value}")
+            direction_id = direction.id
+
+        def progress(diff):
+            self.stdout.write(f"  {diff.pointages} pointage(s) traité(s)...")
+
+        start = time.perf_counter()
+        diff = redetect(
+            date_from, date_to, direction_id, chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        labels = dict(Anomalie.TYPE_CHOICES)
+        for code in sorted(set(diff.added) | set(diff.removed)):
+            self.stdout.write(f"  {labels.get(code, code)} : +{diff.added[code]} / -{diff.removed[code]}")
+        prefix = "Simulation (rien n'a été écrit)" if options['dry_run'] else "Nouvelle détection terminée"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} en {time.perf_counter() - start:.1f} s : {diff}."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+def mark_existing_batches_done(apps, schema_editor):
+    # Les imports antérieurs au point de reprise se faisaient en une seule transaction.
+    apps.get_model('core', 'ImportBatch').objects.update(status='DONE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_emailhistory_pointage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='chunks_committed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='rows_committed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec')], default='PENDING', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(mark_existing_batches_done, migrations.RunPython.noop),
+    ]
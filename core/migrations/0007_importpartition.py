@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_importbatch_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec')], default='PENDING', max_length=16)),
+                ('rows_committed', models.PositiveIntegerField(default=0)),
+                ('chunks_committed', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('index', models.PositiveIntegerField()),
+                ('source', models.CharField(max_length=255)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='partitions', to='core.importbatch')),
+            ],
+            options={
+                'unique_together': {('batch', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_importpartition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pointage_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='importpartition',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
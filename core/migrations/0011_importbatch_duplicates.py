@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_import_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='date_max',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='date_min',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reimports', to='core.importbatch'),
+        ),
+        migrations.AddField(
+            model_name='importpartition',
+            name='date_max',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importpartition',
+            name='date_min',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_importbatch_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='lenient',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='rows_quarantined',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importpartition',
+            name='rows_quarantined',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='QuarantinedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField()),
+                ('raw', models.JSONField(default=dict)),
+                ('errors', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quarantine', to='core.importbatch')),
+            ],
+            options={
+                'ordering': ['batch', 'line'],
+                'unique_together': {('batch', 'line')},
+            },
+        ),
+    ]
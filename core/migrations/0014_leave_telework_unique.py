@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:16
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def remove_duplicates(apps, schema_editor):
+    """Garde une seule ligne (la plus récente) par (collaborateur, date) avant la contrainte."""
+    for name in ("Leave", "TeleworkDay"):
+        model = apps.get_model("core", name)
+        keep = (
+            model.objects.values("collaborateur", "date").order_by()
+            .annotate(keep=Max("id")).values_list("keep", flat=True)
+        )
+        model.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_uploadsession'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='leave',
+            unique_together={('collaborateur', 'date')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='teleworkday',
+            unique_together={('collaborateur', 'date')},
+        ),
+    ]
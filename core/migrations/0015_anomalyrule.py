@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Règles globales par défaut : mêmes seuils (minutes) que la détection historique
+DEFAULT_RULES = [
+    ("ENTREE_TARDIVE", 0), ("SORTIE_ANTICIPEE", 0), ("ABSENCE_NON_JUSTIFIEE", 0),
+    ("BADGEAGE_IMPAIR", 0), ("PRESENCE_INSUFFISANTE", 1),
+]
+
+
+def create_default_rules(apps, schema_editor):
+    AnomalyRule = apps.get_model("core", "AnomalyRule")
+    AnomalyRule.objects.bulk_create([
+        AnomalyRule(type=type_code, threshold_minutes=minutes, description="Règle par défaut")
+        for type_code, minutes in DEFAULT_RULES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_leave_telework_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('ENTREE_TARDIVE', 'Entrée tardive'), ('SORTIE_ANTICIPEE', 'Sortie anticipée'), ('ABSENCE_NON_JUSTIFIEE', 'Absence non justifiée'), ('BADGEAGE_IMPAIR', 'Badgeage impair'), ('PRESENCE_INSUFFISANTE', 'Présence insuffisante')], max_length=32)),
+                ('threshold_minutes', models.DecimalField(decimal_places=2, default=0, max_digits=7, verbose_name='Seuil (minutes)')),
+                ('enabled', models.BooleanField(default=True, verbose_name='Active')),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_rules', to='core.departement')),
+                ('direction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_rules', to='core.direction')),
+            ],
+            options={
+                'verbose_name': "règle d'anomalie",
+                'verbose_name_plural': "règles d'anomalie",
+                'ordering': ['type', 'id'],
+            },
+        ),
+        migrations.RunPython(create_default_rules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:31
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Bits de Pointage.anomaly_mask à la date de la migration (ordre d'Anomalie.TYPE_CHOICES)
+TYPE_BITS = {
+    "ENTREE_TARDIVE": 1, "SORTIE_ANTICIPEE": 2, "ABSENCE_NON_JUSTIFIEE": 4,
+    "BADGEAGE_IMPAIR": 8, "PRESENCE_INSUFFISANTE": 16,
+}
+
+
+def backfill(apps, schema_editor):
+    """Calcule le masque et le nombre d'anomalies des pointages existants : une requête UPDATE par type."""
+    Pointage = apps.get_model("core", "Pointage")
+    Anomalie = apps.get_model("core", "Anomalie")
+    for type_code, bit in TYPE_BITS.items():
+        Pointage.objects.filter(
+            Exists(Anomalie.objects.filter(pointage=OuterRef("pk"), type=type_code))
+        ).update(anomaly_mask=F("anomaly_mask").bitor(bit))
+    counts = (
+        Anomalie.objects.filter(pointage=OuterRef("pk")).order_by()
+        .values("pointage").annotate(n=Count("id")).values("n")
+    )
+    Pointage.objects.filter(anomaly_mask__gt=0).update(anomaly_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_anomalyrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointage',
+            name='anomaly_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pointage',
+            name='anomaly_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(condition=models.Q(('anomaly_mask__gt', 0)), fields=['-date'], name='pointage_anomalous_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['anomaly_mask', 'date'], name='pointage_anomaly_mask_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
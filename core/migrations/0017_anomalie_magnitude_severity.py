@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+# Valeurs de core.utils.anomaly à la date de la migration
+REFERENCE_DAY_SECONDS = 8 * 3600
+BADGE_SEVERITY = 0.1
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def measure(type_code, late, early, absence, reel, theo):
+    """(ampleur en secondes, sévérité) d'une anomalie existante, depuis les durées de son pointage."""
+    if type_code == "BADGEAGE_IMPAIR":
+        return None, BADGE_SEVERITY
+    if type_code == "ENTREE_TARDIVE":
+        magnitude = late.total_seconds() if late is not None else None
+    elif type_code == "SORTIE_ANTICIPEE":
+        magnitude = early.total_seconds() if early is not None else None
+    elif type_code == "ABSENCE_NON_JUSTIFIEE":
+        magnitude = float(absence or 0) * 3600
+    elif reel is not None and theo is not None:
+        magnitude = (theo - reel).total_seconds()
+    else:
+        magnitude = None
+    if magnitude is None:
+        return None, 0.0
+    journee = theo.total_seconds() if theo is not None and theo.total_seconds() > 0 else REFERENCE_DAY_SECONDS
+    return magnitude, min(max(magnitude / journee, 0.0), 1.0)
+
+
+def backfill(apps, schema_editor):
+    """Ampleur et sévérité des anomalies existantes, par lots (pagination par id, bulk_update)."""
+    Anomalie = apps.get_model("core", "Anomalie")
+    last_id = 0
+    while True:
+        rows = list(
+            Anomalie.objects.filter(id__gt=last_id).order_by("id").values_list(
+                "id", "type", "pointage__entree_tardive", "pointage__sortie_anticipee",
+                "pointage__absence_non_justifiee", "pointage__temps_presence_reel", "pointage__temps_presence_theorique",
+            )[:BACKFILL_CHUNK_SIZE]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        updates = []
+        for pk, type_code, *durations in rows:
+            magnitude, severity = measure(type_code, *durations)
+            updates.append(Anomalie(id=pk, magnitude=magnitude, severity=severity))
+        Anomalie.objects.bulk_update(updates, ["magnitude", "severity"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_pointage_anomaly_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalie',
+            name='magnitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='anomalie',
+            name='severity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
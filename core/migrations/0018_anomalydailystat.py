@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate(apps, schema_editor):
+    """Remplit le cube depuis les anomalies existantes (une requête d'agrégat)."""
+    Anomalie = apps.get_model("core", "Anomalie")
+    AnomalyDailyStat = apps.get_model("core", "AnomalyDailyStat")
+    rows = (
+        Anomalie.objects.order_by()
+        .values("pointage__date", "pointage__direction_id", "pointage__departement_id", "type")
+        .annotate(n=Count("id"), total_magnitude=Sum("magnitude"), total_severity=Sum("severity"))
+    )
+    AnomalyDailyStat.objects.bulk_create(
+        [
+            AnomalyDailyStat(
+                date=row["pointage__date"], direction_id=row["pointage__direction_id"],
+                departement_id=row["pointage__departement_id"], type=row["type"], count=row["n"],
+                direction_key=row["pointage__direction_id"] or 0, departement_key=row["pointage__departement_id"] or 0,
+                magnitude=row["total_magnitude"] or 0.0, severity=row["total_severity"] or 0.0,
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_anomalie_magnitude_severity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('ENTREE_TARDIVE', 'Entrée tardive'), ('SORTIE_ANTICIPEE', 'Sortie anticipée'), ('ABSENCE_NON_JUSTIFIEE', 'Absence non justifiée'), ('BADGEAGE_IMPAIR', 'Badgeage impair'), ('PRESENCE_INSUFFISANTE', 'Présence insuffisante')], max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('magnitude', models.FloatField(default=0)),
+                ('severity', models.FloatField(default=0)),
+                ('direction_key', models.BigIntegerField(default=0, editable=False)),
+                ('departement_key', models.BigIntegerField(default=0, editable=False)),
+                ('departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.departement')),
+                ('direction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.direction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'departement'], name='anomalystat_date_dept_idx'), models.Index(fields=['direction', 'date'], name='anomalystat_direction_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'direction_key', 'departement_key', 'type'), name='anomalystat_unique_cell')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_anomalydailystat'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pointage',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='anomalydailystat',
+            index=models.Index(fields=['departement', 'date'], name='anomalystat_departement_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['direction', 'date'], name='pointage_direction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['departement', 'date'], name='pointage_departement_date_idx'),
+        ),
+    ]
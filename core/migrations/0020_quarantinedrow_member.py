@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='quarantinedrow',
+            options={'ordering': ['batch', 'member', 'line']},
+        ),
+        migrations.AddField(
+            model_name='quarantinedrow',
+            name='member',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quarantinedrow',
+            unique_together={('batch', 'member', 'line')},
+        ),
+    ]
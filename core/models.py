@@ -61,11 +61,124 @@ class Collaborateur(models.Model):
 # ─────────────────────────────────────────────
 # Import batch & jours spéciaux
 # ─────────────────────────────────────────────
-class ImportBatch(models.Model):
+class ImportCheckpoint(models.Model):
+    """
+    Suivi d'un import en flux (fichier complet ou partition) : nombre de lignes de données déjà
+    validées (commit) et de lots correspondants. Une reprise repart de rows_committed.
+    """
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUS_CHOICES = [(PENDING, "En attente"), (RUNNING, "En cours"), (DONE, "Terminé"), (FAILED, "Échec")]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    rows_committed = models.PositiveIntegerField(default=0)
+    chunks_committed = models.PositiveIntegerField(default=0)
+    # Import différentiel : pointages créés, modifiés, ou ignorés car identiques (même empreinte)
+    rows_inserted = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    rows_quarantined = models.PositiveIntegerField(default=0)  # lignes invalides mises de côté (mode tolérant)
+    # Période couverte par les lignes importées
+    date_min = models.DateField(null=True, blank=True)
+    date_max = models.DateField(null=True, blank=True)
+    # Temps, débit, mémoire et requêtes par étape + anomalies par type (voir core.utils.metrics)
+    metrics = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class ImportBatch(ImportCheckpoint):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     filename = models.CharField(max_length=255)
+    # Fichier uploadé, dans la zone de transit (seul l'id du lot transite par le broker)
+    source = models.CharField(max_length=255, blank=True, default="")
+    checksum = models.CharField(max_length=64, blank=True, default="", db_index=True)  # SHA-256
+    size = models.PositiveBigIntegerField(default=0)
+    # Réimport forcé d'un fichier identique (même checksum) à un lot précédent
+    duplicate_of = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="reimports")
+    # Mode tolérant : les lignes invalides vont en quarantaine au lieu d'interrompre l'import
+    lenient = models.BooleanField(default=False)
+
+    def previous_upload(self):
+        """Lot antérieur (non échoué) issu d'un fichier identique octet pour octet, ou None."""
+        if not self.checksum:
+            return None
+        return self.find_upload(self.checksum, before=self.created_at, exclude=self.id)
+
+    @classmethod
+    def find_upload(cls, checksum, before=None, exclude=None):
+        """Dernier lot non échoué dont le fichier a ce checksum (antérieur à `before`), ou None."""
+        batches = cls.objects.filter(checksum=checksum).exclude(status=cls.FAILED)
+        if before is not None:
+            batches = batches.filter(created_at__lte=before)
+        if exclude is not None:
+            batches = batches.exclude(id=exclude)
+        return batches.order_by("-created_at").first()
+
+class ImportPartition(ImportCheckpoint):
+    """
+    Sous-ensemble d'un import, découpé par MATRICULE : deux partitions ne touchent jamais la
+    même clé (collaborateur, date) et peuvent donc être importées en parallèle.
+    """
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name="partitions")
+    index = models.PositiveIntegerField()
+    source = models.CharField(max_length=255)  # fichier de la partition dans le stockage
+
+    class Meta:
+        unique_together = ("batch", "index")
+
+class UploadSession(models.Model):
+    """
+    Upload reprenable : le client envoie le fichier par morceaux, chacun à l'offset attendu
+    (`received`). Après une coupure, il demande l'offset et reprend à partir de là. Chaque
+    morceau est stocké tel quel dans la zone de transit ; ils sont assemblés à la fin.
+    """
+    OPEN = "OPEN"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUS_CHOICES = [(OPEN, "En cours"), (DONE, "Terminé"), (FAILED, "Échec")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # taille totale annoncée par le client
+    received = models.PositiveBigIntegerField(default=0)  # octets reçus = offset du prochain morceau
+    chunks = models.JSONField(default=list)  # [[offset, nom dans la zone de transit], ...]
+    lenient = models.BooleanField(default=False)
+    force = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=OPEN)
+    error = models.TextField(blank=True, default="")
+    # Plusieurs sessions peuvent renvoyer au même lot (fichier identique envoyé deux fois)
+    batch = models.ForeignKey(ImportBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="upload_sessions")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class QuarantinedRow(models.Model):
+    """
+    Ligne invalide d'un import en mode tolérant : la ligne source telle quelle (modifiable pour
+    la corriger) et ses erreurs de typage. Une ligne re-traitée avec succès est supprimée.
+    """
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name="quarantine")
+    member = models.CharField(max_length=255, blank=True, default="")  # fichier d'une archive zip
+    line = models.PositiveIntegerField()  # numéro de ligne dans le fichier d'origine (ou dans `member`)
+    raw = models.JSONField(default=dict)  # colonne source -> valeur texte
+    errors = models.JSONField(default=list)  # [{"column", "value", "reason"}, ...]
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["batch", "member", "line"]
+        unique_together = ("batch", "member", "line")
+
+    def __str__(self):
+        where = f"« {self.member} », ligne {self.line}" if self.member else f"Ligne {self.line}"
+        return f"{where} ({', '.join(e['column'] for e in self.errors)})"
 
 class HolidayMA(models.Model):
     date = models.DateField(unique=True, db_index=True)
@@ -76,10 +189,17 @@ class Leave(models.Model):
     date = models.DateField(db_index=True)
     hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
+    class Meta:
+        # Un congé par collaborateur et par jour : cible des upserts de l'import en masse.
+        unique_together = ("collaborateur", "date")
+
 class TeleworkDay(models.Model):
     collaborateur = models.ForeignKey(Collaborateur, on_delete=models.CASCADE)
     date = models.DateField(db_index=True)
 
+    class Meta:
+        unique_together = ("collaborateur", "date")
+
 # ─────────────────────────────────────────────
 # Pointages & anomalies
 # ─────────────────────────────────────────────
@@ -99,11 +219,27 @@ class Pointage(models.Model):
     departement = models.ForeignKey(Departement, on_delete=models.SET_NULL, null=True, blank=True)
     direction = models.ForeignKey(Direction, on_delete=models.SET_NULL, null=True, blank=True)
     batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name="pointages", null=True, blank=True)
+    # Empreinte de la ligne source normalisée : une ligne ré-importée à l'identique est ignorée
+    fingerprint = models.BigIntegerField(null=True, blank=True)
+    # Résumé dénormalisé des anomalies du pointage (un bit par type, voir Anomalie.TYPE_BITS),
+    # tenu à jour par l'import et la nouvelle détection : les listes filtrent sans jointure.
+    anomaly_mask = models.PositiveSmallIntegerField(default=0)
+    anomaly_count = models.PositiveSmallIntegerField(default=0)
     
     class Meta:
         # Contrainte plus robuste : un seul pointage par collaborateur par jour.
         unique_together = ("collaborateur", "date")
-        ordering = ["-date", "collaborateur__matricule"]
+        # Pas de tri par défaut (il imposait une jointure sur le collaborateur et un tri à chaque
+        # requête, jusque dans les DISTINCT) : chaque liste précise son order_by.
+        indexes = [
+            # Périmètre d'une direction ou d'un département sur une période (nouvelle détection, managers)
+            models.Index(fields=["direction", "date"], name="pointage_direction_date_idx"),
+            models.Index(fields=["departement", "date"], name="pointage_departement_date_idx"),
+            # "A des anomalies", du plus récent au plus ancien (index partiel : pointages anormaux seulement)
+            models.Index(fields=["-date"], condition=models.Q(anomaly_mask__gt=0), name="pointage_anomalous_date_idx"),
+            # "A une anomalie de type X" : anomaly_mask__in=Anomalie.masks_with(X)
+            models.Index(fields=["anomaly_mask", "date"], name="pointage_anomaly_mask_idx"),
+        ]
 
 class Anomalie(models.Model):
     LATE = "ENTREE_TARDIVE"
@@ -115,14 +251,92 @@ class Anomalie(models.Model):
         (LATE, "Entrée tardive"), (EARLY_LEAVE, "Sortie anticipée"), (ABS_UNJ, "Absence non justifiée"),
         (BADGE, "Badgeage impair"), (INSUF_PRES, "Présence insuffisante"),
     ]
+    # Bit de chaque type dans Pointage.anomaly_mask
+    TYPE_BITS = {code: 1 << i for i, (code, _) in enumerate(TYPE_CHOICES)}
     pointage = models.ForeignKey(Pointage, on_delete=models.CASCADE, related_name="anomalies")
     type = models.CharField(max_length=32, choices=TYPE_CHOICES)
+    # Texte libre des anciennes détections ; le détail est désormais rendu depuis `magnitude` (detail_display)
     detail = models.TextField(blank=True, default="")
+    # Ampleur en secondes (retard, sortie anticipée, absence, manque de présence) ; vide pour le badgeage impair
+    magnitude = models.FloatField(null=True, blank=True)
+    # Part de la journée théorique perdue, de 0 à 1 (voir core.utils.anomaly)
+    severity = models.FloatField(default=0)
     is_holiday = models.BooleanField(default=False)
     is_leave = models.BooleanField(default=False)
     is_telework = models.BooleanField(default=False)
     date_detection = models.DateTimeField(default=timezone.now, db_index=True)
 
+    @property
+    def detail_display(self):
+        """Détail lisible, rendu à l'affichage à partir du type et de l'ampleur."""
+        from .utils.anomaly import render_detail  # import local : anomaly -> rules -> models
+        return self.detail or render_detail(self.type, self.magnitude)
+
+    @classmethod
+    def masks_with(cls, type_code):
+        """Valeurs de Pointage.anomaly_mask contenant le type : un filtre __in qui profite de l'index."""
+        bit = cls.TYPE_BITS[type_code]
+        return [mask for mask in range(1 << len(cls.TYPE_BITS)) if mask & bit]
+
+class AnomalyRule(models.Model):
+    """
+    Règle de détection configurable (compilée par core.utils.rules) : seuil d'un type d'anomalie,
+    global ou limité à une direction ou à un département. La règle la plus précise l'emporte ;
+    une règle désactivée supprime ce type d'anomalie sur sa portée.
+    """
+    type = models.CharField(max_length=32, choices=Anomalie.TYPE_CHOICES)
+    # Durée au-delà de laquelle l'anomalie est levée (strictement supérieure). Pour l'absence non
+    # justifiée, les heures d'absence sont comparées en minutes ; le badgeage impair n'a pas de seuil.
+    threshold_minutes = models.DecimalField("Seuil (minutes)", max_digits=7, decimal_places=2, default=0)
+    direction = models.ForeignKey(Direction, on_delete=models.CASCADE, null=True, blank=True, related_name="anomaly_rules")
+    departement = models.ForeignKey(Departement, on_delete=models.CASCADE, null=True, blank=True, related_name="anomaly_rules")
+    enabled = models.BooleanField("Active", default=True)
+    description = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["type", "id"]
+        verbose_name = "règle d'anomalie"
+        verbose_name_plural = "règles d'anomalie"
+
+    def __str__(self):
+        scope = self.departement or self.direction or "global"
+        return f"{self.get_type_display()} ({scope}) : > {self.threshold_minutes} min"
+
+class AnomalyDailyStat(models.Model):
+    """
+    Cube des anomalies : nombre, ampleur et sévérité cumulées par jour, direction, département et
+    type (direction et département du pointage). Tenu à jour cellule par cellule par l'import et
+    la nouvelle détection (core.utils.cube), reconstructible par la commande rebuild_anomaly_cube.
+    Les tableaux de bord RH et de performance, et les KPIs de l'équipe d'un manager, lisent ce cube
+    plutôt que la jointure Anomalie / Pointage ; les vues par collaborateur, que le cube ne porte
+    pas, lisent le résumé Pointage.anomaly_count / anomaly_mask.
+    """
+    date = models.DateField()
+    direction = models.ForeignKey(Direction, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    departement = models.ForeignKey(Departement, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    type = models.CharField(max_length=32, choices=Anomalie.TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    magnitude = models.FloatField(default=0)  # secondes cumulées (Anomalie.magnitude)
+    severity = models.FloatField(default=0)   # somme des sévérités (moyenne = severity / count)
+    # Clés non nulles de la cellule (id de la direction / du département, 0 si absent) : en SQL deux
+    # NULL sont distincts, une contrainte d'unicité sur les FK n'empêcherait pas les doublons
+    # (nulls_distinct n'existe que sous PostgreSQL). Renseignées par core.utils.cube.
+    direction_key = models.BigIntegerField(default=0, editable=False)
+    departement_key = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "direction_key", "departement_key", "type"], name="anomalystat_unique_cell",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date", "departement"], name="anomalystat_date_dept_idx"),
+            models.Index(fields=["direction", "date"], name="anomalystat_direction_idx"),
+            models.Index(fields=["departement", "date"], name="anomalystat_departement_idx"),
+        ]
+
 # ─────────────────────────────────────────────
 # Historique des emails
 # ─────────────────────────────────────────────
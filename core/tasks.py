@@ -1,32 +1,144 @@
-import base64
-from io import BytesIO
-from celery import shared_task
-from django.contrib.auth import get_user_model
-from .utils.etl import import_csv
+from datetime import date
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from .utils.day_import import DAY_KINDS, import_days
+from .utils.etl import finalize_partitions, import_csv, partition_csv, reprocess_quarantine
+from .utils.redetection import redetect
+from .utils.staging import delete_staged, open_staged, purge_upload_sessions
 from .emails import send_anomaly_notification_and_log
-from .models import Pointage
+from .models import ImportBatch, ImportPartition, Pointage
 
-@shared_task(bind=True)
-def process_csv_import_task(self, file_content_b64, user_id, filename):
-    User = get_user_model()
+def fail_batch(batch_id, error):
+    """Lot en échec avec son erreur : sans cela, il resterait « en attente » / « en cours » indéfiniment."""
+    ImportBatch.objects.filter(id=batch_id).update(status=ImportBatch.FAILED, error=error)
+
+def retries_exhausted(task):
+    return task.request.retries >= task.max_retries
+
+# Seul l'id du lot transite par le broker : le fichier est dans la zone de transit (ImportBatch.source).
+# acks_late + reject_on_worker_lost : si le worker est tué, le message est redélivré et
+# l'import reprend au dernier lot validé (ImportBatch.rows_committed).
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=3)
+def process_csv_import_task(self, batch_id):
+    batch = ImportBatch.objects.select_related("uploaded_by").get(id=batch_id)
     try:
-        user = User.objects.get(id=user_id)
-        file_content = base64.b64decode(file_content_b64)
-        file_in_memory = BytesIO(file_content)
-        file_in_memory.name = filename
-        print(f"Worker Celery: Démarrage de l'import pour '{filename}'...")
-        import_csv(file_in_memory, user)
-        print(f"Worker Celery: Importation de '{filename}' terminée.")
-        return f"Importation réussie pour {filename}"
+        partitions = getattr(settings, "IMPORT_PARTITIONS", 1)
+        if partitions > 1:
+            # Import parallèle : découpage par matricule puis un sous-import par partition.
+            if not batch.partitions.exists():
+                print(f"Worker Celery: Découpage de '{batch.filename}' en {partitions} partitions...")
+                with open_staged(batch.source) as f:
+                    partition_csv(f, batch, partitions)
+            enqueue_partitions(batch)
+            return f"Import parallèle lancé pour {batch.filename}"
+
+        print(f"Worker Celery: Démarrage de l'import pour '{batch.filename}' (reprise à la ligne {batch.rows_committed + 2})...")
+        with open_staged(batch.source) as f:
+            import_csv(f, batch.uploaded_by, batch=batch)
+        delete_staged(batch.source)
+        print(f"Worker Celery: Importation de '{batch.filename}' terminée.")
+        return f"Importation réussie pour {batch.filename}"
+    except (OperationalError, InterfaceError) as e:
+        # Erreur transitoire de base de données : on relance, la reprise se fait au dernier lot validé.
+        if retries_exhausted(self):
+            print(f"Worker Celery: Erreur base de données, abandon après {self.max_retries} tentatives. Erreur: {e}")
+            fail_batch(batch.id, str(e))
+            raise
+        print(f"Worker Celery: Erreur base de données, nouvelle tentative. Erreur: {e}")
+        raise self.retry(exc=e, countdown=30)
     except Exception as e:
         print(f"Worker Celery: Échec de l'importation. Erreur: {e}")
+        # Découpage ou lecture de la zone de transit en échec : le lot ne doit pas rester en attente
+        fail_batch(batch.id, str(e))
         self.update_state(state='FAILURE', meta={'exc': str(e)})
         raise e
 
+def enqueue_partitions(batch):
+    """Lance en parallèle (chord) les partitions non terminées, puis la finalisation du lot."""
+    batch.status = ImportBatch.RUNNING
+    batch.save(update_fields=["status", "updated_at"])
+    pending = batch.partitions.exclude(status=ImportBatch.DONE).values_list("id", flat=True)
+    if not pending:
+        return finalize_import_task.delay(None, str(batch.id))
+    return chord(import_partition_task.s(pk) for pk in pending)(finalize_import_task.s(str(batch.id)))
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=3)
+def import_partition_task(self, partition_id):
+    partition = ImportPartition.objects.select_related("batch").get(id=partition_id)
+    if partition.status == ImportBatch.DONE:
+        return partition.rows_committed
+    try:
+        print(f"Worker Celery: Import de la partition {partition.index} du lot {partition.batch_id}...")
+        with open_staged(partition.source) as f:
+            import_csv(f, partition.batch.uploaded_by, batch=partition.batch, checkpoint=partition)
+        return partition.rows_committed
+    except (OperationalError, InterfaceError) as e:
+        # Verrou mortel (deadlock) ou coupure : la partition reprend à son dernier lot validé.
+        if retries_exhausted(self):
+            print(f"Worker Celery: Partition {partition.index} abandonnée après {self.max_retries} tentatives. Erreur: {e}")
+            ImportPartition.objects.filter(id=partition.id).update(status=ImportBatch.FAILED, error=str(e))
+            fail_batch(partition.batch_id, f"Partition {partition.index} : {e}")
+            raise
+        raise self.retry(exc=e, countdown=10)
+    except Exception as e:
+        print(f"Worker Celery: Échec de la partition {partition.index}. Erreur: {e}")
+        fail_batch(partition.batch_id, f"Partition {partition.index} : {e}")
+        raise e
+
+@shared_task
+def finalize_import_task(results, batch_id):
+    batch = finalize_partitions(ImportBatch.objects.get(id=batch_id))
+    print(f"Worker Celery: Import parallèle du lot {batch_id} terminé ({batch.rows_committed} lignes).")
+    return batch.status
+
+@shared_task(bind=True, max_retries=3)
+def reprocess_quarantine_task(self, batch_id):
+    try:
+        n = reprocess_quarantine(ImportBatch.objects.get(id=batch_id))
+        print(f"Worker Celery: {n} ligne(s) sortie(s) de quarantaine pour le lot {batch_id}.")
+        return n
+    except (OperationalError, InterfaceError) as e:
+        raise self.retry(exc=e, countdown=30)
+
+@shared_task(bind=True, max_retries=3)
+def import_days_task(self, kind, source):
+    """Import en masse d'un fichier de congés ou de télétravail (upserts : une relance est sans effet de bord)."""
+    try:
+        with open_staged(source) as f:
+            summary = import_days(f, kind)
+    except (OperationalError, InterfaceError) as e:
+        raise self.retry(exc=e, countdown=30)
+    delete_staged(source)
+    print(f"Worker Celery: Import ({DAY_KINDS[kind].label}) terminé : {summary}.")
+    return str(summary)
+
+@shared_task(bind=True, max_retries=3)
+def redetect_anomalies_task(self, date_from=None, date_to=None, direction_id=None):
+    """Nouvelle détection des pointages en base (dates ISO) ; seul l'écart est écrit : une relance est sans effet de bord."""
+    try:
+        diff = redetect(
+            date.fromisoformat(date_from) if date_from else None,
+            date.fromisoformat(date_to) if date_to else None,
+            direction_id,
+        )
+    except (OperationalError, InterfaceError) as e:
+        raise self.retry(exc=e, countdown=30)
+    print(f"Worker Celery: Nouvelle détection terminée : {diff}.")
+    return diff.as_dict()
+
+@shared_task
+def purge_upload_sessions_task():
+    """Purge périodique (CELERY_BEAT_SCHEDULE) des sessions d'upload reprenable expirées et de leurs morceaux."""
+    sessions, chunks = purge_upload_sessions()
+    print(f"Worker Celery: {sessions} session(s) d'upload expirée(s) purgée(s), {chunks} morceau(x) supprimé(s).")
+    return sessions
+
 @shared_task(bind=True)
 def send_email_task(self, pointage_id):
     try:
-        pointage = Pointage.objects.get(id=pointage_id)
+        pointage = Pointage.objects.select_related('collaborateur').get(id=pointage_id)
         print(f"Worker Celery: Envoi de l'email pour pointage ID {pointage_id}...")
         send_anomaly_notification_and_log(pointage)
         print(f"Worker Celery: Email pour pointage ID {pointage_id} traité.")
@@ -1,18 +1,215 @@
 # ==============================================================================
 # FICHIER : core/tests.py
+# (Regroupés par module testé ; fixtures et fichiers d'import communs en tête)
 # ==============================================================================
-
+import csv
+import gzip
+import hashlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
 from unittest import mock
-from django.test import TestCase
-from django.urls import reverse
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Sum
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-from .models import Direction, Departement, Collaborateur, Pointage, Anomalie
+from .forms import REQUIRED_HEADERS, CSVUploadForm, validate_content
+from .management.commands.explain_hot_queries import sample_keys
+from .models import (
+    Anomalie, AnomalyDailyStat, AnomalyRule, Collaborateur, Departement, Direction, EmailHistory, HolidayMA,
+    ImportBatch, Leave, Pointage, QuarantinedRow, TeleworkDay, UploadSession,
+)
+from .tasks import process_csv_import_task
+from .utils import business_calendar as bc
+from .utils import metrics as metrics_module
+from .utils import rules as rule_registry
+from .utils.anomaly import detect_anomalies, detect_anomalies_batch
+from .utils.cube import rebuild_cube
+from .utils.day_import import import_days
+from .utils.dimensions import VERSION_KEY, DimensionCache, dimension_cache
+from .utils.etl import (
+    DimensionResolver, finalize_partitions, import_csv, partition_csv, reprocess_quarantine,
+)
+from .utils.metrics import ImportMetrics
+from .utils.parsing import CSV_READ_OPTIONS, parse_frame
+from .utils.redetection import redetect
+from .utils.sources import read_frames
+from .utils.staging import open_staged, stage_upload
+from .utils.validation import validate_rows
+from .views import day_range, filter_anomaly_pointages
 
 User = get_user_model()
 
+
+# ─────────────────────────────────────────────
+# Fixtures et fichiers d'import communs
+# ─────────────────────────────────────────────
+
+
+def build_csv(rows):
+    """Construit un CSV d'import à partir de dictionnaires (colonnes absentes = vides)."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(REQUIRED_HEADERS)
+    for row in rows:
+        writer.writerow([row.get(h, "") for h in REQUIRED_HEADERS])
+    return out.getvalue()
+
+
+def csv_row(matricule, jour, **overrides):
+    row = {
+        "MATRICULE": matricule, "NOM": "Doe", "PRENOM": "John", "Date": jour,
+        "Entrée": "09:00:00", "Sortie": "18:00:00",
+        "Temps de présence réel": "08:00:00", "Temps de présence théorique": "08:00:00",
+        "Absence Justifiée (par heure)": "0.0", "Absence non justifiée": "0.0",
+        "Departement": "Marketing", "Direction": "Corporate",
+    }
+    row.update(overrides)
+    return row
+
+
+def build_arrow_table(rows):
+    """Table typée équivalente à build_csv(rows) pour des lignes créées par csv_row()."""
+    def duration(value):
+        if not value:
+            return None
+        h, m, s = (int(x) for x in value.split(":"))
+        return timedelta(hours=h, minutes=m, seconds=s)
+
+    def clock(value):
+        return dtime(*(int(x) for x in value.split(":"))) if value else None
+
+    columns = {
+        "MATRICULE": pa.array([r["MATRICULE"] for r in rows]),
+        "NOM": pa.array([r["NOM"] for r in rows]),
+        "PRENOM": pa.array([r["PRENOM"] for r in rows]),
+        "Date": pa.array([datetime.strptime(r["Date"], "%d/%m/%Y").date() for r in rows], pa.date32()),
+        "Entrée": pa.array([clock(r.get("Entrée")) for r in rows], pa.time64("us")),
+        "Sortie": pa.array([clock(r.get("Sortie")) for r in rows], pa.time64("us")),
+        **{
+            h: pa.array([duration(r.get(h)) for r in rows], pa.duration("s"))
+            for h in ["Temps de présence réel", "Temps de présence théorique", "Entrée tardive", "Sortie anticipée"]
+        },
+        **{
+            h: pa.array([float(r.get(h) or 0) for r in rows], pa.float64())
+            for h in ["Absence Justifiée (par heure)", "Absence non justifiée"]
+        },
+        **{
+            h: pa.array([(r.get(h) or "").lower() == "oui" for r in rows], pa.bool_())
+            for h in ["Anomalie(badgeage impair)", "Jour TT Planifié"]
+        },
+        "Departement": pa.array([r["Departement"] for r in rows]),
+        "Direction": pa.array([r["Direction"] for r in rows]),
+    }
+    return pa.table(columns)
+
+
+def build_xlsx(rows):
+    """Classeur d'import avec des cellules typées comme celles exportées par la badgeuse."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(REQUIRED_HEADERS)
+    for row in rows:
+        sheet.append([row.get(h) for h in REQUIRED_HEADERS])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def xlsx_row(matricule, jour, **overrides):
+    row = {
+        "MATRICULE": matricule, "NOM": "Doe", "PRENOM": "John", "Date": jour,
+        "Entrée": dtime(9, 0), "Sortie": dtime(18, 0),
+        "Temps de présence réel": timedelta(hours=8), "Temps de présence théorique": timedelta(hours=8),
+        "Absence Justifiée (par heure)": 0, "Absence non justifiée": 0.0,
+        "Departement": "Marketing", "Direction": "Corporate",
+    }
+    row.update(overrides)
+    return row
+
+
+def day_file(rows, header=("MATRICULE", "Date", "Heures"), name="conges.csv"):
+    lines = [",".join(header)] + [",".join(row) for row in rows]
+    return ContentFile("\n".join(lines).encode("utf-8"), name=name)
+
+
+class StagingMixin:
+    """Zone de transit dans un MEDIA_ROOT temporaire."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+
+def create_org(direction="Corporate", departement="Marketing", matricules=(), manager=None):
+    """Direction, département (géré par `manager`) et collaborateurs rattachés."""
+    direction = Direction.objects.create(nom=direction)
+    departement = Departement.objects.create(nom=departement, direction=direction, manager=manager)
+    collaborateurs = [
+        Collaborateur.objects.create(matricule=m, nom="Doe", prenom="John", departement=departement, direction=direction)
+        for m in matricules
+    ]
+    return direction, departement, collaborateurs
+
+
+class ImportTestCase(TestCase):
+    """
+    Base des tests d'import : un utilisateur RH (self.user) et un registre de règles vidé à
+    chaque test (les règles créées par un test sont annulées avec sa transaction).
+    """
+    password = "password123"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="rh.import", password=cls.password)
+        cls.user.groups.add(Group.objects.get_or_create(name="RH")[0])
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(rule_registry.VERSION_KEY)
+        rule_registry.rule_service.clear()
+        self.addCleanup(rule_registry.rule_service.clear)
+
+    def run_import(self, rows, name="import.csv", **kwargs):
+        return import_csv(ContentFile(build_csv(rows).encode("utf-8"), name=name), self.user, **kwargs)
+
+
+# ─────────────────────────────────────────────
+# Vues et accès (core.views)
+# ─────────────────────────────────────────────
+
+
 class CoreFunctionalityTestCase(TestCase):
     """
     Suite de tests pour les fonctionnalités de base de l'application 'core'.
@@ -94,9 +291,7 @@ class CoreFunctionalityTestCase(TestCase):
         self.client.login(username='rh.test', password='password123')
         
         # Créer les données nécessaires pour le test
-        direction = Direction.objects.create(nom='Test Direction')
-        departement = Departement.objects.create(nom='Test Dept', direction=direction)
-        collaborateur = Collaborateur.objects.create(matricule='M999', nom='Doe', prenom='John', departement=departement)
+        _, _, (collaborateur,) = create_org('Test Direction', 'Test Dept', ['M999'])
         pointage = Pointage.objects.create(collaborateur=collaborateur, date='2024-01-01')
 
         # Appeler l'URL d'envoi d'e-mail
@@ -107,3 +302,1248 @@ class CoreFunctionalityTestCase(TestCase):
         self.assertEqual(mock_celery_task.call_count, 1)
         # Vérifier que la tâche a été appelée avec le bon ID de pointage
         mock_celery_task.assert_called_with(pointage.id)
+
+
+class DuplicateUploadTestCase(StagingMixin, ImportTestCase):
+    """Un fichier identique (même checksum) n'est pas réimporté, sauf demande explicite."""
+
+    def upload(self, content, **data):
+        return self.client.post(reverse('core:upload_csv'), {'file': SimpleUploadedFile("import.csv", content), **data})
+
+    @mock.patch('core.views.process_csv_import_task.delay')
+    def test_identical_upload_points_to_previous_batch(self, mock_task):
+        self.client.force_login(self.user)
+        content = build_csv([csv_row("M1", "02/01/2024"), csv_row("M1", "05/01/2024")]).encode("utf-8")
+        self.upload(content)
+        premier = ImportBatch.objects.get()
+        with open_staged(premier.source) as f:
+            import_csv(f, self.user, batch=premier)
+        premier.refresh_from_db()
+        self.assertEqual((premier.rows_committed, premier.date_min, premier.date_max), (2, date(2024, 1, 2), date(2024, 1, 5)))
+
+        # Le doublon est écarté avant la validation complète du fichier
+        with mock.patch('core.forms.validate_rows', wraps=validate_rows) as validation:
+            response = self.upload(content)
+        self.assertRedirects(response, reverse('core:import_batch_detail', args=[premier.id]))
+        validation.assert_not_called()
+        self.assertEqual(ImportBatch.objects.count(), 1)
+        self.assertEqual(mock_task.call_count, 1)
+
+        self.upload(content, force="on")
+        self.assertEqual(ImportBatch.objects.exclude(id=premier.id).get().duplicate_of, premier)
+        self.assertEqual(mock_task.call_count, 2)
+
+
+class HotQueriesTestCase(TestCase):
+    """Requêtes chaudes : pas de tri implicite, plages de dates indexables, rapport EXPLAIN."""
+
+    def test_unordered_pointage_query_has_no_join(self):
+        sql = str(Pointage.objects.filter(date=date(2024, 1, 2)).values_list("id").query)
+        self.assertNotIn("core_collaborateur", sql)
+        self.assertNotIn("ORDER BY", sql)
+
+    def test_day_range_covers_the_local_day(self):
+        start, end = day_range(date(2024, 3, 4))
+        self.assertEqual(timezone.localtime(start).hour, 0)
+        self.assertEqual(end - start, timedelta(days=1))
+        self.assertEqual(day_range(date(2024, 3, 4), days=7)[1] - start, timedelta(days=7))
+
+        local = timezone.get_current_timezone()
+        for moment in (datetime(2024, 3, 4, 23, 30), datetime(2024, 3, 5, 0, 30)):
+            email = EmailHistory.objects.create(to_email="a@example.com", subject="s", body="")
+            EmailHistory.objects.filter(id=email.id).update(created_at=moment.replace(tzinfo=local))
+        self.assertEqual(EmailHistory.objects.filter(created_at__gte=start, created_at__lt=end).count(), 1)
+
+    def test_synthetic_dataset_and_report(self):
+        out = io.StringIO()
+        call_command("explain_hot_queries", generate=600, collaborateurs=20, repeat=1, stdout=out)
+        self.assertEqual(Pointage.objects.count(), 600)
+        self.assertEqual(Anomalie.objects.count(), sum(Pointage.objects.values_list("anomaly_count", flat=True)))
+        self.assertEqual(AnomalyDailyStat.objects.aggregate(n=Sum("count"))["n"], Anomalie.objects.count())
+        self.assertIn("Historique : un jour (plage)", out.getvalue())
+        self.assertIn("600 pointage(s) synthétique(s)", out.getvalue())
+
+    def test_sample_keys_without_emails(self):
+        direction, departement, (collaborateur,) = create_org(matricules=["H1"])
+        pointage = Pointage.objects.create(
+            collaborateur=collaborateur, date=date(2024, 1, 2), direction=direction, departement=departement,
+        )
+        keys = sample_keys()
+        self.assertEqual((keys.email_pointage_id, keys.email_day), (pointage.id, date(2024, 1, 2)))
+
+
+# ─────────────────────────────────────────────
+# Sources : formats colonnaires, compressés, Excel (core.utils.sources)
+# ─────────────────────────────────────────────
+
+
+class ColumnarImportTestCase(StagingMixin, ImportTestCase):
+    """Les fichiers Parquet/Arrow passent par le même pipeline typé que le CSV, sans texte."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.rows = [
+            csv_row("M1", "02/01/2024", **{"Entrée tardive": "00:25:00"}),
+            csv_row("M2", "02/01/2024", **{"Jour TT Planifié": "Oui", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("M3", "03/01/2024", Sortie="", **{"Absence non justifiée": "2.0"}),
+        ]
+
+    def parquet_file(self, rows):
+        out = io.BytesIO()
+        pq.write_table(build_arrow_table(rows), out)
+        return ContentFile(out.getvalue(), name="import.parquet")
+
+    def test_parquet_matches_csv_import(self):
+        batch = import_csv(self.parquet_file(self.rows), self.user)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_inserted), (ImportBatch.DONE, 3))
+        parquet_anomalies = sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "type", "detail"))
+        self.assertEqual(len(parquet_anomalies), 3)
+
+        # Le CSV équivalent a les mêmes empreintes : rien n'est réécrit.
+        batch = self.run_import(self.rows)
+        batch.refresh_from_db()
+        self.assertEqual(batch.rows_skipped, 3)
+        self.assertEqual(sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "type", "detail")), parquet_anomalies)
+
+    def test_arrow_resume_skips_committed_rows(self):
+        sink = io.BytesIO()
+        with pa.ipc.new_file(sink, build_arrow_table(self.rows).schema) as writer:
+            writer.write_table(build_arrow_table(self.rows), max_chunksize=2)
+        frames = list(read_frames(io.BytesIO(sink.getvalue()), "arrow", chunk_size=5, skip=1))
+        self.assertEqual([list(f.index) for f in frames], [[1], [2]])
+        self.assertEqual(frames[0]["MATRICULE"].tolist(), ["M2"])
+
+    def test_parquet_partitions_stay_typed(self):
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.parquet")
+        partitions = partition_csv(self.parquet_file(self.rows), batch, 2, chunk_size=2)
+        self.assertTrue(all(p.source.endswith(".parquet") for p in partitions))
+        for partition in partitions:
+            with open_staged(partition.source) as f:
+                import_csv(f, self.user, batch=batch, checkpoint=partition)
+        finalize_partitions(batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed), (ImportBatch.DONE, 3))
+        self.assertEqual(Anomalie.objects.count(), 3)
+
+
+class CompressedImportTestCase(ImportTestCase):
+    """Les fichiers compressés sont décompressés en flux dans le lecteur par lots."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.janvier = [csv_row(f"M{i}", "02/01/2024", **{"Entrée tardive": "00:25:00"}) for i in range(3)]
+        cls.fevrier = [csv_row(f"M{i}", "01/02/2024") for i in range(3)]
+
+    def zip_content(self, members):
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, rows in members.items():
+                archive.writestr(name, build_csv(rows))
+        return out.getvalue()
+
+    def test_gzip_and_zstd_are_streamed(self):
+        csv_bytes = build_csv(self.janvier).encode("utf-8")
+        import_csv(ContentFile(gzip.compress(csv_bytes), name="janvier.csv.gz"), self.user, chunk_size=2)
+        self.assertEqual(Anomalie.objects.count(), 3)
+        batch = import_csv(
+            ContentFile(zstandard.ZstdCompressor().compress(csv_bytes), name="janvier.csv.zst"), self.user, chunk_size=2
+        )
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed, batch.rows_skipped), (ImportBatch.DONE, 3, 3))
+
+    def test_zip_of_monthly_files_resumes_across_members(self):
+        fevrier = [dict(r) for r in self.fevrier]
+        fevrier[1]["Date"] = "31/02/2024"
+        content = self.zip_content({"2024-01.csv": self.janvier, "2024-02.csv": fevrier})
+        with self.assertRaisesMessage(ValueError, "dans « 2024-02.csv » à la ligne 3,"):
+            import_csv(ContentFile(content, name="export.zip"), self.user, chunk_size=2)
+        batch = ImportBatch.objects.get()
+        self.assertEqual(batch.rows_committed, 3)  # les lots ne chevauchent pas deux fichiers
+
+        content = self.zip_content({"2024-01.csv": self.janvier, "2024-02.csv": self.fevrier})
+        import_csv(ContentFile(content, name="export.zip"), self.user, chunk_size=2, batch=batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed, batch.rows_inserted), (ImportBatch.DONE, 6, 6))
+        self.assertEqual(Pointage.objects.count(), 6)
+
+    def test_zip_errors_are_numbered_per_member(self):
+        janvier, fevrier = [dict(r) for r in self.janvier], [dict(r) for r in self.fevrier]
+        janvier[1]["Date"] = "pas une date"
+        fevrier[1]["Date"] = "31/02/2024"
+        content = self.zip_content({"2024-01.csv": janvier, "2024-02.csv": fevrier})
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="export.zip", lenient=True)
+        import_csv(ContentFile(content, name="export.zip"), self.user, chunk_size=2, batch=batch)
+        # Même numéro de ligne dans deux fichiers de l'archive : deux lignes en quarantaine distinctes
+        self.assertEqual(
+            list(batch.quarantine.values_list("member", "line")), [("2024-01.csv", 3), ("2024-02.csv", 3)]
+        )
+        self.assertNotIn("_ligne", batch.quarantine.first().raw)
+
+        corrigee = batch.quarantine.get(member="2024-02.csv")
+        corrigee.raw["Date"] = "02/02/2024"
+        corrigee.save()
+        self.assertEqual(reprocess_quarantine(batch), 1)
+        self.assertEqual(list(batch.quarantine.values_list("member", "line")), [("2024-01.csv", 3)])
+
+    def test_form_validates_headers_of_each_zip_member(self):
+        incomplet = build_csv(self.janvier).replace("MATRICULE", "MAT", 1)
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as archive:
+            archive.writestr("2024-01.csv", build_csv(self.janvier))
+            archive.writestr("2024-02.csv", incomplet)
+        form = CSVUploadForm(files={"file": SimpleUploadedFile("export.zip", out.getvalue())})
+        self.assertFalse(form.is_valid())
+        self.assertIn("« 2024-02.csv » : MATRICULE", form.errors["file"][0])
+
+        csv_gz = gzip.compress(build_csv(self.janvier).encode("utf-8"))
+        self.assertTrue(CSVUploadForm(files={"file": SimpleUploadedFile("janvier.csv.gz", csv_gz)}).is_valid())
+
+
+class ExcelImportTestCase(StagingMixin, ImportTestCase):
+    """Les classeurs .xlsx sont lus en flux et suivent le même typage que le CSV."""
+
+    def test_typed_cells_are_imported_like_csv(self):
+        rows = [xlsx_row(1001, datetime(2024, 1, 2), **{"Entrée tardive": timedelta(minutes=25)}),
+                xlsx_row("M2", datetime(2024, 1, 2), **{"Anomalie(badgeage impair)": True})]
+        batch = import_csv(ContentFile(build_xlsx(rows), name="janvier.xlsx"), self.user, chunk_size=1)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed), (ImportBatch.DONE, 2))
+        pointage = Pointage.objects.get(collaborateur__matricule="1001")  # pas de « 1001.0 »
+        self.assertEqual((pointage.date, pointage.entree), (date(2024, 1, 2), dtime(9, 0)))
+        self.assertEqual(pointage.temps_presence_reel, timedelta(hours=8))
+        self.assertEqual(set(Anomalie.objects.values_list("type", flat=True)), {Anomalie.LATE, Anomalie.BADGE})
+
+        # Le même contenu en CSV donne les mêmes empreintes : rien n'est réécrit
+        csv_rows = [csv_row("1001", "02/01/2024", **{"Entrée tardive": "0:25:00"}),
+                    csv_row("M2", "02/01/2024", **{"Anomalie(badgeage impair)": "Oui"})]
+        batch = self.run_import(csv_rows, name="janvier.csv")
+        batch.refresh_from_db()
+        self.assertEqual(batch.rows_skipped, 2)
+
+    def test_long_durations_read_as_epoch_dates(self):
+        # Badgeuse : 1,25 jour au format « h:mm:ss » (sans crochets), relu par openpyxl comme 1900-01-01 06:00
+        workbook = openpyxl.Workbook()
+        workbook.active.append(REQUIRED_HEADERS)
+        workbook.active.append([xlsx_row("M1", datetime(2024, 1, 2)).get(h) for h in REQUIRED_HEADERS])
+        cell = workbook.active.cell(row=2, column=REQUIRED_HEADERS.index("Temps de présence théorique") + 1, value=1.25)
+        cell.number_format = "h:mm:ss"
+        out = io.BytesIO()
+        workbook.save(out)
+        raw = next(read_frames(io.BytesIO(out.getvalue()), "xlsx"))
+        self.assertEqual((raw["Temps de présence théorique"][0], raw["Date"][0]), ("30:00:00", "02/01/2024"))
+
+    def test_resume_and_partitions(self):
+        rows = [xlsx_row(f"M{i}", datetime(2024, 1, 2)) for i in range(5)]
+        rows[3]["Date"] = "31/02/2024"
+        content = build_xlsx(rows)
+        with self.assertRaisesMessage(ValueError, "ligne 5"):
+            import_csv(ContentFile(content, name="export.xlsx"), self.user, chunk_size=2)
+        batch = ImportBatch.objects.get()
+        self.assertEqual(batch.rows_committed, 2)
+        rows[3]["Date"] = datetime(2024, 1, 2)
+        import_csv(ContentFile(build_xlsx(rows), name="export.xlsx"), self.user, chunk_size=2, batch=batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed, batch.rows_inserted), (ImportBatch.DONE, 5, 5))
+
+        batch = ImportBatch.objects.create(filename="export.xlsx")
+        partitions = partition_csv(ContentFile(content, name="export.xlsx"), batch, 2)
+        self.assertTrue(all(p.source.endswith(".csv") for p in partitions))
+        self.assertEqual(sum(p.rows_committed for p in partitions), 0)
+
+    def test_headers_are_validated(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["MATRICULE", "NOM"])
+        out = io.BytesIO()
+        workbook.save(out)
+        form = CSVUploadForm(files={"file": SimpleUploadedFile("export.xlsx", out.getvalue())})
+        self.assertFalse(form.is_valid())
+        self.assertIn("Colonne(s) manquante(s)", str(form.errors))
+        form = CSVUploadForm(files={"file": SimpleUploadedFile("export.xlsx", build_xlsx([xlsx_row("M1", datetime(2024, 1, 2))]))})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.summary.rows, 1)
+
+
+# ─────────────────────────────────────────────
+# Typage et validation (core.utils.parsing, core.utils.validation)
+# ─────────────────────────────────────────────
+
+
+class ParseFrameTestCase(ImportTestCase):
+    """Tests de l'étape de typage vectorisée (core.utils.parsing.parse_frame)."""
+
+    def parse(self, rows):
+        return parse_frame(pd.read_csv(io.StringIO(build_csv(rows)), **CSV_READ_OPTIONS))
+
+    def test_columns_are_typed(self):
+        frame, errors = self.parse([
+            csv_row("M1", "02/01/2024", **{"Entrée tardive": "0:25", "Absence non justifiée": "1,5"}),
+            csv_row("M2", "03/01/2024", **{"Sortie anticipée": "oui", "Jour TT Planifié": " OUI "}),
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual(str(frame["date"].dtype)[:10], "datetime64")
+        self.assertEqual(frame["entree_tardive"].iloc[0].to_pytimedelta(), timedelta(minutes=25))
+        self.assertTrue(pd.isna(frame["sortie_anticipee"].iloc[1]))
+        self.assertEqual(frame["absence_non_justifiee"].iloc[0], 1.5)
+        self.assertEqual(frame["jour_tt_planifie"].tolist(), [False, True])
+
+    def test_errors_report_line_and_column(self):
+        frame, errors = self.parse([
+            csv_row("M1", "02/01/2024"),
+            csv_row("M2", "2024-01-03"),
+            csv_row("M3", "04/01/2024", Sortie="25:00", **{"Absence non justifiée": "abc"}),
+            csv_row("", "n'importe quoi"),
+        ])
+        self.assertEqual(frame["matricule"].tolist(), ["M1"])
+        self.assertEqual(
+            [(e.line, e.column) for e in errors],
+            [(3, "Date"), (4, "Sortie"), (4, "Absence non justifiée")],
+        )
+
+    def test_out_of_range_values_are_errors(self):
+        frame, errors = self.parse([
+            csv_row("M1", "02/01/1999"),
+            csv_row("M2", "02/01/2024", **{"Temps de présence réel": "25:00:00"}),
+            csv_row("M3", "02/01/2024", **{"Absence non justifiée": "30"}),
+            csv_row("M4", "02/01/2024", **{"Temps de présence réel": "24:00:00", "Absence non justifiée": "24"}),
+        ])
+        self.assertEqual(frame["matricule"].tolist(), ["M4"])
+        self.assertEqual([(e.line, e.column, e.reason[:15]) for e in errors], [
+            (2, "Date", "date hors borne"), (3, "Temps de présence réel", "durée hors born"),
+            (4, "Absence non justifiée", "nombre d'heures"),
+        ])
+
+    def test_import_rejects_file_with_errors(self):
+        with self.assertRaisesMessage(ValueError, "ligne 2, colonne « Entrée »"):
+            self.run_import([csv_row("M1", "02/01/2024", Entrée="9h")])
+        self.assertFalse(Pointage.objects.exists())
+
+
+class PreValidationTestCase(StagingMixin, ImportTestCase):
+    """Passe complète (types et bornes) sur le fichier avant la mise en file de l'import."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_summary_counts_rows_dates_matricules_and_errors(self):
+        rows = [csv_row(f"M{i % 3}", f"0{1 + i % 5}/01/2024") for i in range(10)]
+        rows[4]["Date"] = "32/01/2024"
+        rows[6]["Absence non justifiée"] = "30"
+        rows[7]["Temps de présence réel"] = "25:00:00"
+        summary = validate_rows(io.BytesIO(build_csv(rows).encode("utf-8")), chunk_size=3, max_errors=2)
+        self.assertEqual((summary.rows, summary.matricules, summary.error_count), (10, 3, 3))
+        self.assertEqual((summary.date_min, summary.date_max), (date(2024, 1, 1), date(2024, 1, 5)))
+        self.assertEqual([(e.line, e.column) for e in summary.errors], [(6, "Date"), (8, "Absence non justifiée")])
+        self.assertFalse(summary.ok)
+
+    @mock.patch('core.views.process_csv_import_task.delay')
+    def test_invalid_file_is_rejected_before_enqueueing(self, mock_task):
+        rows = [csv_row("M1", "02/01/2024"), csv_row("M2", "2024-01-02")]
+        content = build_csv(rows).encode("utf-8")
+        response = self.client.post(reverse('core:upload_csv'), {'file': SimpleUploadedFile("import.csv", content)})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ligne 3, colonne « Date »")
+        self.assertFalse(ImportBatch.objects.exists())
+        mock_task.assert_not_called()
+
+        # En mode tolérant, le fichier est accepté (la ligne ira en quarantaine)
+        self.assertEqual(validate_content(io.BytesIO(content), "import.csv", lenient=True).error_count, 1)
+        self.client.post(reverse('core:upload_csv'), {'file': SimpleUploadedFile("import.csv", content), 'lenient': 'on'})
+        batch = ImportBatch.objects.get()
+        self.assertEqual(batch.metrics["stages"]["validate"]["rows"], 2)
+        mock_task.assert_called_once_with(str(batch.id))
+
+
+# ─────────────────────────────────────────────
+# Import ensembliste (core.utils.etl)
+# ─────────────────────────────────────────────
+
+
+class BulkImportTestCase(ImportTestCase):
+    """Tests du moteur d'import ensembliste (core.utils.etl.import_csv)."""
+
+    def test_import_creates_pointages_and_anomalies(self):
+        self.run_import([
+            csv_row("M1", "02/01/2024", **{"Entrée tardive": "00:25:00"}),
+            csv_row("M1", "03/01/2024", **{"Jour TT Planifié": "Oui", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("M2", "02/01/2024", Direction="corporate", **{"Absence non justifiée": "2.0"}),
+        ])
+        self.assertEqual(Direction.objects.count(), 1)
+        self.assertEqual(Departement.objects.count(), 1)
+        self.assertEqual(Collaborateur.objects.filter(email__endswith="factice@orange.com").count(), 2)
+        self.assertEqual(Pointage.objects.count(), 3)
+        self.assertEqual(
+            sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "type")),
+            sorted([("M1", Anomalie.LATE), ("M1", Anomalie.BADGE), ("M2", Anomalie.ABS_UNJ)]),
+        )
+        self.assertTrue(TeleworkDay.objects.filter(collaborateur__matricule="M1").exists())
+
+    def test_reimport_replaces_anomalies(self):
+        self.run_import([csv_row("M1", "02/01/2024", **{"Entrée tardive": "00:25:00"})])
+        self.run_import([csv_row("M1", "02/01/2024", **{"Sortie anticipée": "00:10:00"})])
+        self.assertEqual(Pointage.objects.count(), 1)
+        self.assertEqual(list(Anomalie.objects.values_list("type", flat=True)), [Anomalie.EARLY_LEAVE])
+
+    def test_holiday_only_keeps_badge_anomaly(self):
+        HolidayMA.objects.create(date=date(2024, 1, 2), label="Férié")
+        self.run_import([csv_row("M1", "02/01/2024", **{"Entrée tardive": "00:25:00", "Anomalie(badgeage impair)": "Oui"})])
+        self.assertEqual(list(Anomalie.objects.values_list("type", "is_holiday")), [(Anomalie.BADGE, True)])
+
+    def test_leave_and_telework_tables_are_special_days(self):
+        _, _, (collab,) = create_org(matricules=["M1"])
+        Leave.objects.create(collaborateur=collab, date=date(2024, 1, 2), hours=8)
+        TeleworkDay.objects.create(collaborateur=collab, date=date(2024, 1, 3))
+        en_retard = {"Entrée tardive": "00:25:00"}
+        self.run_import([
+            csv_row("M1", "02/01/2024", **en_retard), csv_row("M1", "03/01/2024", **en_retard),
+            csv_row("M1", "04/01/2024", **en_retard), csv_row("M2", "02/01/2024", **en_retard),
+        ])
+        self.assertEqual(
+            sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "pointage__date")),
+            [("M1", date(2024, 1, 4)), ("M2", date(2024, 1, 2))],
+        )
+        self.assertEqual(TeleworkDay.objects.count(), 1)
+
+    def test_failed_chunk_keeps_previous_chunks_and_resumes(self):
+        rows = [csv_row(f"M{i}", "02/01/2024") for i in range(5)]
+        rows[3]["Date"] = "31/02/2024"
+        with self.assertRaisesMessage(ValueError, "ligne 5"):
+            self.run_import(rows, chunk_size=2)
+        batch = ImportBatch.objects.get()
+        self.assertEqual((batch.status, batch.rows_committed, batch.chunks_committed), (ImportBatch.FAILED, 2, 1))
+        self.assertEqual(Pointage.objects.count(), 2)
+
+        # Fichier corrigé : la reprise ne relit pas les lignes déjà validées.
+        rows[3]["Date"] = "03/01/2024"
+        rows[0]["Entrée tardive"] = "00:30:00"
+        self.run_import(rows, chunk_size=2, batch=batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed, batch.chunks_committed), (ImportBatch.DONE, 5, 3))
+        self.assertEqual(Pointage.objects.count(), 5)
+        self.assertFalse(Anomalie.objects.exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count_queries(n):
+            rows = [csv_row(f"Q{n}-{i}", "02/01/2024", **{"Entrée tardive": "00:05:00"}) for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.run_import(rows)
+            return len(ctx.captured_queries)
+
+        count_queries(1)  # Crée les dimensions (Direction/Département) une fois pour toutes.
+        self.assertEqual(count_queries(10), count_queries(40))
+
+
+class DeltaImportTestCase(ImportTestCase):
+    """Import différentiel : les lignes identiques (même empreinte) ne sont ni réécrites ni ré-analysées."""
+
+    def counters(self, batch):
+        batch.refresh_from_db()
+        return batch.rows_inserted, batch.rows_updated, batch.rows_skipped
+
+    def test_reimport_counts_inserted_updated_skipped(self):
+        rows = [csv_row(f"M{i}", "02/01/2024", **{"Entrée tardive": "00:25:00"}) for i in range(4)]
+        self.assertEqual(self.counters(self.run_import(rows)), (4, 0, 0))
+        anomalies = dict(Anomalie.objects.values_list("pointage__collaborateur__matricule", "id"))
+
+        rows[1]["Entrée tardive"] = "0:25"  # même valeur une fois normalisée
+        rows[2]["Entrée tardive"] = ""
+        rows.append(csv_row("M9", "02/01/2024"))
+        self.assertEqual(self.counters(self.run_import(rows)), (1, 1, 3))
+        self.assertEqual(Pointage.objects.count(), 5)
+        # Les anomalies des lignes inchangées ne sont pas recréées ; celle de M2 disparaît.
+        del anomalies["M2"]
+        self.assertEqual(dict(Anomalie.objects.values_list("pointage__collaborateur__matricule", "id")), anomalies)
+
+    def test_identical_reimport_writes_nothing(self):
+        rows = [csv_row(f"M{i}", "02/01/2024", **{"Entrée tardive": "00:25:00"}) for i in range(20)]
+        self.run_import(rows)
+        with CaptureQueriesContext(connection) as ctx:
+            batch = self.run_import(rows)
+        self.assertEqual(self.counters(batch), (0, 0, 20))
+        ecritures = [q["sql"] for q in ctx.captured_queries if q["sql"].split()[0] in ("INSERT", "DELETE")]
+        self.assertEqual(len(ecritures), 1)  # la création de l'ImportBatch
+        self.assertFalse(Pointage.objects.filter(batch=batch).exists())
+
+
+class ImportMetricsTestCase(ImportTestCase):
+    """Métriques par étape enregistrées sur l'ImportBatch et page de détail de l'import."""
+
+    def test_stages_and_anomaly_counts_are_recorded(self):
+        rows = [csv_row(f"M{i}", "02/01/2024", **{"Entrée tardive": "00:25:00"}) for i in range(3)]
+        rows.append(csv_row("M9", "02/01/2024", **{"Absence non justifiée": "2.0"}))
+        batch = self.run_import(rows, chunk_size=2)
+        batch.refresh_from_db()
+        stages = batch.metrics["stages"]
+        self.assertTrue({"read", "parse", "delta", "dimensions", "upsert", "detection", "anomalies", "telework"} <= set(stages))
+        self.assertEqual(stages["parse"]["rows"], 4)
+        self.assertGreater(stages["upsert"]["queries"], 0)
+        self.assertGreaterEqual(stages["upsert"]["stage_peak_mb"], 0)
+        self.assertEqual(batch.metrics["anomalies"], {Anomalie.LATE: 3, Anomalie.ABS_UNJ: 1})
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:import_batch_detail', args=[batch.id]))
+        self.assertContains(response, "Typage des colonnes")
+        self.assertContains(response, "Entrée tardive")
+        response = self.client.get(reverse('core:upload_csv'))
+        self.assertContains(response, reverse('core:import_batch_detail', args=[batch.id]))
+
+    def test_memory_peak_is_per_stage(self):
+        if not metrics_module._reset_peak_rss():
+            self.skipTest("/proc/self/clear_refs indisponible")
+        metrics = ImportMetrics()
+        with metrics.stage("parse"):
+            tableau = np.ones(64 * 2**20 // 8)  # 64 Mo écrits
+            del tableau
+        with metrics.stage("delta"):
+            pass
+        self.assertGreater(metrics.stages["parse"]["stage_peak_mb"], 60)
+        # Le pic de l'étape précédente n'est pas reporté (contrairement à ru_maxrss)
+        self.assertLess(metrics.stages["delta"]["stage_peak_mb"], 10)
+
+
+class QuarantineTestCase(ImportTestCase):
+    """Mode tolérant : les lignes invalides vont en quarantaine, le reste est importé."""
+
+    def test_invalid_rows_are_quarantined_then_reprocessed(self):
+        rows = [csv_row(f"M{i}", "02/01/2024", **{"Entrée tardive": "00:25:00"}) for i in range(5)]
+        rows[1]["Date"] = "31/02/2024"
+        rows[3]["Entrée"] = "9h"
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv", lenient=True)
+        self.run_import(rows, batch=batch, chunk_size=2)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_inserted, batch.rows_quarantined), (ImportBatch.DONE, 3, 2))
+        self.assertEqual(
+            [(q.line, q.errors[0]["column"]) for q in batch.quarantine.all()], [(3, "Date"), (5, "Entrée")]
+        )
+
+        # Seule la ligne 3 est corrigée : elle est importée, la ligne 5 reste en quarantaine.
+        corrigee = batch.quarantine.get(line=3)
+        corrigee.raw["Date"] = "03/01/2024"
+        corrigee.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(reprocess_quarantine(batch), 1)
+        self.assertFalse(any("M0" in q["sql"] for q in ctx.captured_queries))
+        batch.refresh_from_db()
+        self.assertEqual((batch.rows_inserted, batch.rows_quarantined), (4, 1))
+        self.assertEqual(list(QuarantinedRow.objects.values_list("line", flat=True)), [5])
+        self.assertTrue(Anomalie.objects.filter(pointage__collaborateur__matricule="M1", pointage__date=date(2024, 1, 3)).exists())
+
+    def test_out_of_range_rows_are_quarantined(self):
+        rows = [csv_row("M1", "02/01/2024"), csv_row("M2", "02/01/2024", **{"Entrée tardive": "30:00:00"})]
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv", lenient=True)
+        self.run_import(rows, batch=batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.rows_inserted, batch.rows_quarantined), (1, 1))
+        self.assertEqual(batch.quarantine.get().errors[0]["column"], "Entrée tardive")
+
+
+class PartitionedImportTestCase(StagingMixin, ImportTestCase):
+    """Découpage par matricule puis import indépendant de chaque partition."""
+
+    def test_partitions_are_disjoint_by_matricule(self):
+        rows = [csv_row(f"M{i % 7}", f"{2 + i // 7:02d}/01/2024", **{"Entrée tardive": "00:10:00"}) for i in range(40)]
+        batch = ImportBatch.objects.create(filename="import.csv")
+        partitions = partition_csv(io.BytesIO(build_csv(rows).encode("utf-8")), batch, 3, chunk_size=8)
+        self.assertLessEqual(len(partitions), 3)  # une partition vide n'est pas créée
+        self.assertEqual(Direction.objects.count(), 1)
+
+        matricules = []
+        for partition in partitions:
+            with open_staged(partition.source) as f:
+                matricules.append(set(pd.read_csv(f, dtype=str)["MATRICULE"]))
+            with open_staged(partition.source) as f:
+                import_csv(f, self.user, batch=batch, checkpoint=partition, chunk_size=5)
+        for i, a in enumerate(matricules):
+            for b in matricules[i + 1:]:
+                self.assertFalse(a & b)
+
+        finalize_partitions(batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed), (ImportBatch.DONE, 40))
+        self.assertEqual(Pointage.objects.filter(batch=batch).count(), 40)
+        self.assertEqual(Anomalie.objects.count(), 40)
+
+    def test_errors_keep_original_line_numbers(self):
+        rows = [csv_row(f"M{i}", "02/01/2024") for i in range(6)]
+        rows[4]["Date"] = "pas une date"
+        batch = ImportBatch.objects.create(filename="import.csv")
+        partitions = partition_csv(io.BytesIO(build_csv(rows).encode("utf-8")), batch, 2)
+        erreurs = []
+        for partition in partitions:
+            try:
+                with open_staged(partition.source) as f:
+                    import_csv(f, self.user, batch=batch, checkpoint=partition)
+            except ValueError as e:
+                erreurs.append(str(e))
+        self.assertEqual(len(erreurs), 1)
+        self.assertIn("ligne 6,", erreurs[0])
+        finalize_partitions(batch)
+        self.assertEqual(ImportBatch.objects.get().status, ImportBatch.FAILED)
+
+    def test_zip_members_are_aligned_on_first_header(self):
+        janvier = build_csv([csv_row(f"M{i}", "02/01/2024") for i in range(4)])
+        fevrier = pd.read_csv(io.StringIO(build_csv([csv_row(f"M{i}", "01/02/2024") for i in range(4)])), dtype=str)
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as archive:
+            archive.writestr("2024-01.csv", janvier)
+            archive.writestr("2024-02.csv", fevrier[fevrier.columns[::-1]].to_csv(index=False))
+        batch = ImportBatch.objects.create(filename="export.zip")
+        partitions = partition_csv(ContentFile(out.getvalue(), name="export.zip"), batch, 2)
+        for partition in partitions:
+            with open_staged(partition.source) as f:
+                import_csv(f, self.user, batch=batch, checkpoint=partition)
+        finalize_partitions(batch)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed), (ImportBatch.DONE, 8))
+        self.assertEqual(Pointage.objects.filter(date=date(2024, 2, 1), collaborateur__nom="Doe").count(), 4)
+
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as archive:
+            archive.writestr("2024-01.csv", janvier)
+            archive.writestr("2024-02.csv", fevrier.assign(SERVICE="x").to_csv(index=False))
+        batch = ImportBatch.objects.create(filename="export.zip")
+        with self.assertRaisesMessage(ValueError, "SERVICE"):
+            partition_csv(ContentFile(out.getvalue(), name="export.zip"), batch, 1)
+
+
+# ─────────────────────────────────────────────
+# Zone de transit et upload par morceaux (core.utils.staging)
+# ─────────────────────────────────────────────
+
+
+class StagedUploadTestCase(StagingMixin, ImportTestCase):
+    """Le fichier est copié dans la zone de transit ; la tâche ne reçoit que l'id du lot."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = build_csv([csv_row(f"M{i}", "02/01/2024") for i in range(3)]).encode("utf-8")
+
+    def test_stage_upload_records_path_checksum_and_size(self):
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv")
+        stage_upload(batch, SimpleUploadedFile("import.csv", self.content))
+        batch.refresh_from_db()
+        self.assertEqual(batch.checksum, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(batch.size, len(self.content))
+        with open_staged(batch.source) as f:
+            self.assertEqual(f.read(), self.content)
+
+    @override_settings(IMPORT_PARTITIONS=1)
+    def test_task_imports_from_staging_and_cleans_up(self):
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv")
+        stage_upload(batch, SimpleUploadedFile("import.csv", self.content))
+        process_csv_import_task(str(batch.id))
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.rows_committed), (ImportBatch.DONE, 3))
+        self.assertEqual(Pointage.objects.filter(batch=batch).count(), 3)
+        self.assertFalse(default_storage.exists(batch.source))
+
+    @override_settings(IMPORT_PARTITIONS=2)
+    def test_partitioning_failure_marks_batch_failed(self):
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv")
+        stage_upload(batch, SimpleUploadedFile("import.csv", self.content))
+        with mock.patch("core.tasks.partition_csv", side_effect=OSError("disque plein")), \
+                mock.patch.object(process_csv_import_task, "update_state"):
+            with self.assertRaises(OSError):
+                process_csv_import_task(str(batch.id))
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.error), (ImportBatch.FAILED, "disque plein"))
+
+    @override_settings(IMPORT_PARTITIONS=1)
+    def test_exhausted_retries_mark_batch_failed(self):
+        batch = ImportBatch.objects.create(uploaded_by=self.user, filename="import.csv")
+        stage_upload(batch, SimpleUploadedFile("import.csv", self.content))
+        process_csv_import_task.push_request(retries=process_csv_import_task.max_retries)
+        try:
+            with mock.patch("core.tasks.import_csv", side_effect=OperationalError("verrou mortel")):
+                with self.assertRaises(OperationalError):
+                    process_csv_import_task(str(batch.id))
+        finally:
+            process_csv_import_task.pop_request()
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.error), (ImportBatch.FAILED, "verrou mortel"))
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=64)
+class ResumableUploadTestCase(StagingMixin, ImportTestCase):
+    """Upload par morceaux acquittés par offset, reprenable après une coupure."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.content = build_csv([csv_row(f"M{i}", "02/01/2024") for i in range(4)]).encode("utf-8")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def put_chunk(self, url, offset, data):
+        return self.client.put(url, data, content_type='application/octet-stream', headers={'Upload-Offset': str(offset)})
+
+    @mock.patch('core.views.process_csv_import_task.delay')
+    def test_chunks_resume_after_disconnect_and_enqueue_on_last(self, mock_task):
+        response = self.client.post(reverse('core:upload_sessions'), {'filename': 'export.csv', 'size': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        state = response.json()
+        self.assertEqual((state['offset'], state['chunk_size']), (0, 64))
+        url = reverse('core:upload_session_chunk', args=[state['id']])
+
+        self.assertEqual(self.put_chunk(url, 0, self.content[:64]).json()['offset'], 64)
+        # Coupure : le client a perdu l'acquittement et renvoie le même morceau -> 409 avec l'offset serveur
+        response = self.put_chunk(url, 0, self.content[:64])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 64))
+        # Reprise : l'offset est redemandé puis l'envoi continue
+        offset = self.client.get(url).json()['offset']
+        while offset + 64 < len(self.content):
+            offset = self.put_chunk(url, offset, self.content[offset:offset + 64]).json()['offset']
+        mock_task.assert_not_called()
+
+        response = self.put_chunk(url, offset, self.content[offset:])
+        self.assertEqual(response.status_code, 201)
+        session = UploadSession.objects.get()
+        batch = session.batch
+        self.assertEqual(session.status, UploadSession.DONE)
+        self.assertEqual(response.json()['batch_url'], reverse('core:import_batch_detail', args=[batch.id]))
+        mock_task.assert_called_once_with(str(batch.id))
+        self.assertEqual((batch.checksum, batch.size), (hashlib.sha256(self.content).hexdigest(), len(self.content)))
+        with open_staged(batch.source) as f:
+            self.assertEqual(f.read(), self.content)
+        # Les morceaux sont supprimés une fois assemblés
+        self.assertFalse(any(default_storage.exists(name) for _, name in session.chunks))
+
+    @mock.patch('core.views.process_csv_import_task.delay')
+    def test_invalid_headers_fail_the_session(self, mock_task):
+        content = b"MATRICULE,NOM\nM1,Test\n"
+        state = self.client.post(
+            reverse('core:upload_sessions'), {'filename': 'export.csv', 'size': len(content)}
+        ).json()
+        response = self.put_chunk(reverse('core:upload_session_chunk', args=[state['id']]), 0, content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], UploadSession.FAILED)
+        self.assertIn("Colonne(s) manquante(s)", response.json()['error'])
+        self.assertFalse(ImportBatch.objects.exists())
+        mock_task.assert_not_called()
+
+    @mock.patch('core.views.process_csv_import_task.delay')
+    def test_duplicate_file_skips_validation(self, mock_task):
+        states = []
+        for _ in range(2):
+            state = self.client.post(reverse('core:upload_sessions'), {'filename': 'export.csv', 'size': len(self.content)}).json()
+            url = reverse('core:upload_session_chunk', args=[state['id']])
+            with mock.patch('core.forms.validate_rows', wraps=validate_rows) as validation:
+                for offset in range(0, len(self.content), 64):
+                    response = self.put_chunk(url, offset, self.content[offset:offset + 64])
+            states.append((response.status_code, response.json()['batch_url'], validation.call_count))
+        premier = ImportBatch.objects.get()
+        url = reverse('core:import_batch_detail', args=[premier.id])
+        self.assertEqual(states, [(201, url, 1), (200, url, 0)])
+        mock_task.assert_called_once()
+
+    def test_declared_size_is_capped(self):
+        with self.settings(UPLOAD_MAX_SIZE=100):
+            response = self.client.post(reverse('core:upload_sessions'), {'filename': 'export.csv', 'size': 101})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_expired_sessions_are_purged_with_their_chunks(self):
+        urls = []
+        for _ in range(2):
+            state = self.client.post(reverse('core:upload_sessions'), {'filename': 'export.csv', 'size': len(self.content)}).json()
+            urls.append(reverse('core:upload_session_chunk', args=[state['id']]))
+            self.put_chunk(urls[-1], 0, self.content[:64])
+        abandoned, active = UploadSession.objects.order_by('created_at')
+        UploadSession.objects.filter(id=abandoned.id).update(updated_at=timezone.now() - timedelta(hours=25))
+
+        out = io.StringIO()
+        call_command("purge_upload_sessions", stdout=out)
+        self.assertIn("1 session(s)", out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list("id", flat=True)), [active.id])
+        self.assertFalse(default_storage.exists(abandoned.chunks[0][1]))
+        self.assertTrue(default_storage.exists(active.chunks[0][1]))
+        self.assertEqual(self.client.get(urls[0]).status_code, 404)
+
+
+# ─────────────────────────────────────────────
+# Cache des dimensions (core.utils.dimensions)
+# ─────────────────────────────────────────────
+
+
+class DimensionCacheTestCase(TestCase):
+    """Cache de dimensions du processus : aucune requête tant qu'aucune dimension ne change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager.dim', email='manager@orange.com')
+        cls.direction, cls.departement, cls.collabs = create_org(matricules=["D0", "D1", "D2"], manager=cls.manager)
+
+    def setUp(self):
+        cache.delete(VERSION_KEY)
+        dimension_cache.clear()
+        self.addCleanup(dimension_cache.clear)  # les lignes de test sont annulées en fin de test
+
+    def warm(self, dimensions=dimension_cache):
+        # Dans une transaction, le cache n'est rempli qu'au commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return dimensions.dimensions()
+
+    def test_lookups_cost_no_query_once_warm(self):
+        self.warm()
+        with self.assertNumQueries(0):
+            dims = dimension_cache.dimensions()
+            ref = dimension_cache.departement(self.departement.id)
+        self.assertEqual(dims.directions["corporate"], self.direction.id)
+        self.assertEqual(dims.departements[("marketing", self.direction.id)], self.departement.id)
+        self.assertEqual((ref.manager_id, ref.manager_email), (self.manager.id, "manager@orange.com"))
+
+        resolver = DimensionResolver()
+        frame = pd.DataFrame({"direction": ["CORPORATE"], "departement": ["marketing"]})
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve(frame), ([self.direction.id], [self.departement.id]))
+
+    def test_writes_invalidate_through_signals_and_shared_version(self):
+        self.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            Direction.objects.create(nom="Réseau")
+        self.assertIn("réseau", self.warm().directions)
+
+        # Écriture faite par un autre processus : seule la version partagée change
+        other = DimensionCache(check_seconds=0)
+        self.warm(other)
+        Direction.objects.filter(nom="Réseau").update(nom="Réseaux")
+        with self.assertNumQueries(0):
+            self.assertIn("réseau", other.dimensions().directions)
+        cache.set(VERSION_KEY, "autre-version")
+        self.assertIn("réseaux", self.warm(other).directions)
+
+    def test_login_does_not_invalidate(self):
+        self.warm()
+        version = cache.get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.manager)  # sauvegarde de last_login seul
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+        self.manager.email = "nouveau@orange.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manager.save(update_fields=["email"])
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+        self.assertEqual(self.warm().departement_refs[self.departement.id].manager_email, "nouveau@orange.com")
+
+    def test_collaborateurs_are_lru_bounded(self):
+        lru = DimensionCache(max_collaborateurs=2, check_seconds=60)
+        with self.captureOnCommitCallbacks(execute=True):
+            refs = lru.collaborateurs(["D0", "D1", "D2", "inconnu"])
+        self.assertEqual({mat: ref.id for mat, ref in refs.items()}, {c.matricule: c.id for c in self.collabs})
+        with self.assertNumQueries(0):
+            self.assertEqual(set(lru.collaborateurs(["D1", "D2"])), {"D1", "D2"})
+        with self.assertNumQueries(1):
+            lru.collaborateurs(["D0"])  # évincé (le moins récemment utilisé)
+
+
+class ImportManagersTestCase(TestCase):
+    """Commande import_managers : un département existant est retrouvé par son seul nom."""
+
+    def test_existing_department_is_matched_by_name_only(self):
+        _, marketing, _ = create_org("Corporate", "Marketing")
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", delete=False) as f:
+            f.write("direction_nom,departement_nom,manager_email\n"
+                    "Digital,marketing ,m.marketing@orange.com\nDigital,Data,m.data@orange.com\n")
+        self.addCleanup(os.remove, f.name)
+        call_command("import_managers", f.name, stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Departement.objects.values_list("nom", "direction__nom", "manager__email")),
+            [("Data", "Digital", "m.data@orange.com"), ("Marketing", "Corporate", "m.marketing@orange.com")],
+        )
+
+
+# ─────────────────────────────────────────────
+# Calendrier ouvré (core.utils.business_calendar)
+# ─────────────────────────────────────────────
+
+
+class BusinessCalendarTestCase(TestCase):
+    """Un tableau de drapeaux par jour remplace les requêtes HolidayMA à chaque date."""
+
+    def setUp(self):
+        cache.delete(bc.VERSION_KEY)
+        bc.calendar_service.clear()
+        self.addCleanup(bc.calendar_service.clear)
+
+    def warm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return bc.get_calendar()
+
+    def test_day_flags_and_masks(self):
+        calendar = bc.BusinessCalendar(2024, 2024, db_dates=[date(2024, 3, 5)])
+        self.assertEqual(calendar.day_flags(date(2024, 1, 1)), bc.FIXED)
+        self.assertEqual(calendar.day_flags(date(2024, 1, 6)), bc.WEEKEND)
+        self.assertEqual(calendar.day_flags(date(2024, 3, 5)), bc.DB)
+        self.assertEqual(calendar.day_flags(date(2024, 4, 10)), bc.VARIABLE)  # Aïd Al Fitr (estimé)
+        self.assertTrue(calendar.is_working_day(date(2024, 1, 2)))
+        # Hors période : même réponse, calculée à la volée
+        self.assertEqual(calendar.day_flags(date(2030, 1, 1)), bc.FIXED)
+
+        dates = np.array(["2024-01-01", "2024-01-02", "2024-03-05", "2031-11-06"], dtype="datetime64[D]")
+        self.assertEqual(calendar.mask(dates).tolist(), [True, False, True, True])
+        # Janvier 2024 : 23 jours de semaine, dont le 1er et le 11 fériés
+        self.assertEqual(calendar.working_days(date(2024, 1, 1), date(2024, 1, 31)), 21)
+
+    def test_db_date_replaces_nearby_estimate(self):
+        calendar = bc.BusinessCalendar(2024, 2024, db_dates=[date(2024, 4, 11)])
+        self.assertFalse(calendar.day_flags(date(2024, 4, 10)) & bc.VARIABLE)
+        self.assertEqual(calendar.day_flags(date(2024, 4, 11)), bc.DB)
+
+    def test_service_is_cached_and_invalidated_by_holiday_changes(self):
+        self.warm()
+        with self.assertNumQueries(0):
+            self.assertFalse(bc.get_calendar().is_holiday(date(2024, 3, 5)))
+        with self.captureOnCommitCallbacks(execute=True):
+            HolidayMA.objects.create(date=date(2024, 3, 5), label="Pont")
+        self.assertTrue(self.warm().is_holiday(date(2024, 3, 5)))
+
+
+# ─────────────────────────────────────────────
+# Règles de détection (core.utils.rules)
+# ─────────────────────────────────────────────
+
+
+class AnomalyRuleTestCase(ImportTestCase):
+    """Seuils et portées en base, compilés en prédicats vectorisés, avec leur coût par import."""
+
+    def test_scope_resolution(self):
+        compiled = rule_registry.CompiledRule(
+            Anomalie.LATE, True, 0.0, by_direction={1: (True, 600.0)}, by_departement={7: (False, 0.0)},
+        )
+        enabled, seuil = compiled.resolve(np.array([1, 1, 2, -1]), np.array([3, 7, 7, -1]))
+        self.assertEqual(enabled.tolist(), [True, False, False, True])
+        self.assertEqual(seuil.tolist(), [600.0, 0.0, 0.0, 0.0])
+
+    def test_direction_grace_period_and_rule_costs(self):
+        telecom, _, _ = create_org("Telecom")
+        AnomalyRule.objects.create(type=Anomalie.LATE, threshold_minutes=10, direction=telecom)
+        AnomalyRule.objects.create(type=Anomalie.BADGE, enabled=False, direction=telecom)
+        batch = self.run_import([
+            csv_row("T1", "02/01/2024", Direction="Telecom", **{"Entrée tardive": "00:05:00", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("T2", "02/01/2024", Direction="Telecom", **{"Entrée tardive": "00:15:00"}),
+            csv_row("C1", "02/01/2024", **{"Entrée tardive": "00:05:00", "Anomalie(badgeage impair)": "Oui"}),
+        ])
+        self.assertEqual(
+            sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "type")),
+            [("C1", Anomalie.BADGE), ("C1", Anomalie.LATE), ("T2", Anomalie.LATE)],
+        )
+        costs = ImportBatch.objects.get(id=batch.id).metrics["rules"]
+        self.assertEqual((costs[Anomalie.LATE]["rows"], costs[Anomalie.LATE]["matched"]), (3, 2))
+        self.assertEqual((costs[Anomalie.BADGE]["rows"], costs[Anomalie.BADGE]["matched"]), (1, 1))
+
+    def test_rules_are_recompiled_on_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rule_registry.get_rules()
+        with self.assertNumQueries(0):
+            rule_registry.get_rules()
+        with self.captureOnCommitCallbacks(execute=True):
+            AnomalyRule.objects.filter(type=Anomalie.INSUF_PRES).update(threshold_minutes=30)
+            AnomalyRule.objects.get(type=Anomalie.INSUF_PRES).save()
+        seuils = {rule.type: rule.threshold for rule in rule_registry.get_rules()}
+        self.assertEqual(seuils[Anomalie.INSUF_PRES], 1800.0)
+
+
+# ─────────────────────────────────────────────
+# Détection des anomalies (core.utils.anomaly)
+# ─────────────────────────────────────────────
+
+
+class BatchDetectionPropertyTestCase(SimpleTestCase):
+    """
+    Test de propriété : pour des lots de pointages générés aléatoirement (graine fixe),
+    detect_anomalies_batch doit produire exactement les mêmes (type, détail) que
+    detect_anomalies appelé ligne par ligne.
+    """
+    SEED = 20240101
+    ROUNDS = 200
+
+    @staticmethod
+    def random_duration(rng):
+        # Valeurs autour des seuils (0, 60 s de tolérance) + durées longues (> 1 jour)
+        return rng.choice([
+            None, timedelta(0), timedelta(seconds=rng.choice([1, 59, 60, 61, 3600])),
+            timedelta(seconds=rng.randrange(0, 40 * 3600)),
+        ])
+
+    def random_pointage(self, rng):
+        return SimpleNamespace(
+            entree_tardive=self.random_duration(rng),
+            sortie_anticipee=self.random_duration(rng),
+            temps_presence_reel=self.random_duration(rng),
+            temps_presence_theorique=rng.choice([None, timedelta(0), timedelta(hours=8), self.random_duration(rng)]),
+            absence_non_justifiee=rng.choice([0.0, 0.5, 2.0, 8.0, round(rng.uniform(0, 10), 2)]),
+            badgeage_impair=rng.random() < 0.3,
+        )
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(self.SEED)
+        for _ in range(self.ROUNDS):
+            pointages = [self.random_pointage(rng) for _ in range(rng.randrange(0, 30))]
+            contexts = [(rng.random() < 0.1, rng.random() < 0.1, rng.random() < 0.1) for _ in pointages]
+
+            expected = [
+                (i, type_code, detail)
+                for i, (p, (h, l, t)) in enumerate(zip(pointages, contexts))
+                for type_code, detail in detect_anomalies(p, lambda: h, lambda: l, lambda: t)
+            ]
+
+            frame = pd.DataFrame({
+                name: pd.to_timedelta([getattr(p, name) for p in pointages])
+                for name in ["entree_tardive", "sortie_anticipee", "temps_presence_reel", "temps_presence_theorique"]
+            })
+            frame["absence_non_justifiee"] = [p.absence_non_justifiee for p in pointages]
+            frame["badgeage_impair"] = [p.badgeage_impair for p in pointages]
+            result = detect_anomalies_batch(
+                frame, [c[0] for c in contexts], [c[1] for c in contexts], [c[2] for c in contexts]
+            )
+            self.assertEqual(list(result[["pointage", "type", "detail"]].itertuples(index=False, name=None)), expected)
+
+
+class AnomalyMagnitudeTestCase(ImportTestCase):
+    """L'ampleur numérique remplace le texte stocké : agrégats en SQL, détail rendu à la demande."""
+
+    def test_magnitude_severity_and_rendered_detail(self):
+        self.run_import([
+            csv_row("G1", "02/01/2024", **{"Entrée tardive": "00:25:00", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("G2", "02/01/2024", **{"Entrée tardive": "01:00:00", "Absence non justifiée": "2"}),
+        ])
+
+        late = Anomalie.objects.get(pointage__collaborateur__matricule="G1", type=Anomalie.LATE)
+        self.assertEqual((late.detail, late.magnitude, late.severity), ("", 1500.0, 1500 / 28800))
+        self.assertEqual(late.detail_display, "Entrée tardive de 0:25:00.")
+        absence = Anomalie.objects.get(type=Anomalie.ABS_UNJ)
+        self.assertEqual((absence.magnitude, absence.detail_display), (7200.0, "Absence non justifiée de 2.0h."))
+        badge = Anomalie.objects.get(type=Anomalie.BADGE)
+        self.assertEqual((badge.magnitude, badge.detail_display), (None, "Badgeage impair détecté."))
+
+        total = Anomalie.objects.filter(type=Anomalie.LATE).aggregate(total=Sum("magnitude"))["total"]
+        self.assertEqual(total, 1500.0 + 3600.0)
+        # Un ancien détail stocké reste affiché tel quel
+        self.assertEqual(Anomalie(type=Anomalie.LATE, detail="Texte saisi", magnitude=60).detail_display, "Texte saisi")
+
+
+# ─────────────────────────────────────────────
+# Congés et télétravail (core.utils.day_import)
+# ─────────────────────────────────────────────
+
+
+class DayImportTestCase(StagingMixin, ImportTestCase):
+    """Congés et télétravail chargés en masse, puis ré-analyse des pointages concernés."""
+
+    def setUp(self):
+        super().setUp()
+        late = {"Entrée tardive": "00:25:00"}
+        self.run_import([
+            csv_row("M1", "02/01/2024", **late), csv_row("M1", "03/01/2024", **late), csv_row("M2", "02/01/2024", **late),
+        ])
+
+    def anomalies(self):
+        return sorted(Anomalie.objects.values_list("pointage__collaborateur__matricule", "pointage__date"))
+
+    def test_leave_upsert_and_reevaluation(self):
+        summary = import_days(day_file([("M1", "02/01/2024", "8"), ("X9", "02/01/2024", ""), ("M2", "31/02/2024", "")]), "conges")
+        self.assertEqual((summary.rows, summary.written, summary.reevaluated), (3, 1, 1))
+        self.assertEqual((summary.unknown, summary.error_count), ({"X9"}, 1))
+        self.assertEqual(self.anomalies(), [("M1", date(2024, 1, 3)), ("M2", date(2024, 1, 2))])
+
+        # Même fichier corrigé : mise à jour sur place (contrainte (collaborateur, date))
+        import_days(day_file([("M1", "02/01/2024", '"4,5"')]), "conges")
+        self.assertEqual(list(Leave.objects.values_list("hours", flat=True)), [Decimal("4.50")])
+        self.assertEqual(import_days(day_file([("M1", "02/01/2024", "4.5")]), "conges").written, 0)
+
+    def test_telework_command_with_parquet(self):
+        path = f"{self.media_root}/teletravail.parquet"
+        pq.write_table(pa.table({"MATRICULE": ["M1", "M2"], "Date": [date(2024, 1, 3), date(2024, 1, 2)]}), path)
+        out = io.StringIO()
+        call_command("import_telework", path, stdout=out)
+        self.assertIn("2 pointage(s) ré-analysé(s)", out.getvalue())
+        self.assertEqual(self.anomalies(), [("M1", date(2024, 1, 2))])
+        self.assertEqual(TeleworkDay.objects.count(), 2)
+
+    @mock.patch('core.views.import_days_task.delay')
+    def test_upload_endpoint_checks_headers(self, delay):
+        self.client.force_login(self.user)
+        url = reverse('core:upload_days', args=["teletravail"])
+        self.client.post(url, {"file": day_file([("M1", "03/01/2024")], header=("MATRICULE", "Jour"))})
+        self.assertFalse(delay.called)
+        response = self.client.post(url, {"file": day_file([("M1", "03/01/2024")], header=("MATRICULE", "Date"))})
+        self.assertRedirects(response, reverse('core:upload_csv'))
+        delay.assert_called_once()
+        self.assertEqual(delay.call_args.args[0], "teletravail")
+
+
+# ─────────────────────────────────────────────
+# Nouvelle détection et résumé des pointages (core.utils.redetection)
+# ─────────────────────────────────────────────
+
+
+class RedetectionTestCase(ImportTestCase):
+    """Recalcul par lots des anomalies d'une période : seul l'écart est écrit."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_import([
+            csv_row("R1", "02/01/2024", **{"Entrée tardive": "00:05:00", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("R1", "03/01/2024", **{"Entrée tardive": "00:05:00"}),
+            csv_row("R2", "03/01/2024", **{"Entrée tardive": "00:20:00"}),
+        ])
+
+    def test_rule_change_over_a_date_range(self):
+        badge_id = Anomalie.objects.get(type=Anomalie.BADGE).id
+        with self.captureOnCommitCallbacks(execute=True):
+            AnomalyRule.objects.create(type=Anomalie.LATE, threshold_minutes=10)
+
+        diff = redetect(date_from=date(2024, 1, 3), chunk_size=1)
+        self.assertEqual((diff.pointages, diff.unchanged), (2, 1))
+        self.assertEqual((dict(diff.added), dict(diff.removed)), ({}, {Anomalie.LATE: 1}))
+        self.assertEqual(
+            sorted(Anomalie.objects.filter(type=Anomalie.LATE).values_list("pointage__date", "pointage__collaborateur__matricule")),
+            [(date(2024, 1, 2), "R1"), (date(2024, 1, 3), "R2")],
+        )
+        # Les anomalies inchangées ne sont pas réécrites
+        self.assertTrue(Anomalie.objects.filter(id=badge_id).exists())
+
+    def test_dry_run_writes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AnomalyRule.objects.create(type=Anomalie.LATE, threshold_minutes=10)
+        avant = sorted(Anomalie.objects.values_list("id", flat=True))
+        out = io.StringIO()
+        call_command("redetect_anomalies", "--dry-run", stdout=out)
+        self.assertEqual(sorted(Anomalie.objects.values_list("id", flat=True)), avant)
+        self.assertIn("2 supprimée(s)", out.getvalue())
+        self.assertEqual(redetect().removed[Anomalie.LATE], 2)
+        self.assertEqual(redetect().as_dict(), {"pointages": 3, "unchanged": 2, "added": {}, "removed": {}})
+
+
+class AnomalySummaryTestCase(ImportTestCase):
+    """anomaly_mask / anomaly_count tenus par l'import et la nouvelle détection, filtres sans jointure."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_import([
+            csv_row("S1", "02/01/2024", **{"Entrée tardive": "00:05:00", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("S2", "02/01/2024", **{"Entrée tardive": "00:20:00"}),
+            csv_row("S3", "02/01/2024"),
+        ])
+
+    def summary(self):
+        return dict(Pointage.objects.values_list("collaborateur__matricule", "anomaly_mask"))
+
+    def test_import_and_redetection_maintain_the_mask(self):
+        late, badge = Anomalie.TYPE_BITS[Anomalie.LATE], Anomalie.TYPE_BITS[Anomalie.BADGE]
+        self.assertEqual(self.summary(), {"S1": late | badge, "S2": late, "S3": 0})
+        self.assertEqual(Pointage.objects.get(collaborateur__matricule="S1").anomaly_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnomalyRule.objects.create(type=Anomalie.LATE, threshold_minutes=10)
+        redetect()
+        self.assertEqual(self.summary(), {"S1": badge, "S2": late, "S3": 0})
+        self.assertEqual(Pointage.objects.get(collaborateur__matricule="S1").anomaly_count, 1)
+
+    def test_list_filters_use_the_mask(self):
+        def matricules(query):
+            return sorted(filter_anomaly_pointages(QueryDict(query)).values_list("collaborateur__matricule", flat=True))
+
+        self.assertEqual(matricules(""), ["S1", "S2"])
+        self.assertEqual(matricules(f"type={Anomalie.BADGE}"), ["S1"])
+        self.assertEqual(matricules("q=badgeage"), ["S1"])
+        # Une durée dans la recherche devient un seuil d'ampleur, limité au type nommé s'il y en a un
+        self.assertEqual(matricules("q=0:10"), ["S2"])
+        self.assertEqual(matricules("q=Entrée tardive 5 min"), ["S1", "S2"])
+        self.assertEqual(matricules("q=badgeage 0:01"), [])
+        self.assertNotIn("DETAIL", str(filter_anomaly_pointages(QueryDict("q=retard 0:10")).query).upper())
+        sql = str(filter_anomaly_pointages(QueryDict(f"type={Anomalie.LATE}")).query).upper()
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotIn("CORE_ANOMALIE", sql)
+
+    @mock.patch("core.views.ANOMALY_PAGE_SIZE", 1)
+    def test_pagination_links_encode_filters(self):
+        self.user.groups.add(Group.objects.get_or_create(name="RH")[0])
+        self.client.force_login(self.user)
+        # Une valeur avec « & » ou « + » ne doit pas être coupée ni altérée dans les liens de page
+        response = self.client.get(reverse("core:liste_anomalies"), {"end": "2024-12-31", "ref": "R&D 1+1", "page": "1"})
+        self.assertEqual(response.context["query"], "end=2024-12-31&ref=R%26D+1%2B1")
+        self.assertContains(response, 'href="?end=2024-12-31&amp;ref=R%26D+1%2B1&page=2"')
+
+
+# ─────────────────────────────────────────────
+# Cube des anomalies (core.utils.cube)
+# ─────────────────────────────────────────────
+
+
+class AnomalyCubeTestCase(ImportTestCase):
+    """Le cube suit l'import et la nouvelle détection cellule par cellule, et se reconstruit à l'identique."""
+
+    def cube(self):
+        return sorted(
+            AnomalyDailyStat.objects.filter(count__gt=0)
+            .values_list("date", "departement__nom", "type", "count", "magnitude")
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        self.run_import([
+            csv_row("K1", "02/01/2024", **{"Entrée tardive": "00:05:00"}),
+            csv_row("K2", "02/01/2024", **{"Entrée tardive": "00:20:00"}),
+            csv_row("K3", "03/01/2024", Departement="Finance", **{"Anomalie(badgeage impair)": "Oui"}),
+        ])
+        self.assertEqual(self.cube(), [
+            (date(2024, 1, 2), "Marketing", Anomalie.LATE, 2, 1500.0),
+            (date(2024, 1, 3), "Finance", Anomalie.BADGE, 1, 0.0),
+        ])
+
+        # Réimport de K3 dans un autre département : l'ancienne cellule est vidée
+        self.run_import([csv_row("K3", "03/01/2024", **{"Anomalie(badgeage impair)": "Oui"})])
+        self.assertEqual(self.cube()[1:], [(date(2024, 1, 3), "Marketing", Anomalie.BADGE, 1, 0.0)])
+
+        # Nouvelle détection : seule la cellule du 02/01 change
+        with self.captureOnCommitCallbacks(execute=True):
+            AnomalyRule.objects.create(type=Anomalie.LATE, threshold_minutes=10)
+        redetect()
+        incremental = self.cube()
+        self.assertEqual(incremental[0], (date(2024, 1, 2), "Marketing", Anomalie.LATE, 1, 1200.0))
+
+        AnomalyDailyStat.objects.all().delete()
+        rebuild_cube()
+        self.assertEqual(self.cube(), incremental)
+
+    def test_cells_are_unique_and_upserted(self):
+        self.run_import([csv_row("K1", "02/01/2024", **{"Entrée tardive": "00:20:00"})])
+        cell = AnomalyDailyStat.objects.get()
+        AnomalyDailyStat.objects.filter(id=cell.id).update(count=99)
+        # Recalcul de la même période (import relancé, partitions) : mise à jour sur place, sans doublon
+        rebuild_cube(date(2024, 1, 2), date(2024, 1, 2))
+        self.assertEqual(list(AnomalyDailyStat.objects.values_list("id", "count")), [(cell.id, 1)])
+
+        # Direction et département absents : la clé de cellule (0) garde l'unicité malgré les NULL
+        AnomalyDailyStat.objects.create(date=date(2024, 1, 5), type=Anomalie.BADGE, count=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AnomalyDailyStat.objects.create(date=date(2024, 1, 5), type=Anomalie.BADGE, count=1)
+
+    def test_team_anomalies_kpis_read_department_cells(self):
+        self.run_import([
+            csv_row("K1", "02/01/2024", **{"Entrée tardive": "00:20:00", "Anomalie(badgeage impair)": "Oui"}),
+            csv_row("K2", "03/01/2024", **{"Entrée tardive": "00:20:00"}),
+            csv_row("K3", "03/01/2024", Departement="Finance", **{"Anomalie(badgeage impair)": "Oui"}),
+        ])
+        self.user.groups.add(Group.objects.get_or_create(name="Manager")[0])
+        Departement.objects.filter(nom="Marketing").update(manager=self.user)
+        self.client.force_login(self.user)
+        url = reverse("managers:team_anomalies")
+
+        kpis = self.client.get(url).context["kpis"]
+        self.assertEqual((kpis["total"], kpis["type_frequent"]), (3, "Entrée tardive"))
+        # Sans collaborateur sélectionné, les KPIs sont ceux des cellules du département
+        AnomalyDailyStat.objects.filter(type=Anomalie.LATE).update(count=0)
+        kpis = self.client.get(url, {"start_date": "2024-01-02"}).context["kpis"]
+        self.assertEqual((kpis["total"], kpis["type_frequent"]), (1, "Badgeage impair"))
+
+        # Le cube ne porte pas le collaborateur : sa sélection lit le résumé de ses pointages
+        k1 = Collaborateur.objects.get(matricule="K1")
+        kpis = self.client.get(url, {"collaborateur": k1.id}).context["kpis"]
+        self.assertEqual(kpis["total"], 2)
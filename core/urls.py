@@ -12,6 +12,11 @@ urlpatterns = [
     path('', views.landing_page, name='landing_page'),
     path('dashboard/', views.rh_dashboard, name='rh_dashboard'),
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('upload/jours/<str:kind>/', views.upload_days, name='upload_days'),
+    path('upload/sessions/', views.upload_session_create, name='upload_sessions'),
+    path('upload/sessions/<uuid:session_id>/', views.upload_session_chunk, name='upload_session_chunk'),
+    path('upload/<uuid:batch_id>/', views.import_batch_detail, name='import_batch_detail'),
+    path('upload/<uuid:batch_id>/quarantaine/', views.reprocess_quarantine, name='reprocess_quarantine'),
     path('anomalies/', views.liste_anomalies, name='liste_anomalies'),
     path('anomalies/export-pdf/', views.export_anomalies_pdf, name='export_anomalies_pdf'),
     path('pointage/<int:pointage_id>/apercu-email/', views.apercu_email, name='apercu_email'),
@@ -3,10 +3,15 @@
 # (Version finale avec la logique métier correcte et la nouvelle anomalie)
 # ==============================================================================
 
+import re
+import time
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 from dateutil import parser 
 
+from .rules import RuleSet
+
 # --- Fonctions Utilitaires (inchangées) ---
 
 def str_to_timedelta(s):
@@ -83,4 +88,190 @@ def detect_anomalies(pointage_obj, is_holiday, is_leave, is_telework):
                 anomalies.append(("PRESENCE_INSUFFISANTE", f"Temps de présence inférieur au théorique (manque {diff})."))
     
     # Le retour ne contient que les vraies anomalies.
-    return anomalies
\ No newline at end of file
+    return anomalies
+
+# --- Moteur de Détection Vectorisé (même logique métier, appliquée à tout un lot) ---
+
+# Règles par défaut (mêmes seuils que detect_anomalies) ; celles de la base viennent de
+# core.utils.rules.get_rules()
+DEFAULT_RULES = RuleSet.default()
+
+
+def _as_mask(values, n):
+    return np.broadcast_to(np.asarray(values, dtype=bool), (n,))
+
+
+def _seconds(frame, column):
+    """Colonne timedelta64 -> secondes en float (NaN pour une durée absente)."""
+    return frame[column].dt.total_seconds().to_numpy(dtype=float)
+
+
+def format_timedelta(seconds):
+    """Équivalent vectorisé de str(timedelta(seconds=s)) : 'H:MM:SS', '1 day, H:MM:SS'..."""
+    micro = pd.Series(np.round(np.asarray(seconds, dtype=float) * 1_000_000).astype(np.int64))
+    days, micro = micro // 86_400_000_000, micro % 86_400_000_000
+    secs, micro = micro // 1_000_000, micro % 1_000_000
+    text = (
+        (secs // 3600).astype(str) + ":"
+        + (secs % 3600 // 60).astype(str).str.zfill(2) + ":"
+        + (secs % 60).astype(str).str.zfill(2)
+    )
+    text = text.where(micro == 0, text + "." + micro.astype(str).str.zfill(6))
+    prefix = days.astype(str) + np.where(days.abs() == 1, " day, ", " days, ")
+    return text.where(days == 0, prefix + text).tolist()
+
+
+# Sévérité : part de la journée théorique perdue (0 à 1) ; journée de référence si le temps
+# théorique est inconnu, et score fixe pour le badgeage impair (sans ampleur).
+REFERENCE_DAY_SECONDS = 8 * 3600
+BADGE_SEVERITY = 0.1
+
+# Libellé du détail de chaque type, rendu à partir de l'ampleur (secondes)
+DETAIL_TEMPLATES = {
+    "ENTREE_TARDIVE": "Entrée tardive de {}.",
+    "SORTIE_ANTICIPEE": "Sortie anticipée de {}.",
+    "ABSENCE_NON_JUSTIFIEE": "Absence non justifiée de {}h.",
+    "BADGEAGE_IMPAIR": "Badgeage impair détecté.",
+    "PRESENCE_INSUFFISANTE": "Temps de présence inférieur au théorique (manque {}).",
+}
+
+
+def render_details(type_code, magnitudes):
+    """Détails lisibles d'anomalies d'un même type à partir de leurs ampleurs (mêmes textes que detect_anomalies)."""
+    template = DETAIL_TEMPLATES[type_code]
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    if type_code == "BADGEAGE_IMPAIR":
+        return [template] * len(magnitudes)
+    if type_code == "ABSENCE_NON_JUSTIFIEE":
+        # Heures saisies au centième (Pointage.absence_non_justifiee)
+        return [template.format(round(h, 2)) for h in (magnitudes / 3600).tolist()]
+    return [template.format(t) for t in format_timedelta(magnitudes)]
+
+
+def render_detail(type_code, magnitude):
+    """Détail d'une seule anomalie (affichage) : formatage Python, sans passer par pandas."""
+    template = DETAIL_TEMPLATES[type_code]
+    if type_code == "BADGEAGE_IMPAIR":
+        return template
+    if type_code == "ABSENCE_NON_JUSTIFIEE":
+        return template.format(round(magnitude / 3600, 2))
+    return template.format(timedelta(seconds=magnitude))
+
+
+# Durée dans une recherche libre : "0:30", "1:15:00", "2h", "1,5 h", "45 min"
+QUERY_DURATION_RE = re.compile(
+    r"(?P<h>\d+):(?P<m>\d{2})(?::(?P<s>\d{2}))?|(?P<n>\d+(?:[.,]\d+)?)\s*(?P<unit>h|min)\b", re.IGNORECASE
+)
+
+
+def parse_magnitude_query(query):
+    """
+    Recherche libre de la liste des anomalies -> (texte, ampleur minimale en secondes ou None).
+    Le détail n'étant plus stocké, une durée saisie ("Entrée tardive 0:30", "absence 2h")
+    devient un seuil sur Anomalie.magnitude ; le reste du texte est cherché tel quel.
+    """
+    match = QUERY_DURATION_RE.search(query)
+    if not match:
+        return query.strip(), None
+    if match["n"]:
+        seconds = float(match["n"].replace(",", ".")) * (3600 if match["unit"].lower() == "h" else 60)
+    else:
+        seconds = int(match["h"]) * 3600 + int(match["m"]) * 60 + int(match["s"] or 0)
+    return " ".join((query[:match.start()] + query[match.end():]).split()), seconds
+
+
+def _scope_ids(frame, column):
+    """Identifiants de portée (direction / département) d'un lot ; -1 si absents."""
+    if column not in frame:
+        return np.full(len(frame), -1, dtype=np.int64)
+    return pd.to_numeric(frame[column], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+
+
+# Règles qui s'appliquent aussi les jours spéciaux (congé, férié, télétravail)
+SPECIAL_DAY_RULES = {"BADGEAGE_IMPAIR"}
+
+
+def detect_anomalies_batch(frame, is_holiday, is_leave, is_telework, pointages=None, rules=None, stats=None, details=True):
+    """
+    Version vectorisée de detect_anomalies pour un lot entier de pointages.
+
+    `frame` est orienté colonnes (voir core.utils.parsing.parse_frame) : entree_tardive,
+    sortie_anticipee, temps_presence_reel, temps_presence_theorique (timedelta64),
+    absence_non_justifiee (float) et badgeage_impair (bool), plus direction_id et
+    departement_id pour les règles limitées à une portée. Les trois contextes sont des
+    masques booléens alignés sur les lignes (ou des scalaires).
+
+    `rules` est un RuleSet compilé (core.utils.rules) ; par défaut, les seuils historiques de
+    detect_anomalies. Si `stats` est un dict, il reçoit par type de règle les lignes évaluées,
+    les lignes retenues et le temps passé (cumulés).
+
+    Retourne un DataFrame (row, pointage, type, magnitude, severity[, detail]) : une ligne par
+    anomalie, dans le même ordre que detect_anomalies appelé ligne par ligne. `pointage` vaut
+    l'index du frame, ou la séquence `pointages` si elle est fournie. `magnitude` est l'ampleur
+    en secondes (NaN pour le badgeage impair), `severity` la part de la journée théorique perdue.
+    Le texte `detail` n'est rendu que si `details` est vrai (voir render_details).
+    """
+    n = len(frame)
+    special = _as_mask(is_leave, n) | _as_mask(is_holiday, n) | _as_mask(is_telework, n)
+    normal = ~special
+    rules = rules or DEFAULT_RULES
+    direction_ids, departement_ids = _scope_ids(frame, "direction_id"), _scope_ids(frame, "departement_id")
+
+    late = _seconds(frame, "entree_tardive")
+    early = _seconds(frame, "sortie_anticipee")
+    reel = _seconds(frame, "temps_presence_reel")
+    theo = _seconds(frame, "temps_presence_theorique")
+    absence = frame["absence_non_justifiee"].to_numpy(dtype=float)
+    badge = frame["badgeage_impair"].to_numpy(dtype=bool)
+    manque = theo - reel
+    with np.errstate(invalid="ignore"):
+        journee = np.where(theo > 0, theo, REFERENCE_DAY_SECONDS)
+
+    # Prédicat de chaque type de règle en fonction du seuil (secondes, une valeur par ligne) et
+    # ampleur mesurée. Les comparaisons avec NaN (durée absente) sont fausses : même effet que
+    # `None and ...`
+    predicates = {
+        "ENTREE_TARDIVE": (lambda seuil: late > seuil, late),
+        "SORTIE_ANTICIPEE": (lambda seuil: early > seuil, early),
+        "ABSENCE_NON_JUSTIFIEE": (lambda seuil: absence * 3600 > seuil, absence * 3600),
+        "BADGEAGE_IMPAIR": (lambda seuil: badge, np.full(n, np.nan)),  # pas de seuil ni d'ampleur
+        "PRESENCE_INSUFFISANTE": (
+            lambda seuil: (theo > 0) & (reel < theo) & (absence == 0) & (manque > seuil), manque),
+    }
+
+    rows, types, magnitudes, severities, texts = [], [], [], [], []
+    for rule in rules:
+        started = time.perf_counter()
+        predicate, magnitude = predicates[rule.type]
+        enabled, seuil = rule.resolve(direction_ids, departement_ids)
+        evaluated = enabled if rule.type in SPECIAL_DAY_RULES else enabled & normal
+        with np.errstate(invalid="ignore"):
+            matched = np.flatnonzero(evaluated & predicate(seuil))
+        rows.append(matched)
+        types.append(np.full(len(matched), rule.type, dtype=object))
+        magnitudes.append(magnitude[matched])
+        if rule.type == "BADGEAGE_IMPAIR":
+            severities.append(np.full(len(matched), BADGE_SEVERITY))
+        else:
+            severities.append(np.clip(magnitude[matched] / journee[matched], 0.0, 1.0))
+        if details:
+            texts.extend(render_details(rule.type, magnitude[matched]))
+        if stats is not None:
+            values = stats.setdefault(rule.type, {"rows": 0, "matched": 0, "seconds": 0.0})
+            values["rows"] += int(evaluated.sum())
+            values["matched"] += len(matched)
+            values["seconds"] += time.perf_counter() - started
+
+    rows = np.concatenate(rows)
+    order = np.argsort(rows, kind="stable")  # par ligne, puis dans l'ordre des règles
+    labels = np.asarray(frame.index if pointages is None else pointages)
+    result = pd.DataFrame({
+        "row": rows[order],
+        "pointage": labels[rows[order]],
+        "type": np.concatenate(types)[order],
+        "magnitude": np.concatenate(magnitudes)[order],
+        "severity": np.concatenate(severities)[order],
+    })
+    if details:
+        result["detail"] = np.asarray(texts, dtype=object)[order]
+    return result
@@ -0,0 +1,145 @@
+# ==============================================================================
+# FICHIER : core/utils/business_calendar.py
+# (Calendrier ouvré précalculé : week-ends, fériés fixes, fériés saisis et fêtes religieuses)
+# ==============================================================================
+import math
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from ..models import HolidayMA
+from .versioning import VersionedCache
+
+VERSION_KEY = "calendar:version"
+
+# Type de jour : un octet de drapeaux par jour
+WEEKEND = 1
+FIXED = 2      # férié national à date fixe (DEFAULT_FIXES)
+DB = 4         # férié saisi dans l'admin (HolidayMA, source de vérité)
+VARIABLE = 8   # fête religieuse estimée (calendrier hégirien arithmétique)
+HOLIDAY = FIXED | DB | VARIABLE
+
+# Fériés nationaux à date fixe (MM-JJ)
+DEFAULT_FIXES = [
+    ("01-01", "Nouvel an"), ("01-11", "Manif. de l'indépendance"),
+    ("05-01", "Fête du Travail"), ("07-30", "Fête du Trône"),
+    ("08-14", "Allégeance Oued Eddahab"), ("08-20", "Révolution du Roi et du Peuple"),
+    ("08-21", "Fête de la Jeunesse"), ("11-06", "Marche Verte"),
+    ("11-18", "Fête de l'Indépendance"),
+]
+
+# Fêtes religieuses : (mois hégirien, jour, nombre de jours chômés, libellé)
+VARIABLE_HOLIDAYS = [
+    (1, 1, 1, "1er Moharram"),
+    (3, 12, 2, "Aïd Al Mawlid"),
+    (10, 1, 2, "Aïd Al Fitr"),
+    (12, 10, 2, "Aïd Al Adha"),
+]
+# La date réelle dépend de l'observation du croissant (± 1 jour) : un férié saisi dans l'admin
+# à moins de VARIABLE_TOLERANCE jours d'une estimation la remplace.
+VARIABLE_TOLERANCE = 2
+
+
+def hijri_to_gregorian(year, month, day):
+    """Date grégorienne d'une date hégirienne (calendrier tabulaire, cycle de 30 ans)."""
+    jd = day + math.ceil(29.5 * (month - 1)) + (year - 1) * 354 + (3 + 11 * year) // 30 + 1948438.5
+    return date.fromordinal(int(jd - 1721424.5))
+
+
+def variable_holidays(first_year, last_year):
+    """[(premier jour, nombre de jours, libellé)] des fêtes religieuses estimées sur la période."""
+    out = []
+    for year in range((first_year - 622) * 33 // 32 - 1, (last_year - 622) * 33 // 32 + 3):
+        for month, day, days, label in VARIABLE_HOLIDAYS:
+            start = hijri_to_gregorian(year, month, day)
+            if first_year <= start.year <= last_year:
+                out.append((start, days, label))
+    return sorted(out)
+
+
+class BusinessCalendar:
+    """
+    Un octet de drapeaux (WEEKEND, FIXED, DB, VARIABLE) par jour de first_year à last_year :
+    une date se lit en O(1), une période ou une colonne de dates en un masque NumPy. Une date
+    hors période est calculée à la volée (même résultat, plus lent).
+    """
+
+    def __init__(self, first_year, last_year, db_dates=(), weekend_days=(5, 6)):
+        self.first_year, self.last_year = first_year, last_year
+        self.weekend_days = tuple(weekend_days)
+        self.origin = np.datetime64(date(first_year, 1, 1), "D")
+        days = pd.date_range(date(first_year, 1, 1), date(last_year, 12, 31), freq="D")
+        self.db_dates = set(db_dates)
+        self.flags = self._flags(days)
+
+    def _flags(self, days):
+        """Drapeaux des jours d'un DatetimeIndex (construction du tableau et dates hors période)."""
+        flags = np.zeros(len(days), dtype=np.uint8)
+        flags[np.isin(days.dayofweek, self.weekend_days)] |= WEEKEND
+        flags[days.strftime("%m-%d").isin([mmdd for mmdd, _ in DEFAULT_FIXES])] |= FIXED
+        flags[days.normalize().isin(pd.to_datetime(list(self.db_dates)))] |= DB
+        if len(days):
+            for start, n, _ in variable_holidays(days.min().year, days.max().year):
+                window = pd.date_range(start - timedelta(VARIABLE_TOLERANCE), start + timedelta(n - 1 + VARIABLE_TOLERANCE))
+                if any(d.date() in self.db_dates for d in window):
+                    continue  # date réelle saisie dans l'admin
+                flags[days.normalize().isin(pd.date_range(start, periods=n))] |= VARIABLE
+        return flags
+
+    def _index(self, values):
+        return (np.asarray(values, dtype="datetime64[D]") - self.origin).astype(np.int64)
+
+    def day_flags(self, d):
+        """Drapeaux d'une date (O(1) dans la période)."""
+        i = (d - date(self.first_year, 1, 1)).days
+        if 0 <= i < len(self.flags):
+            return int(self.flags[i])
+        return int(self._flags(pd.DatetimeIndex([d]))[0])
+
+    def is_holiday(self, d):
+        return bool(self.day_flags(d) & HOLIDAY)
+
+    def is_working_day(self, d):
+        return not self.day_flags(d) & (WEEKEND | HOLIDAY)
+
+    def mask(self, dates, flags=HOLIDAY):
+        """Masque booléen aligné sur une colonne de dates (datetime64) : jours portant l'un des drapeaux."""
+        index = self._index(dates)
+        inside = (index >= 0) & (index < len(self.flags))
+        out = np.zeros(len(index), dtype=np.uint8)
+        out[inside] = self.flags[index[inside]]
+        if not inside.all():
+            out[~inside] = self._flags(pd.DatetimeIndex(np.asarray(dates, dtype="datetime64[D]")[~inside]))
+        return (out & flags).astype(bool)
+
+    def range_mask(self, start, end, flags=HOLIDAY):
+        """Masque des jours de start à end inclus (une tranche du tableau dans la période)."""
+        dates = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        return self.mask(dates, flags)
+
+    def working_days(self, start, end):
+        """Nombre de jours ouvrés de start à end inclus."""
+        return int((~self.range_mask(start, end, WEEKEND | HOLIDAY)).sum())
+
+
+def load_calendar():
+    return BusinessCalendar(
+        settings.CALENDAR_FIRST_YEAR, settings.CALENDAR_LAST_YEAR,
+        db_dates=HolidayMA.objects.values_list("date", flat=True),
+        weekend_days=settings.CALENDAR_WEEKEND_DAYS,
+    )
+
+
+# Calendrier du processus, reconstruit quand HolidayMA change (numéro de version partagé)
+calendar_service = VersionedCache(VERSION_KEY, load_calendar)
+
+
+def get_calendar():
+    return calendar_service.get()
+
+
+def invalidate_calendar(sender=None, **kwargs):
+    """Récepteur des signaux post_save / post_delete de HolidayMA (voir CoreConfig.ready)."""
+    calendar_service.invalidate()
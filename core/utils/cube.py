@@ -0,0 +1,115 @@
+# ==============================================================================
+# FICHIER : core/utils/cube.py
+# (Cube des anomalies par jour × direction × département × type, tenu à jour par cellule)
+# ==============================================================================
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from ..models import Anomalie, AnomalyDailyStat
+
+# Jours agrégés par requête lors d'une reconstruction complète
+REBUILD_DAYS = 31
+
+CUBE_KEYS = ["pointage__date", "pointage__direction_id", "pointage__departement_id", "type"]
+# Clé unique d'une ligne du cube (contrainte anomalystat_unique_cell) : cible des upserts
+CELL_FIELDS = ["date", "direction_key", "departement_key", "type"]
+
+
+def aggregate_anomalies(anomalies):
+    """Agrégat (jour, direction, département, type) d'un queryset d'Anomalie, en AnomalyDailyStat non enregistrés."""
+    return [
+        AnomalyDailyStat(
+            date=row["pointage__date"], direction_id=row["pointage__direction_id"],
+            departement_id=row["pointage__departement_id"], type=row["type"],
+            direction_key=row["pointage__direction_id"] or 0, departement_key=row["pointage__departement_id"] or 0,
+            count=row["n"], magnitude=row["total_magnitude"] or 0.0, severity=row["total_severity"] or 0.0,
+        )
+        for row in anomalies.order_by().values(*CUBE_KEYS).annotate(
+            n=Count("id"), total_magnitude=Sum("magnitude"), total_severity=Sum("severity"),
+        )
+    ]
+
+
+def _cells_scope(cells, prefix=""):
+    """Filtre englobant des cellules (jour, département) : jours × départements concernés."""
+    departements = {s for _, s in cells}
+    ids = sorted(s for s in departements if s is not None)
+    scope = Q(**{f"{prefix}departement_id__in": ids})
+    if None in departements:
+        scope |= Q(**{f"{prefix}departement_id__isnull": True})
+    return Q(**{f"{prefix}date__in": sorted({d for d, _ in cells})}) & scope
+
+
+def write_cells(rows, current):
+    """
+    Upsert des lignes recalculées sur la clé unique de cellule (CELL_FIELDS), puis suppression
+    des lignes de `current` (queryset de la portée recalculée) absentes du recalcul : cellules
+    tombées à zéro anomalie. Deux écritures concurrentes d'une même cellule ne peuvent plus la
+    dédoubler ; la dernière l'emporte.
+    """
+    AnomalyDailyStat.objects.bulk_create(
+        rows, batch_size=1000, update_conflicts=True, unique_fields=CELL_FIELDS,
+        update_fields=["direction", "departement", "count", "magnitude", "severity"],
+    )
+    kept = {(row.date, row.direction_key, row.departement_key, row.type) for row in rows}
+    stale = [pk for pk, *key in current.order_by().values_list("id", *CELL_FIELDS) if tuple(key) not in kept]
+    AnomalyDailyStat.objects.filter(id__in=stale).delete()
+
+
+def refresh_cells(cells):
+    """
+    Recalcule les cellules (jour, département_id) du cube à partir des anomalies en base : les
+    lignes du cube de ces cellules sont remplacées, les autres ne sont pas touchées. À appeler
+    dans la transaction qui vient d'écrire les anomalies. Retourne le nombre de lignes écrites.
+    """
+    cells = set(cells)
+    if not cells:
+        return 0
+    current = AnomalyDailyStat.objects.filter(
+        id__in=[
+            pk for pk, day, departement_id in AnomalyDailyStat.objects.filter(_cells_scope(cells)).order_by()
+            .values_list("id", "date", "departement_id")
+            if (day, departement_id) in cells
+        ]
+    )
+    rows = [
+        row for row in aggregate_anomalies(Anomalie.objects.filter(_cells_scope(cells, "pointage__")))
+        if (row.date, row.departement_id) in cells
+    ]
+    write_cells(rows, current)
+    return len(rows)
+
+
+def refresh_days(date_from, date_to):
+    """Recalcule tout le cube entre deux dates incluses (tous départements), une transaction par tranche de jours."""
+    written, start = 0, date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=REBUILD_DAYS - 1), date_to)
+        with transaction.atomic():
+            rows = aggregate_anomalies(Anomalie.objects.filter(pointage__date__range=(start, end)))
+            write_cells(rows, AnomalyDailyStat.objects.filter(date__range=(start, end)))
+        written += len(rows)
+        start = end + timedelta(days=1)
+    return written
+
+
+def rebuild_cube(date_from=None, date_to=None):
+    """
+    Reconstruction complète (ou sur une période) du cube depuis les anomalies en base, par
+    tranches de REBUILD_DAYS jours. Sans période, les lignes hors de la plage des anomalies
+    sont aussi supprimées. Retourne le nombre de lignes écrites.
+    """
+    if date_from is None or date_to is None:
+        bounds = Anomalie.objects.order_by().aggregate(first=Min("pointage__date"), last=Max("pointage__date"))
+        if date_from is None and date_to is None:
+            stale = AnomalyDailyStat.objects.all()
+            if bounds["first"] is not None:
+                stale = stale.exclude(date__range=(bounds["first"], bounds["last"]))
+            stale.delete()
+        date_from = date_from or bounds["first"]
+        date_to = date_to or bounds["last"]
+    if date_from is None or date_to is None:
+        return 0
+    return refresh_days(date_from, date_to)
@@ -0,0 +1,64 @@
+# ==============================================================================
+# FICHIER : core/utils/day_context.py
+# (Congés et télétravail planifié d'un lot : deux requêtes, puis des masques sans requête)
+# ==============================================================================
+import numpy as np
+
+from ..models import Leave, TeleworkDay
+
+# Drapeaux d'un jour pour un collaborateur
+LEAVE = 1      # congé saisi (Leave)
+TELEWORK = 2   # télétravail planifié (TeleworkDay)
+
+
+class DayContext:
+    """
+    Congés et jours de télétravail des collaborateurs d'un lot sur sa période : une ligne de
+    drapeaux par collaborateur, un octet (LEAVE | TELEWORK) par jour. Chargé en deux requêtes
+    (load), puis mask() répond pour toutes les lignes du lot sans aucune requête.
+    """
+
+    def __init__(self, collaborateur_ids, first, last, leaves=(), telework=()):
+        self.ids = np.unique(np.asarray(list(collaborateur_ids), dtype=np.int64))
+        self.origin = np.datetime64(first, "D")
+        days = int((np.datetime64(last, "D") - self.origin).astype(np.int64)) + 1
+        self.flags = np.zeros((len(self.ids), max(days, 0)), dtype=np.uint8)
+        self.telework = set(telework)  # (collaborateur_id, date) déjà en base
+        for flag, pairs in ((LEAVE, list(leaves)), (TELEWORK, list(self.telework))):
+            if pairs:
+                collabs, dates = zip(*pairs)
+                rows, cols, found = self._positions(collabs, dates)
+                self.flags[rows[found], cols[found]] |= flag
+
+    @classmethod
+    def load(cls, collaborateur_ids, dates):
+        """Charge Leave et TeleworkDay des collaborateurs entre la première et la dernière date."""
+        ids = {int(c) for c in collaborateur_ids}
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if not ids or not len(dates):
+            return cls((), np.datetime64("1970-01-01"), np.datetime64("1969-12-31"))
+        first, last = dates.min(), dates.max()
+        filtre = {"collaborateur_id__in": ids, "date__range": (first.item(), last.item())}
+        return cls(
+            ids, first, last,
+            leaves=Leave.objects.filter(**filtre).order_by().values_list("collaborateur_id", "date"),
+            telework=TeleworkDay.objects.filter(**filtre).order_by().values_list("collaborateur_id", "date"),
+        )
+
+    def _positions(self, collaborateur_ids, dates):
+        collabs = np.asarray(collaborateur_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, collabs).clip(max=max(len(self.ids) - 1, 0))
+        cols = (np.asarray(dates, dtype="datetime64[D]") - self.origin).astype(np.int64)
+        found = (cols >= 0) & (cols < self.flags.shape[1])
+        if len(self.ids):
+            found &= self.ids[rows] == collabs
+        else:
+            found[:] = False
+        return rows, cols, found
+
+    def mask(self, collaborateur_ids, dates, flags):
+        """Masque booléen aligné sur les couples (collaborateur, date) : jours portant l'un des drapeaux."""
+        rows, cols, found = self._positions(collaborateur_ids, dates)
+        out = np.zeros(len(rows), dtype=bool)
+        out[found] = (self.flags[rows[found], cols[found]] & flags).astype(bool)
+        return out
@@ -0,0 +1,130 @@
+# ==============================================================================
+# FICHIER : core/utils/day_import.py
+# (Import en masse des congés et du télétravail planifié, puis nouvelle détection)
+# ==============================================================================
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from ..models import Leave, Pointage, TeleworkDay
+from .business_calendar import get_calendar
+from .dimensions import dimension_cache
+from .etl import IMPORT_CHUNK_SIZE, bulk_upsert
+from .parsing import parse_day_frame, to_dates
+from .redetection import reevaluate_pointages
+from .sources import file_format, read_frames
+
+# Erreurs de typage conservées (exemples affichés) ; les suivantes sont seulement comptées
+DAY_IMPORT_MAX_ERRORS = 20
+
+
+class DayKind(NamedTuple):
+    model: type
+    label: str
+    hours: bool  # colonne "Heures" (congés seulement)
+
+
+DAY_KINDS = {
+    "conges": DayKind(Leave, "congés", True),
+    "teletravail": DayKind(TeleworkDay, "télétravail", False),
+}
+
+
+class DayImportSummary:
+    """Compteurs d'un import de jours (congés ou télétravail)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.written = 0
+        self.reevaluated = 0
+        self.unknown = set()  # matricules absents de la base : lignes ignorées
+        self.error_count = 0
+        self.errors = []
+
+    def add_errors(self, errors):
+        self.error_count += len(errors)
+        self.errors += errors[:DAY_IMPORT_MAX_ERRORS - len(self.errors)]
+
+    def __str__(self):
+        parts = [f"{self.rows} ligne(s)", f"{self.written} jour(s) nouveau(x) ou modifié(s)"]
+        if self.unknown:
+            parts.append(f"{len(self.unknown)} matricule(s) inconnu(s)")
+        if self.error_count:
+            parts.append(f"{self.error_count} ligne(s) invalide(s)")
+        parts.append(f"{self.reevaluated} pointage(s) ré-analysé(s)")
+        return ", ".join(parts)
+
+
+def write_days(kind, keys, hours=None):
+    """
+    Écrit les couples (collaborateur_id, date) d'un lot : une requête relit les jours déjà en
+    base, les nouveaux sont insérés en bloc et, pour les congés, seules les heures modifiées
+    sont mises à jour (upsert). Retourne les couples réellement écrits.
+    """
+    dates = [d for _, d in keys]
+    existing = DAY_KINDS[kind].model.objects.filter(
+        collaborateur_id__in={c for c, _ in keys}, date__range=(min(dates), max(dates)),
+    ).order_by()
+    if hours is None:
+        existants = set(existing.values_list("collaborateur_id", "date"))
+        nouveaux = [key for key in keys if key not in existants]
+        TeleworkDay.objects.bulk_create(
+            [TeleworkDay(collaborateur_id=c, date=d) for c, d in nouveaux], batch_size=1000, ignore_conflicts=True
+        )
+        return nouveaux
+
+    existants = {(c, d): float(h) for c, d, h in existing.values_list("collaborateur_id", "date", "hours")}
+    nouveaux, modifies = [], []
+    for (c, d), h in zip(keys, hours):
+        if (c, d) not in existants:
+            nouveaux.append(Leave(collaborateur_id=c, date=d, hours=h))
+        elif existants[(c, d)] != round(h, 2):
+            modifies.append(Leave(collaborateur_id=c, date=d, hours=h))
+    Leave.objects.bulk_create(nouveaux, batch_size=1000, ignore_conflicts=True)
+    bulk_upsert(Leave, modifies, unique_fields=["collaborateur", "date"], update_fields=["hours"])
+    return [(leave.collaborateur_id, leave.date) for leave in nouveaux + modifies]
+
+
+def affected_pointages(kind, collaborateur_ids, first, last):
+    """Pointages de ces collaborateurs sur [first, last] tombant un jour présent dans la table (congé ou télétravail)."""
+    days = DAY_KINDS[kind].model.objects.filter(collaborateur_id=OuterRef("collaborateur_id"), date=OuterRef("date"))
+    return Pointage.objects.filter(collaborateur_id__in=collaborateur_ids, date__range=(first, last)).filter(Exists(days))
+
+
+def import_days(file, kind, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Importe un fichier de congés ou de télétravail (CSV, éventuellement compressé, Excel, Parquet
+    ou Arrow ; colonnes MATRICULE, Date et, pour les congés, Heures) par lots de `chunk_size`
+    lignes. Chaque lot est écrit en quelques requêtes ensemblistes (un jour identique n'est pas
+    réécrit), puis les pointages déjà importés des jours écrits sont ré-analysés dans la même
+    transaction.
+
+    Les lignes invalides et les matricules inconnus sont ignorés et comptés dans le résumé.
+    """
+    spec = DAY_KINDS[kind]
+    fmt, compression = file_format(file)
+    calendar = get_calendar()
+    summary = DayImportSummary()
+    for raw in read_frames(file, fmt, chunk_size, compression=compression):
+        frame, errors = parse_day_frame(raw, hours=spec.hours)
+        summary.rows += len(raw)
+        summary.add_errors(errors)
+        frame = frame.drop_duplicates(subset=["matricule", "date"], keep="last")
+
+        refs = dimension_cache.collaborateurs(frame["matricule"].unique().tolist())
+        connus = frame["matricule"].isin(list(refs))
+        summary.unknown.update(frame.loc[~connus, "matricule"].tolist())
+        frame = frame[connus]
+        if frame.empty:
+            continue
+
+        keys = list(zip([refs[mat].id for mat in frame["matricule"]], to_dates(frame["date"])))
+        with transaction.atomic():
+            ecrits = write_days(kind, keys, frame["hours"].tolist() if spec.hours else None)
+            if ecrits:
+                dates = [d for _, d in ecrits]
+                pointages = affected_pointages(kind, {c for c, _ in ecrits}, min(dates), max(dates))
+                summary.reevaluated += reevaluate_pointages(pointages, calendar).pointages
+        summary.written += len(ecrits)
+    return summary
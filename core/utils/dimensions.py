@@ -0,0 +1,166 @@
+# ==============================================================================
+# FICHIER : core/utils/dimensions.py
+# (Cache en mémoire du processus : directions, départements, managers et collaborateurs)
+# ==============================================================================
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+
+from ..models import Collaborateur, Departement, Direction
+from .versioning import SharedVersion, when_committed
+
+# Numéro de version partagé par tous les processus (via le cache Django configuré)
+VERSION_KEY = "dimensions:version"
+
+
+class DepartementRef(NamedTuple):
+    id: int
+    nom: str
+    direction_id: int
+    manager_id: int | None
+    manager_email: str | None
+
+
+class CollaborateurRef(NamedTuple):
+    id: int
+    email: str | None
+
+
+class Dimensions(NamedTuple):
+    """Instantané des tables de dimensions (petites : chargées en entier, deux requêtes)."""
+    directions: dict    # nom (minuscules) -> id
+    departements: dict  # (nom (minuscules), direction_id) -> id
+    direction_list: list    # [{"id", "nom"}] triés par nom (listes déroulantes)
+    departement_list: list  # [{"id", "nom", "direction_id"}] triés par nom
+    departement_refs: dict  # id -> DepartementRef (avec l'email du manager)
+
+    @classmethod
+    def load(cls):
+        directions = list(Direction.objects.order_by("nom").values_list("id", "nom"))
+        departements = [
+            DepartementRef(*row) for row in Departement.objects.order_by("nom")
+            .values_list("id", "nom", "direction_id", "manager_id", "manager__email")
+        ]
+        return cls(
+            directions={nom.lower(): pk for pk, nom in directions},
+            departements={(d.nom.lower(), d.direction_id): d.id for d in departements},
+            direction_list=[{"id": pk, "nom": nom} for pk, nom in directions],
+            departement_list=[{"id": d.id, "nom": d.nom, "direction_id": d.direction_id} for d in departements],
+            departement_refs={d.id: d for d in departements},
+        )
+
+
+class DimensionCache:
+    """
+    Directions, départements (avec l'email de leur manager) et collaborateurs (matricule -> id),
+    partagés par l'import, les vues et les tâches d'email d'un même processus.
+
+    Les directions et départements sont chargés en entier ; les collaborateurs à la demande,
+    dans un LRU borné à `max_collaborateurs` entrées. Toute écriture (signaux post_save /
+    post_delete, ou invalidate() après une écriture en masse) change un numéro de version
+    partagé : chaque processus le relit au plus toutes les `check_seconds` secondes et se vide
+    s'il a changé. Entre deux vérifications, une recherche ne coûte aucune requête.
+    """
+
+    def __init__(self, max_collaborateurs=None, check_seconds=None):
+        self._max_collaborateurs = max_collaborateurs
+        self._version = SharedVersion(VERSION_KEY, check_seconds)
+        self._lock = threading.RLock()
+        self._dimensions = None
+        self._collaborateurs = OrderedDict()
+
+    @property
+    def max_collaborateurs(self):
+        return self._max_collaborateurs or settings.DIMENSION_CACHE_MAX_COLLABORATEURS
+
+    def _check(self):
+        if self._version.changed():
+            self.clear()
+
+    def clear(self):
+        """Vide le cache local (sans toucher à la version partagée)."""
+        with self._lock:
+            self._dimensions = None
+            self._collaborateurs.clear()
+
+    def invalidate(self, **kwargs):
+        """Après une écriture : nouvelle version partagée (au commit) et cache local vidé."""
+        self.clear()
+        self._version.bump()
+        when_committed(self.clear)
+
+    # ---- Directions / départements ----
+    def dimensions(self):
+        with self._lock:
+            self._check()
+            if self._dimensions is not None:
+                return self._dimensions
+        loaded = Dimensions.load()
+
+        def install():
+            with self._lock:
+                self._dimensions = loaded
+
+        when_committed(install)
+        return loaded
+
+    def departement(self, departement_id):
+        """DepartementRef (avec manager_id et manager_email) ou None."""
+        if departement_id is None:
+            return None
+        return self.dimensions().departement_refs.get(departement_id)
+
+    # ---- Collaborateurs ----
+    def collaborateurs(self, matricules):
+        """matricule -> CollaborateurRef pour les matricules existants (une requête pour les absents du cache)."""
+        found, missing = {}, []
+        with self._lock:
+            self._check()
+            for mat in matricules:
+                ref = self._collaborateurs.get(mat)
+                if ref is None:
+                    missing.append(mat)
+                else:
+                    self._collaborateurs.move_to_end(mat)
+                    found[mat] = ref
+        if missing:
+            loaded = {
+                mat: CollaborateurRef(pk, email)
+                for pk, mat, email in Collaborateur.objects.filter(matricule__in=missing).order_by()
+                .values_list("id", "matricule", "email")
+            }
+            self.remember(loaded)
+            found.update(loaded)
+        return found
+
+    def remember(self, refs):
+        """Ajoute des collaborateurs au LRU (au commit si l'on est dans une transaction)."""
+        def install():
+            with self._lock:
+                self._collaborateurs.update(refs)
+                for mat in refs:
+                    self._collaborateurs.move_to_end(mat)
+                while len(self._collaborateurs) > self.max_collaborateurs:
+                    self._collaborateurs.popitem(last=False)
+
+        if refs:
+            when_committed(install)
+
+
+dimension_cache = DimensionCache()
+
+
+def invalidate_dimensions(sender=None, **kwargs):
+    """Récepteur des signaux post_save / post_delete des modèles de dimension (voir CoreConfig.ready)."""
+    dimension_cache.invalidate()
+
+
+def invalidate_manager_email(sender=None, update_fields=None, **kwargs):
+    """
+    Récepteur post_save du modèle utilisateur : le cache n'en lit que l'email (celui des managers).
+    Une sauvegarde partielle qui ne le touche pas (last_login à chaque connexion) n'invalide rien.
+    """
+    if update_fields is None or "email" in update_fields:
+        dimension_cache.invalidate()
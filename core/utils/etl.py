@@ -1,114 +1,530 @@
 # ==============================================================================
-# FICHIER : core/utils/etl.py (Version finale avec la correction du lien Pointage)
+# FICHIER : core/utils/etl.py (Moteur d'import ensembliste / bulk)
 # ==============================================================================
 import pandas as pd
-import traceback
 import re
-from datetime import timedelta
-from dateutil import parser
-from django.db import transaction
+from django.db import connection, transaction
 
 from ..models import (
-    ImportBatch, Direction, Departement, Collaborateur, Pointage, Anomalie, TeleworkDay, HolidayMA
+    ImportBatch, ImportPartition, QuarantinedRow, Direction, Departement, Collaborateur, Pointage, Anomalie, TeleworkDay
 )
-from .anomaly import detect_anomalies
+from .anomaly import detect_anomalies_batch
+from .parsing import (
+    DURATION_COLUMNS, FLAG_COLUMNS, FLOAT_COLUMNS, SOURCE_LINE_COLUMN, SOURCE_MEMBER_COLUMN, TIME_COLUMNS,
+    as_source_text, dimension_frame, fingerprints, parse_frame, source_members, to_dates, to_times, to_timedeltas,
+)
+from .business_calendar import get_calendar
+from .cube import refresh_cells, refresh_days
+from .day_context import LEAVE, TELEWORK, DayContext
+from .dimensions import dimension_cache
+from .metrics import ImportMetrics
+from .rules import get_rules
+from .sources import EXTENSIONS, PARTITION_FORMATS, PartitionWriter, file_format, read_frames
+from .staging import delete_staged, save_staged, staging_name
 from ..emails import send_anomaly_notification_and_log
 
-def parse_duration(val):
-    if pd.isna(val) or val == "": return None
-    s_val = str(val).strip()
-    if not s_val or s_val.lower() in ["oui", "non"]: return None
-    try:
-        parts = s_val.split(":")
-        h, m, s = (list(map(int, parts)) + [0, 0])[:3]
-        return timedelta(hours=h, minutes=m, seconds=s)
-    except (ValueError, TypeError): return None
-
-def parse_float_or_zero(val):
-    if pd.isna(val) or val == "": return 0.0
-    try: return float(str(val).replace(',', '.'))
-    except (ValueError, TypeError): return 0.0
-
-@transaction.atomic
-def import_csv(file, user, send_emails_auto=False):
-    df = pd.read_csv(file, sep=',')
-    batch = ImportBatch.objects.create(uploaded_by=user, filename=getattr(file, "name", "upload.csv"))
-
-    holidays_set = set(HolidayMA.objects.values_list('date', flat=True))
-    pointages_avec_anomalies = []
+# Nombre de lignes CSV traitées par lot : chaque lot coûte un nombre FIXE de requêtes
+# (upsert collaborateurs, upsert pointages, delete + insert des anomalies, télétravail).
+IMPORT_CHUNK_SIZE = 5000
 
-    for index, row in df.iterrows():
-        try:
-            mat = str(row.get("MATRICULE", "")).strip()
-            if not mat: continue
+# Champs du Pointage réécrits lorsqu'une ligne (collaborateur, date) existe déjà.
+POINTAGE_UPDATE_FIELDS = [
+    "batch", "direction", "departement", "entree", "sortie",
+    "temps_presence_reel", "temps_presence_theorique", "entree_tardive", "sortie_anticipee",
+    "absence_justifiee_heures", "absence_non_justifiee", "badgeage_impair", "jour_tt_planifie", "fingerprint",
+]
 
-            date_j = pd.to_datetime(row["Date"], dayfirst=True).date()
+# Compteurs de lignes sur ImportBatch / ImportPartition (import différentiel + quarantaine)
+DELTA_COUNTERS = ["rows_inserted", "rows_updated", "rows_skipped"]
+ROW_COUNTERS = [*DELTA_COUNTERS, "rows_quarantined"]
+# Étapes mesurées sur le lot lui-même (et non dans les partitions) : conservées à la consolidation
+BATCH_STAGES = ("validate", "split")
 
-            direction_nom = str(row.get("Direction", "N/A")).strip()
-            departement_nom = str(row.get("Departement", "N/A")).strip()
+def email_factice(nom, prenom):
+    return f"{re.sub(r'[^a-z]', '', prenom.lower())}.{re.sub(r'[^a-z]', '', nom.lower())}.factice@orange.com"
 
-            direction, _ = Direction.objects.get_or_create(
-                nom__iexact=direction_nom, defaults={'nom': direction_nom}
-            )
-            departement, _ = Departement.objects.get_or_create(
-                nom__iexact=departement_nom, direction=direction,
-                defaults={'nom': departement_nom, 'direction': direction}
-            )
-            
-            nom = str(row.get("NOM", "")).strip()
-            prenom = str(row.get("PRENOM", "")).strip()
-            email_factice = f"{re.sub(r'[^a-z]', '', prenom.lower())}.{re.sub(r'[^a-z]', '', nom.lower())}.factice@orange.com"
-
-            collab, created = Collaborateur.objects.update_or_create(
-                matricule=mat,
-                defaults={"nom": nom, "prenom": prenom, "direction": direction, "departement": departement}
-            )
-            if not collab.email:
-                collab.email = email_factice
-                collab.save(update_fields=['email'])
-
-            # === LA CORRECTION EST ICI ===
-            p, _ = Pointage.objects.update_or_create(
-                collaborateur=collab, date=date_j,
-                defaults={
-                    'batch': batch,
-                    # LIGNES CRUCIALES AJOUTÉES POUR LIER LE POINTAGE À LA DIRECTION ET AU DÉPARTEMENT
-                    'direction': direction,
-                    'departement': departement,
-                    # ---
-                    'entree': parser.parse(str(row["Entrée"])).time() if pd.notna(row["Entrée"]) and str(row["Entrée"]).strip() else None,
-                    'sortie': parser.parse(str(row["Sortie"])).time() if pd.notna(row["Sortie"]) and str(row["Sortie"]).strip() else None,
-                    'temps_presence_reel': parse_duration(row.get("Temps de présence réel")),
-                    'temps_presence_theorique': parse_duration(row.get("Temps de présence théorique")),
-                    'entree_tardive': parse_duration(row.get("Entrée tardive")),
-                    'sortie_anticipee': parse_duration(row.get("Sortie anticipée")),
-                    'absence_justifiee_heures': parse_float_or_zero(row.get("Absence Justifiée (par heure)")),
-                    'absence_non_justifiee': parse_float_or_zero(row.get("Absence non justifiée")),
-                    'badgeage_impair': str(row.get("Anomalie(badgeage impair)", "")).strip().lower() == "oui",
-                    'jour_tt_planifie': str(row.get("Jour TT Planifié", "")).strip().lower() == "oui",
-                }
+# ─────────────────────────────────────────────
+# Écritures ensemblistes
+# ─────────────────────────────────────────────
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=1000):
+    """
+    INSERT ... ON CONFLICT DO UPDATE (SQLite/PostgreSQL) ou ON DUPLICATE KEY UPDATE (MySQL).
+    MySQL n'accepte pas de cible de conflit explicite : on ne passe unique_fields que si le
+    backend le supporte.
+    """
+    if not objs:
+        return
+    target = unique_fields if connection.features.supports_update_conflicts_with_target else None
+    model.objects.bulk_create(
+        objs, batch_size=batch_size,
+        update_conflicts=True, unique_fields=target, update_fields=update_fields,
+    )
+
+class DimensionResolver:
+    """
+    Résout les Directions et Départements (comparaison insensible à la casse, comme l'ancien
+    get_or_create(nom__iexact=...)) et crée ceux qui manquent. Les correspondances viennent du
+    cache de dimensions du processus : seuls les noms encore jamais vus coûtent des requêtes.
+    """
+
+    def __init__(self):
+        self.directions = None    # nom_direction (minuscules) -> id
+        self.departements = None  # (nom_departement (minuscules), direction_id) -> id
+
+    def load(self):
+        dimensions = dimension_cache.dimensions()
+        self.directions, self.departements = dimensions.directions, dimensions.departements
+
+    def resolve(self, frame):
+        """Retourne les listes (direction_ids, departement_ids) alignées sur les lignes du frame."""
+        if self.directions is None:
+            self.load()
+        couples = set(zip(frame["direction"], frame["departement"]))
+
+        manquantes = {d.lower(): d for d, _ in couples if d.lower() not in self.directions}
+        if manquantes:
+            Direction.objects.bulk_create([Direction(nom=nom) for nom in manquantes.values()], ignore_conflicts=True)
+            dimension_cache.invalidate()  # bulk_create n'émet pas de signal
+            self.load()
+
+        a_creer = {}
+        for d, s in couples:
+            key = (s.lower(), self.directions[d.lower()])
+            if key not in self.departements:
+                a_creer[key] = Departement(nom=s, direction_id=key[1])
+        if a_creer:
+            Departement.objects.bulk_create(list(a_creer.values()), ignore_conflicts=True)
+            dimension_cache.invalidate()
+            self.load()
+
+        direction_ids = [self.directions[nom.lower()] for nom in frame["direction"]]
+        departement_ids = [
+            self.departements[(nom.lower(), d)] for nom, d in zip(frame["departement"], direction_ids)
+        ]
+        return direction_ids, departement_ids
+
+def upsert_collaborateurs(collabs):
+    """
+    Upsert des collaborateurs d'un lot (matricule -> champs) et retourne matricule -> id.
+    L'email factice n'est posé qu'à la création ou si l'email existant est vide. Les ids des
+    matricules déjà connus viennent du cache de dimensions (un matricule garde son id).
+    """
+    bulk_upsert(
+        Collaborateur,
+        [Collaborateur(matricule=mat, email=email_factice(c["nom"], c["prenom"]), **c) for mat, c in collabs.items()],
+        unique_fields=["matricule"],
+        update_fields=["nom", "prenom", "direction", "departement"],
+    )
+    refs = dimension_cache.collaborateurs(list(collabs))
+    corriges = {
+        mat: ref._replace(email=email_factice(collabs[mat]["nom"], collabs[mat]["prenom"]))
+        for mat, ref in refs.items() if not ref.email
+    }
+    if corriges:
+        Collaborateur.objects.bulk_update(
+            [Collaborateur(id=ref.id, email=ref.email) for ref in corriges.values()], ["email"], batch_size=1000
+        )
+        dimension_cache.remember(corriges)
+    return {mat: ref.id for mat, ref in refs.items()}
+
+def upsert_pointages(pointages):
+    """Upsert des pointages d'un lot et retourne (collaborateur_id, date) -> pointage_id."""
+    bulk_upsert(Pointage, pointages, unique_fields=["collaborateur", "date"], update_fields=POINTAGE_UPDATE_FIELDS)
+    collab_ids = {p.collaborateur_id for p in pointages}
+    dates = {p.date for p in pointages}
+    return {
+        (collab_id, date_j): pk
+        for pk, collab_id, date_j in Pointage.objects.filter(collaborateur_id__in=collab_ids, date__in=dates)
+        .order_by().values_list("id", "collaborateur_id", "date")
+    }
+
+def anomaly_summary(pointage_ids, anomalies):
+    """pointage_id -> (masque des types, nombre) des anomalies données ; (0, 0) sans anomalie."""
+    summary = dict.fromkeys(pointage_ids, (0, 0))
+    for anomalie in anomalies:
+        mask, count = summary[anomalie.pointage_id]
+        summary[anomalie.pointage_id] = (mask | Anomalie.TYPE_BITS[anomalie.type], count + 1)
+    return summary
+
+def write_anomaly_summary(summary):
+    """Pointage.anomaly_mask / anomaly_count : un UPDATE par couple (masque, nombre) distinct du lot."""
+    groupes = {}
+    for pk, value in summary.items():
+        groupes.setdefault(value, []).append(pk)
+    for (mask, count), ids in groupes.items():
+        Pointage.objects.filter(id__in=ids).update(anomaly_mask=mask, anomaly_count=count)
+
+def replace_anomalies(pointage_ids, anomalies, fresh=()):
+    """
+    Un DELETE ensembliste puis un INSERT groupé des anomalies d'un lot, et le résumé des
+    pointages. `fresh` : pointages tout juste insérés (déjà à zéro s'ils n'ont pas d'anomalie).
+    """
+    Anomalie.objects.filter(pointage_id__in=pointage_ids).delete()
+    Anomalie.objects.bulk_create(anomalies, batch_size=1000)
+    fresh = set(fresh)
+    write_anomaly_summary({
+        pk: value for pk, value in anomaly_summary(pointage_ids, anomalies).items() if value != (0, 0) or pk not in fresh
+    })
+
+def sync_telework_days(keys, existants=None):
+    """
+    Crée les TeleworkDay manquants pour les couples (collaborateur_id, date) du lot.
+    `existants` : couples déjà en base s'ils sont connus (DayContext), sinon relus.
+    """
+    if not keys:
+        return
+    if existants is None:
+        existants = set(
+            TeleworkDay.objects.filter(collaborateur_id__in={c for c, _ in keys}, date__in={d for _, d in keys})
+            .values_list("collaborateur_id", "date")
+        )
+    TeleworkDay.objects.bulk_create(
+        [TeleworkDay(collaborateur_id=c, date=d) for c, d in keys if (c, d) not in existants], batch_size=1000
+    )
+
+# ─────────────────────────────────────────────
+# Import d'un lot de lignes
+# ─────────────────────────────────────────────
+def stored_fingerprints(frame):
+    """(matricule, date) -> (empreinte, département) des pointages déjà en base pour les lignes du lot."""
+    return {
+        (mat, date_j): (fp, departement_id)
+        for mat, date_j, fp, departement_id in Pointage.objects.filter(
+            collaborateur__matricule__in=set(frame["matricule"]), date__in=set(to_dates(frame["date"]))
+        ).order_by().values_list("collaborateur__matricule", "date", "fingerprint", "departement_id")
+    }
+
+def import_chunk(frame, batch, dimensions, calendar, metrics=None, rules=None):
+    """
+    Importe un lot de lignes déjà typées (voir parse_frame) avec un nombre constant de requêtes.
+    Seules les lignes nouvelles ou modifiées (empreinte différente) sont écrites et ré-analysées :
+    les anomalies d'une ligne identique restent celles de l'import précédent.
+
+    Retourne (ids des pointages qui présentent des anomalies, {compteur: nombre de lignes}).
+    Chaque étape est mesurée dans `metrics` (ImportMetrics).
+    """
+    metrics = metrics or ImportMetrics()
+    # Une même ligne (matricule, date) répétée dans le fichier : la dernière l'emporte.
+    frame = frame.drop_duplicates(subset=["matricule", "date"], keep="last")
+    if frame.empty:
+        return [], dict.fromkeys(DELTA_COUNTERS, 0)
+
+    with metrics.stage("delta", rows=len(frame)):
+        frame = frame.assign(fingerprint=fingerprints(frame))
+        existants = stored_fingerprints(frame)
+        keys = list(zip(frame["matricule"], to_dates(frame["date"])))
+        connus = pd.Series([k in existants for k in keys], index=frame.index)
+        inchanges = pd.Series(
+            [existants.get(k, (None,))[0] == fp for k, fp in zip(keys, frame["fingerprint"].tolist())], index=frame.index
+        )
+    stats = {
+        "rows_inserted": int((~connus).sum()),
+        "rows_updated": int((connus & ~inchanges).sum()),
+        "rows_skipped": int(inchanges.sum()),
+    }
+    frame = frame[~inchanges]
+    if frame.empty:
+        return [], stats
+
+    with metrics.stage("dimensions", rows=len(frame)):
+        direction_ids, departement_ids = dimensions.resolve(frame)
+
+    with metrics.stage("upsert", rows=len(frame)):
+        collabs = {
+            mat: {"nom": nom, "prenom": prenom, "direction_id": d, "departement_id": s}
+            for mat, nom, prenom, d, s in zip(frame["matricule"], frame["nom"], frame["prenom"], direction_ids, departement_ids)
+        }
+        collab_ids = upsert_collaborateurs(collabs)
+
+        columns = {name: to_timedeltas(frame[name]) for name in DURATION_COLUMNS.values()}
+        columns.update({name: to_times(frame[name]) for name in TIME_COLUMNS.values()})
+        columns.update({name: frame[name].tolist() for name in [*FLOAT_COLUMNS.values(), *FLAG_COLUMNS.values(), "fingerprint"]})
+        pointages = [
+            Pointage(
+                batch=batch, collaborateur_id=collab_ids[mat], date=date_j,
+                direction_id=direction_id, departement_id=departement_id,
+                **{name: values[i] for name, values in columns.items()},
             )
-            # === FIN DE LA CORRECTION ===
-            
-            p.anomalies.all().delete()
-            
-            holiday = date_j in holidays_set
-            anomalies_detectees = detect_anomalies(p, lambda: holiday, lambda: p.absence_justifiee_heures > 0, lambda: p.jour_tt_planifie)
-            
-            if anomalies_detectees:
-                for type_code, detail_text in anomalies_detectees:
-                    Anomalie.objects.create(pointage=p, type=type_code, detail=detail_text, is_holiday=holiday)
-                pointages_avec_anomalies.append(p)
-
-            if p.jour_tt_planifie:
-                TeleworkDay.objects.get_or_create(collaborateur=collab, date=date_j)
-
-        except Exception as e:
-            traceback.print_exc()
-            raise ValueError(f"Erreur à la ligne {index + 2} (Matricule: {mat}). L'import a été annulé.")
-            
-    if send_emails_auto:
-        for pointage in pointages_avec_anomalies:
+            for i, (mat, date_j, direction_id, departement_id)
+            in enumerate(zip(frame["matricule"], to_dates(frame["date"]), direction_ids, departement_ids))
+        ]
+        pointage_ids = upsert_pointages(pointages)
+
+        for p in pointages:
+            p.id = pointage_ids[(p.collaborateur_id, p.date)]
+
+    # Congés et télétravail planifié en base : deux requêtes pour tout le lot
+    collaborateurs = [p.collaborateur_id for p in pointages]
+    with metrics.stage("context", rows=len(frame)):
+        context = DayContext.load(collaborateurs, frame["date"].to_numpy())
+
+    with metrics.stage("detection", rows=len(frame)):
+        frame = frame.assign(direction_id=direction_ids, departement_id=departement_ids)
+        detectees, anomalies = detect_chunk(
+            frame, [p.id for p in pointages], collaborateurs, calendar, context, rules or get_rules(), metrics.rules,
+        )
+        metrics.count_anomalies(detectees["type"])
+    pointages_avec_anomalies = detectees["pointage"].unique().tolist()
+    teletravail = [(p.collaborateur_id, p.date) for p in pointages if p.jour_tt_planifie]
+
+    with metrics.stage("anomalies", rows=len(anomalies)):
+        nouveaux = [p.id for p, connu in zip(pointages, connus[frame.index].tolist()) if not connu]
+        replace_anomalies([p.id for p in pointages], anomalies, fresh=nouveaux)
+    with metrics.stage("telework", rows=len(teletravail)):
+        sync_telework_days(teletravail, context.telework)
+
+    # Cube : cellules (jour, département) des pointages écrits, y compris l'ancien département
+    # d'une ligne réimportée qui en a changé
+    cellules = {(p.date, p.departement_id) for p in pointages}
+    cellules.update(
+        (key[1], existants[key][1]) for key, inchange in zip(keys, inchanges.tolist()) if key in existants and not inchange
+    )
+    with metrics.stage("cube", rows=len(cellules)):
+        refresh_cells(cellules)
+    return pointages_avec_anomalies, stats
+
+def detect_chunk(frame, pointage_ids, collaborateurs, calendar, context, rules, stats=None):
+    """
+    Détection vectorisée d'un lot typé (une ligne par pointage) avec les règles compilées
+    `rules`. Un jour est spécial s'il est férié (calendrier), en congé ou en télétravail
+    (colonnes du pointage ou DayContext). `stats` reçoit le coût de chaque règle.
+    Retourne (DataFrame des anomalies détectées, liste d'Anomalie à écrire).
+    """
+    dates = frame["date"].to_numpy()
+    holiday = calendar.mask(dates)
+    leave = (frame["absence_justifiee_heures"].to_numpy(dtype=float) > 0) | context.mask(collaborateurs, dates, LEAVE)
+    telework = frame["jour_tt_planifie"].to_numpy(dtype=bool) | context.mask(collaborateurs, dates, TELEWORK)
+    detectees = detect_anomalies_batch(
+        frame, holiday, leave, telework, pointages=pointage_ids, rules=rules, stats=stats, details=False,
+    )
+    # Le détail n'est pas stocké : il est rendu à l'affichage depuis l'ampleur (Anomalie.detail_display)
+    anomalies = [
+        Anomalie(
+            pointage_id=pointage_id, type=type_code, is_holiday=bool(holiday[row]),
+            magnitude=magnitude if magnitude == magnitude else None, severity=severity,  # NaN -> NULL
+        )
+        for row, pointage_id, type_code, magnitude, severity in detectees.itertuples(index=False)
+    ]
+    return detectees, anomalies
+
+def raise_for_errors(errors):
+    """Mode strict : la première erreur de typage interrompt l'import (le lot en cours n'est pas écrit)."""
+    if errors:
+        first = errors[0]
+        where = f"dans « {first.member} » à la ligne {first.line}" if first.member else f"à la ligne {first.line}"
+        raise ValueError(
+            f"Erreur {where}, colonne « {first.column} » : {first.reason} "
+            f"({len(errors)} erreur(s) dans ce lot). L'import a été interrompu."
+        )
+
+def quarantine_rows(batch, raw, errors):
+    """
+    Mode tolérant : enregistre les lignes en erreur (fichier et ligne source + erreurs) et
+    retourne leur nombre.
+    """
+    if not errors:
+        return 0
+    par_ligne = {}
+    for e in errors:
+        par_ligne.setdefault(e.position, []).append({"column": e.column, "value": e.value, "reason": e.reason})
+    lines = raw[SOURCE_LINE_COLUMN].astype(int) if SOURCE_LINE_COLUMN in raw else pd.Series(raw.index + 2, index=raw.index)
+    positions = pd.Series(list(zip(source_members(raw), lines)), index=raw.index)
+    en_erreur = positions.isin(list(par_ligne)).to_numpy()
+    rows = as_source_text(raw.drop(columns=[SOURCE_LINE_COLUMN, SOURCE_MEMBER_COLUMN], errors="ignore")[en_erreur])
+    QuarantinedRow.objects.bulk_create(
+        [
+            QuarantinedRow(batch=batch, member=member, line=line, raw=values, errors=par_ligne[(member, line)])
+            for (member, line), values in zip(positions[en_erreur].tolist(), rows.to_dict("records"))
+        ],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    return len(par_ligne)
+
+def extend_date_range(checkpoint, dates):
+    """Élargit [date_min, date_max] du point de reprise aux dates données."""
+    dates = [d for d in (checkpoint.date_min, checkpoint.date_max, *dates) if d is not None]
+    if dates:
+        checkpoint.date_min, checkpoint.date_max = min(dates), max(dates)
+
+def send_pending_notifications(pointage_ids, chunk_size=IMPORT_CHUNK_SIZE):
+    for start in range(0, len(pointage_ids), chunk_size):
+        for pointage in Pointage.objects.filter(id__in=pointage_ids[start:start + chunk_size]).select_related("collaborateur").order_by():
             send_anomaly_notification_and_log(pointage)
 
-    return batch
\ No newline at end of file
+def import_csv(file, user, send_emails_auto=False, chunk_size=IMPORT_CHUNK_SIZE, batch=None, checkpoint=None):
+    """
+    Import en flux : le fichier est lu par lots de `chunk_size` lignes et chaque lot est validé
+    (commit) dans sa propre transaction, avec le point de reprise. La mémoire reste bornée par
+    la taille d'un lot, quelle que soit la taille du fichier.
+
+    Le point de reprise est l'ImportBatch lui-même, ou l'ImportPartition `checkpoint` quand le
+    fichier est une partition d'un import parallèle. S'il s'agit d'un import interrompu (échec
+    ou worker tué), on reprend juste après la dernière ligne validée.
+    """
+    if batch is None:
+        batch = ImportBatch.objects.create(uploaded_by=user, filename=getattr(file, "name", "upload.csv"))
+    checkpoint = checkpoint or batch
+    offset = checkpoint.rows_committed
+    checkpoint.status, checkpoint.error = ImportBatch.RUNNING, ""
+    checkpoint.save(update_fields=["status", "error", "updated_at"])
+
+    calendar, rules = get_calendar(), get_rules()
+    dimensions = DimensionResolver()
+    metrics = ImportMetrics(checkpoint.metrics)
+    pointages_avec_anomalies = []
+
+    try:
+        # CSV (éventuellement compressé), Parquet ou Arrow d'après le nom ; on saute les lignes déjà importées
+        fmt, compression = file_format(file)
+        reader = read_frames(file, fmt, chunk_size, skip=offset, compression=compression)
+        while True:
+            with metrics.stage("read") as stage:
+                raw = next(reader, None)
+                stage["rows"] = 0 if raw is None else len(raw)
+            if raw is None:
+                break
+            if raw.empty:
+                continue  # fichier sans ligne de données (en-tête seul)
+            with metrics.stage("parse", rows=len(raw)):
+                frame, errors = parse_frame(raw)
+            if not batch.lenient:
+                raise_for_errors(errors)
+            with transaction.atomic():
+                ids, stats = import_chunk(frame, batch, dimensions, calendar, metrics, rules)
+                stats["rows_quarantined"] = quarantine_rows(batch, raw, errors)
+                checkpoint.rows_committed = int(raw.index[-1]) + 1
+                checkpoint.chunks_committed += 1
+                for counter, n in stats.items():
+                    setattr(checkpoint, counter, getattr(checkpoint, counter) + n)
+                extend_date_range(checkpoint, to_dates(frame["date"].agg(["min", "max"]).dropna()))
+                checkpoint.metrics = metrics.as_dict()
+                checkpoint.save(update_fields=[
+                    "rows_committed", "chunks_committed", *ROW_COUNTERS, "date_min", "date_max", "metrics", "updated_at",
+                ])
+            pointages_avec_anomalies.extend(ids)
+    except Exception as e:
+        checkpoint.status, checkpoint.error = ImportBatch.FAILED, str(e)
+        checkpoint.save(update_fields=["status", "error", "updated_at"])
+        raise
+
+    checkpoint.status = ImportBatch.DONE
+    checkpoint.save(update_fields=["status", "updated_at"])
+
+    if send_emails_auto:
+        with metrics.stage("emails", rows=len(pointages_avec_anomalies)):
+            send_pending_notifications(pointages_avec_anomalies)
+        checkpoint.metrics = metrics.as_dict()
+        checkpoint.save(update_fields=["metrics", "updated_at"])
+
+    return batch
+
+# ─────────────────────────────────────────────
+# Import parallèle : découpage par matricule
+# ─────────────────────────────────────────────
+def partition_csv(file, batch, partitions, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Découpe le fichier en `partitions` fichiers (dans la zone de transit, au format de la source,
+    décompressés)
+    selon un hachage stable du MATRICULE : toutes les lignes d'un collaborateur tombent dans la
+    même partition, donc deux partitions ne touchent jamais la même clé (collaborateur, date).
+
+    Les Directions/Départements sont créés ici, une seule fois, pour que les partitions
+    importées en parallèle n'aient jamais à les créer en concurrence. Chaque ligne garde son
+    numéro dans le fichier d'origine (colonne SOURCE_LINE_COLUMN, et SOURCE_MEMBER_COLUMN pour
+    un fichier d'archive zip) pour les messages d'erreur.
+    Retourne les ImportPartition créées (une partition vide n'est pas créée).
+    """
+    fmt, compression = file_format(file)
+    dimensions = DimensionResolver()
+    # Un découpage relancé repart de zéro ; seule la pré-validation (faite à l'upload) est gardée
+    metrics = ImportMetrics({"stages": {k: v for k, v in batch.metrics.get("stages", {}).items() if k == "validate"}})
+    # Les lignes d'un classeur Excel sont déjà du texte : ses partitions sont écrites en CSV
+    part_fmt = PARTITION_FORMATS.get(fmt, fmt)
+    writers = [PartitionWriter(part_fmt) for _ in range(partitions)]
+    try:
+        with metrics.stage("split") as stage:
+            for raw in read_frames(file, fmt, chunk_size, compression=compression):
+                stage["rows"] += len(raw)
+                dimensions.resolve(dimension_frame(raw))
+                if SOURCE_LINE_COLUMN not in raw:  # les lignes d'une archive zip sont déjà numérotées
+                    raw.insert(0, SOURCE_LINE_COLUMN, raw.index + 2)
+                cle = pd.util.hash_array(raw["MATRICULE"].astype(str).str.strip().to_numpy(dtype=object)) % partitions
+                for index, writer in enumerate(writers):
+                    writer.write(raw[cle == index])
+        batch.metrics = metrics.as_dict()
+        batch.save(update_fields=["metrics", "updated_at"])
+
+        created = [
+            ImportPartition(
+                batch=batch, index=index,
+                source=save_staged(staging_name(batch.id, f"partition-{index}{EXTENSIONS[part_fmt]}"), writer.finish()),
+            )
+            for index, writer in enumerate(writers) if writer.rows
+        ]
+        return ImportPartition.objects.bulk_create(created)
+    finally:
+        for writer in writers:
+            writer.close()
+
+def finalize_partitions(batch):
+    """Agrège les compteurs et métriques des partitions sur l'ImportBatch et nettoie la zone de transit."""
+    partitions = list(batch.partitions.all())
+    metrics = ImportMetrics({"stages": {k: v for k, v in batch.metrics.get("stages", {}).items() if k in BATCH_STAGES}})
+    for p in partitions:
+        metrics.merge(p.metrics)
+    batch.metrics = metrics.as_dict()
+    batch.rows_committed = sum(p.rows_committed for p in partitions)
+    batch.chunks_committed = sum(p.chunks_committed for p in partitions)
+    for counter in ROW_COUNTERS:
+        setattr(batch, counter, sum(getattr(p, counter) for p in partitions))
+    batch.date_min = batch.date_max = None
+    extend_date_range(batch, [d for p in partitions for d in (p.date_min, p.date_max)])
+    if batch.date_min:
+        # Les partitions parallèles ont pu recalculer une même cellule du cube en même temps :
+        # la période du lot est recalculée une fois toutes les partitions validées.
+        refresh_days(batch.date_min, batch.date_max)
+    if all(p.status == ImportBatch.DONE for p in partitions):
+        batch.status, batch.error = ImportBatch.DONE, ""
+        delete_staged(batch.source, *(p.source for p in partitions))
+    else:
+        batch.status = ImportBatch.FAILED
+        batch.error = "\n".join(f"Partition {p.index} : {p.error}" for p in partitions if p.error)
+    batch.save(update_fields=[
+        "rows_committed", "chunks_committed", *ROW_COUNTERS, "date_min", "date_max", "metrics", "status", "error", "updated_at",
+    ])
+    return batch
+
+# ─────────────────────────────────────────────
+# Quarantaine : re-traitement des lignes corrigées
+# ─────────────────────────────────────────────
+def reprocess_quarantine(batch):
+    """
+    Re-type et importe les lignes en quarantaine du lot (après correction de leur contenu) :
+    seules ces lignes sont touchées. Les lignes désormais valides sortent de la quarantaine,
+    les autres gardent leurs nouvelles erreurs. Retourne le nombre de lignes importées.
+    """
+    quarantaine = list(batch.quarantine.order_by("member", "line"))
+    if not quarantaine:
+        return 0
+    raw = pd.DataFrame([r.raw for r in quarantaine], dtype=str).fillna("")
+    raw[SOURCE_LINE_COLUMN] = [r.line for r in quarantaine]
+    raw[SOURCE_MEMBER_COLUMN] = [r.member for r in quarantaine]
+    frame, errors = parse_frame(raw)
+
+    restantes = {}
+    for e in errors:
+        restantes.setdefault(e.position, []).append({"column": e.column, "value": e.value, "reason": e.reason})
+    for r in quarantaine:
+        r.errors = restantes.get((r.member, r.line), r.errors)
+
+    with transaction.atomic():
+        _, stats = import_chunk(frame, batch, DimensionResolver(), get_calendar())
+        QuarantinedRow.objects.filter(
+            id__in=[r.id for r in quarantaine if (r.member, r.line) not in restantes]
+        ).delete()
+        QuarantinedRow.objects.bulk_update([r for r in quarantaine if (r.member, r.line) in restantes], ["errors"])
+        for counter, n in stats.items():
+            setattr(batch, counter, getattr(batch, counter) + n)
+        batch.rows_quarantined = len(restantes)
+        batch.save(update_fields=[*ROW_COUNTERS, "updated_at"])
+    return len(quarantaine) - len(restantes)
@@ -0,0 +1,148 @@
+# ==============================================================================
+# FICHIER : core/utils/metrics.py
+# (Instrumentation de l'import : temps, débit, mémoire et requêtes par étape)
+# ==============================================================================
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Étapes de l'import, dans l'ordre d'affichage
+STAGES = {
+    "validate": "Pré-validation du fichier",
+    "split": "Découpage en partitions",
+    "read": "Lecture du fichier",
+    "parse": "Typage des colonnes",
+    "delta": "Comparaison des empreintes",
+    "dimensions": "Directions / Départements",
+    "upsert": "Écriture collaborateurs et pointages",
+    "context": "Congés / télétravail",
+    "detection": "Détection des anomalies",
+    "anomalies": "Écriture des anomalies",
+    "telework": "Écriture du télétravail",
+    "cube": "Cube des anomalies",
+    "emails": "Envoi des emails",
+}
+
+
+# Linux : pic de mémoire résidente remis à zéro par étape (voir stage_memory)
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def _proc_memory_kb(*fields):
+    """Valeurs (Ko) des champs demandés de /proc/self/status, ou None hors Linux."""
+    try:
+        with open(PROC_STATUS) as status:
+            values = dict(line.split(":", 1) for line in status if line.startswith(fields))
+        return [int(values[name].split()[0]) for name in fields]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss():
+    """Remet VmHWM (pic résident) à la mémoire résidente courante ; False si impossible."""
+    try:
+        with open(PROC_CLEAR_REFS, "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _max_rss_kb():
+    """Pic résident de toute la vie du processus, en Ko."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 if sys.platform == "darwin" else usage  # octets sous macOS
+
+
+@contextmanager
+def stage_memory():
+    """
+    Mémoire résidente supplémentaire au pic du bloc, par rapport à l'entrée (en Mo, dans le
+    dict produit sous "mb"). ru_maxrss est le pic de toute la vie du processus : dans un worker
+    Celery de longue durée, il ne dit rien de l'étape. Sous Linux, le pic (VmHWM) est remis à
+    zéro à l'entrée ; ailleurs, on retient la hausse de ru_maxrss pendant le bloc (borne basse).
+    Les blocs ne doivent pas s'imbriquer : chaque entrée remet le pic à zéro.
+    """
+    result = {"mb": 0.0}
+    rss = _proc_memory_kb("VmRSS") if _reset_peak_rss() else None
+    before = None if rss else _max_rss_kb()
+    try:
+        yield result
+    finally:
+        if rss:
+            growth = _proc_memory_kb("VmHWM")[0] - rss[0]
+        else:
+            growth = _max_rss_kb() - before
+        result["mb"] = max(growth, 0) / 1024
+
+
+class ImportMetrics:
+    """
+    Compteurs cumulés par étape (secondes, lignes, requêtes SQL, pic mémoire de l'étape en Mo) et nombre
+    d'anomalies détectées par type. Sérialisé tel quel dans le champ JSON `metrics` du point de
+    reprise : un import repris continue d'accumuler sur les valeurs déjà enregistrées.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.stages = {name: dict(values) for name, values in data.get("stages", {}).items()}
+        self.anomalies = dict(data.get("anomalies", {}))
+        # Coût de chaque règle de détection : lignes évaluées, lignes retenues, secondes
+        self.rules = {name: dict(values) for name, values in data.get("rules", {}).items()}
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """Mesure le bloc. Le nombre de lignes peut être fixé après coup via le dict produit."""
+        counters = {"rows": rows, "queries": 0}
+
+        def count_query(execute, sql, params, many, context):
+            counters["queries"] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with stage_memory() as memory, connection.execute_wrapper(count_query):
+                yield counters
+        finally:
+            self.add(name, time.perf_counter() - start, counters["rows"], counters["queries"], memory["mb"])
+
+    def add(self, name, seconds, rows, queries, stage_peak_mb):
+        values = self.stages.setdefault(name, {"seconds": 0.0, "rows": 0, "queries": 0, "stage_peak_mb": 0.0})
+        values["seconds"] += seconds
+        values["rows"] += rows
+        values["queries"] += queries
+        # Étape répétée (lots, partitions) : on garde le plus fort des pics
+        values["stage_peak_mb"] = max(values["stage_peak_mb"], stage_peak_mb)
+
+    def count_anomalies(self, types):
+        for type_code, n in types.value_counts().items():
+            self.anomalies[type_code] = self.anomalies.get(type_code, 0) + int(n)
+
+    def merge(self, data):
+        """Ajoute les métriques d'une partition (les temps s'additionnent, les pics se comparent)."""
+        other = ImportMetrics(data)
+        for name, values in other.stages.items():
+            self.add(name, **values)
+        for type_code, n in other.anomalies.items():
+            self.anomalies[type_code] = self.anomalies.get(type_code, 0) + n
+        for type_code, values in other.rules.items():
+            totals = self.rules.setdefault(type_code, {"rows": 0, "matched": 0, "seconds": 0.0})
+            for key, value in values.items():
+                totals[key] += value
+
+    def as_dict(self):
+        return {"stages": self.stages, "anomalies": self.anomalies, "rules": self.rules}
+
+    def report(self):
+        """Lignes d'affichage (étape, libellé, valeurs et lignes/seconde) dans l'ordre de STAGES."""
+        rows = []
+        for name, label in STAGES.items():
+            if name in self.stages:
+                values = self.stages[name]
+                rate = values["rows"] / values["seconds"] if values["seconds"] else None
+                rows.append({"name": name, "label": label, "rows_per_second": rate, **values})
+        return rows
@@ -0,0 +1,318 @@
+# ==============================================================================
+# FICHIER : core/utils/parsing.py
+# (Étape de typage vectorisée : texte CSV -> colonnes typées, sans boucle par ligne)
+# ==============================================================================
+from datetime import time, timedelta
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow est optionnel : repli sur str.extract (plus lent)
+    pa = pc = None
+
+# Le fichier est lu comme du texte brut : pandas ne devine aucun type, c'est
+# parse_frame() qui convertit chaque colonne en une seule passe vectorisée.
+CSV_READ_OPTIONS = {"sep": ",", "dtype": str, "keep_default_na": False, "encoding": "utf-8-sig"}
+
+DATE_FORMAT = "%d/%m/%Y"
+
+# Colonne technique ajoutée aux fichiers de partition : numéro de ligne dans le fichier d'origine
+SOURCE_LINE_COLUMN = "_ligne"
+# ... et, pour une archive zip, le fichier de l'archive dont vient la ligne (numérotée dans ce fichier)
+SOURCE_MEMBER_COLUMN = "_fichier"
+
+# Colonnes source -> colonnes typées
+TEXT_COLUMNS = {"MATRICULE": "matricule", "NOM": "nom", "PRENOM": "prenom"}
+DIMENSION_COLUMNS = {"Direction": "direction", "Departement": "departement"}
+TIME_COLUMNS = {"Entrée": "entree", "Sortie": "sortie"}
+DURATION_COLUMNS = {
+    "Temps de présence réel": "temps_presence_reel",
+    "Temps de présence théorique": "temps_presence_theorique",
+    "Entrée tardive": "entree_tardive",
+    "Sortie anticipée": "sortie_anticipee",
+}
+FLOAT_COLUMNS = {
+    "Absence Justifiée (par heure)": "absence_justifiee_heures",
+    "Absence non justifiée": "absence_non_justifiee",
+}
+FLAG_COLUMNS = {"Anomalie(badgeage impair)": "badgeage_impair", "Jour TT Planifié": "jour_tt_planifie"}
+
+# Bornes des valeurs bien formées (une ligne hors bornes est une erreur, comme un format invalide) :
+# absences et durées sur une journée, date plausible
+MAX_HOURS = 24
+MIN_DATE = pd.Timestamp(2000, 1, 1)
+
+# "H", "H:MM" ou "H:MM:SS" (le format admet plus de 24 h, les bornes sont vérifiées à part)
+DURATION_RE = r"^(?P<h>\d+)(?::(?P<m>\d{1,2}))?(?::(?P<s>\d{1,2}))?$"
+TIME_RE = r"^(?P<h>\d{1,2}):(?P<m>\d{2})(?::(?P<s>\d{2}))?$"
+
+REASONS = {
+    "Date": f"date invalide (format attendu {DATE_FORMAT.replace('%d', 'JJ').replace('%m', 'MM').replace('%Y', 'AAAA')})",
+    "Entrée": "heure invalide (format attendu HH:MM[:SS])",
+    "Sortie": "heure invalide (format attendu HH:MM[:SS])",
+    **{source: "durée invalide (format attendu H:MM:SS)" for source in DURATION_COLUMNS},
+    **{source: "nombre invalide" for source in FLOAT_COLUMNS},
+}
+RANGE_REASONS = {
+    "Date": f"date hors bornes (avant le {MIN_DATE:%d/%m/%Y})",
+    **{source: f"durée hors bornes (plus de {MAX_HOURS} h)" for source in DURATION_COLUMNS},
+    **{source: f"nombre d'heures hors bornes (0 à {MAX_HOURS})" for source in FLOAT_COLUMNS},
+}
+
+
+class ParseError(NamedTuple):
+    line: int
+    column: str
+    value: str
+    reason: str
+    member: str = ""  # fichier d'une archive zip ("" sinon)
+
+    def __str__(self):
+        where = f"« {self.member} », ligne {self.line}" if self.member else f"ligne {self.line}"
+        return f"{where}, colonne « {self.column} » : {self.reason} ({self.value!r})"
+
+    @property
+    def position(self):
+        """Clé de tri dans l'ordre de lecture (les fichiers d'une archive sont lus par ordre de nom)."""
+        return (self.member, self.line)
+
+
+def source_members(df):
+    """Fichier de l'archive dont vient chaque ligne ("" hors archive zip)."""
+    if SOURCE_MEMBER_COLUMN in df:
+        return df[SOURCE_MEMBER_COLUMN].fillna("").astype(str)
+    return pd.Series("", index=df.index, dtype=object)
+
+
+def _text(df, column):
+    if column not in df:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[column].fillna("").astype(str).str.strip()
+
+
+def _hms_seconds(values, pattern):
+    """Extrait H[:MM[:SS]] en secondes (float, NaN si la valeur ne correspond pas)."""
+    if pc is None:
+        parts = values.str.extract(pattern).astype(float)
+        return parts["h"] * 3600 + parts["m"].fillna(0) * 60 + parts["s"].fillna(0)
+    # Noyau regex d'Arrow : une passe en C++ au lieu d'un appel Python par valeur (str.extract).
+    # Un groupe optionnel absent vaut "" ; une valeur qui ne correspond pas donne un struct nul.
+    fields = pc.extract_regex(pa.array(values, type=pa.string(), from_pandas=True), pattern)
+    seconds = 0
+    for name, factor in (("h", 3600), ("m", 60), ("s", 1)):
+        text = pc.struct_field(fields, name)
+        seconds = pc.add(seconds, pc.multiply(pc.cast(pc.if_else(pc.equal(text, ""), "0", text), pa.float64()), factor))
+    seconds = pc.if_else(fields.is_valid(), seconds, None)
+    return pd.Series(seconds.to_numpy(zero_copy_only=False), index=values.index)
+
+
+def _is_typed(df, column):
+    """Colonne déjà typée (source Parquet/Arrow) : pas de texte à analyser."""
+    return column in df and not (pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]))
+
+
+def _seconds(df, column, pattern):
+    """(secondes, texte source) d'une colonne durée/heure, typée (timedelta64) ou texte."""
+    if _is_typed(df, column):
+        return pd.to_timedelta(df[column]).dt.total_seconds(), as_source_text(df[[column]])[column]
+    raw = _text(df, column)
+    return _hms_seconds(raw, pattern), raw
+
+
+def dimension_frame(df):
+    """Colonnes direction/departement normalisées (comme parse_frame), sans typer le reste."""
+    return pd.DataFrame({name: _text(df, source).replace("", "N/A") for source, name in DIMENSION_COLUMNS.items()})
+
+
+def parse_frame(df):
+    """
+    Convertit un DataFrame brut (toutes colonnes en texte) en colonnes typées :
+    timedelta64 pour les durées et les heures d'entrée/sortie (depuis minuit), float64
+    pour les absences, datetime64 pour la date et booléens pour les colonnes "Oui".
+
+    Les valeurs bien formées mais hors bornes (RANGE_REASONS) sont des erreurs au même titre
+    qu'un format invalide : pré-validation, import, quarantaine et partitions partagent ainsi
+    une seule définition d'une ligne valide.
+
+    Retourne (frame, errors) : frame ne contient que les lignes valides (avec une colonne
+    `line` = numéro de ligne dans le fichier source) et errors la liste des ParseError.
+    """
+    errors = []
+    out = pd.DataFrame(index=df.index)
+    if SOURCE_LINE_COLUMN in df:
+        out["line"] = df[SOURCE_LINE_COLUMN].astype(int)
+    else:
+        out["line"] = df.index + 2  # +1 pour l'en-tête, +1 car les lignes commencent à 1
+    members = source_members(df)
+
+    for source, name in TEXT_COLUMNS.items():
+        out[name] = _text(df, source)
+    out[list(DIMENSION_COLUMNS.values())] = dimension_frame(df)
+
+    # Une ligne sans matricule est ignorée (ni importée, ni signalée)
+    has_mat = out["matricule"] != ""
+    invalid = pd.Series(False, index=df.index)
+
+    def report(column, raw, bad, reasons=REASONS):
+        bad = bad & has_mat
+        if bad.any():
+            for line, member, value in zip(out["line"][bad], members[bad], raw[bad]):
+                errors.append(ParseError(int(line), column, value, reasons[column], member))
+        return bad
+
+    # Les colonnes déjà typées (Parquet/Arrow) sont reprises telles quelles, sans analyse de texte.
+    if _is_typed(df, "Date"):
+        out["date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None).dt.normalize()
+        raw = as_source_text(df[["Date"]])["Date"]
+    else:
+        raw = _text(df, "Date")
+        out["date"] = pd.to_datetime(raw, format=DATE_FORMAT, errors="coerce")
+    invalid |= report("Date", raw, out["date"].isna())
+    invalid |= report("Date", raw, out["date"] < MIN_DATE, RANGE_REASONS)
+
+    for source, name in TIME_COLUMNS.items():
+        seconds, raw = _seconds(df, source, TIME_RE)
+        out[name] = pd.to_timedelta(seconds, unit="s")
+        invalid |= report(source, raw, (raw != "") & (seconds.isna() | (seconds >= 86400)))
+
+    for source, name in DURATION_COLUMNS.items():
+        seconds, raw = _seconds(df, source, DURATION_RE)
+        out[name] = pd.to_timedelta(seconds, unit="s")
+        # "oui"/"non" dans une colonne de durée équivaut à une durée absente
+        empty = (raw == "") | raw.str.lower().isin(["oui", "non"])
+        invalid |= report(source, raw, ~empty & seconds.isna())
+        invalid |= report(source, raw, seconds > MAX_HOURS * 3600, RANGE_REASONS)
+
+    for source, name in FLOAT_COLUMNS.items():
+        if _is_typed(df, source):
+            out[name] = df[source].astype(np.float64).fillna(0.0)
+            raw = as_source_text(df[[source]])[source]
+        else:
+            raw = _text(df, source)
+            values = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+            out[name] = values.fillna(0.0).astype(np.float64)
+            invalid |= report(source, raw, (raw != "") & values.isna())
+        invalid |= report(source, raw, (out[name] < 0) | (out[name] > MAX_HOURS), RANGE_REASONS)
+
+    for source, name in FLAG_COLUMNS.items():
+        if _is_typed(df, source):
+            out[name] = df[source].fillna(False).astype(bool)
+        else:
+            out[name] = _text(df, source).str.lower() == "oui"
+
+    errors.sort(key=lambda e: e.position)
+    return out[has_mat & ~invalid], errors
+
+
+# Fichiers de congés / télétravail : une ligne par (matricule, jour)
+DAY_COLUMNS = ["MATRICULE", "Date"]
+LEAVE_HOURS_COLUMN = "Heures"
+
+
+def parse_day_frame(df, hours=False):
+    """
+    Typage d'un fichier de congés ou de télétravail : (frame, errors) comme parse_frame, avec
+    les colonnes line, matricule, date (datetime64) et, pour les congés, hours (float, 0 si vide).
+    """
+    errors = []
+    out = pd.DataFrame(index=df.index)
+    out["line"] = df[SOURCE_LINE_COLUMN].astype(int) if SOURCE_LINE_COLUMN in df else df.index + 2
+    members = source_members(df)
+    out["matricule"] = _text(df, "MATRICULE")
+    has_mat = out["matricule"] != ""
+
+    if _is_typed(df, "Date"):
+        out["date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None).dt.normalize()
+        raw = as_source_text(df[["Date"]])["Date"]
+    else:
+        raw = _text(df, "Date")
+        out["date"] = pd.to_datetime(raw, format=DATE_FORMAT, errors="coerce")
+    invalid = out["date"].isna() & has_mat
+    columns = [("Date", raw, invalid)]
+
+    if hours:
+        if _is_typed(df, LEAVE_HOURS_COLUMN):
+            out["hours"] = df[LEAVE_HOURS_COLUMN].astype(np.float64).fillna(0.0)
+        else:
+            raw = _text(df, LEAVE_HOURS_COLUMN)
+            values = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+            out["hours"] = values.fillna(0.0).astype(np.float64)
+            bad = (raw != "") & (values.isna() | (values < 0) | (values > MAX_HOURS)) & has_mat
+            columns.append((LEAVE_HOURS_COLUMN, raw, bad))
+            invalid |= bad
+
+    for column, raw, bad in columns:
+        reason = REASONS.get(column, f"nombre d'heures invalide (0 à {MAX_HOURS})")
+        errors += [
+            ParseError(int(line), column, value, reason, member)
+            for line, member, value in zip(out["line"][bad], members[bad], raw[bad])
+        ]
+    errors.sort(key=lambda e: e.position)
+    return out[has_mat & ~invalid], errors
+
+
+def as_source_text(df):
+    """
+    Colonnes typées -> texte au format du CSV source (JJ/MM/AAAA, H:MM:SS, "Oui"/"Non"), pour
+    qu'une ligne Parquet/Arrow puisse être stockée (quarantaine, partition CSV) puis re-typée.
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in df.columns:
+        col = df[column]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            out[column] = col.dt.strftime(DATE_FORMAT).fillna("")
+        elif pd.api.types.is_timedelta64_dtype(col):
+            s = col.dt.total_seconds()
+            h, m, sec = s // 3600, s % 3600 // 60, s % 60
+            text = h.astype("Int64").astype(str) + ":" + m.astype("Int64").astype(str).str.zfill(2) + ":" + sec.astype("Int64").astype(str).str.zfill(2)
+            out[column] = text.where(s.notna(), "")
+        elif pd.api.types.is_bool_dtype(col):
+            out[column] = np.where(col, "Oui", "Non")
+        elif pd.api.types.is_numeric_dtype(col):
+            out[column] = col.astype(str).where(col.notna(), "")
+        else:
+            out[column] = col.fillna("").astype(str)
+    return out
+
+
+# Colonnes normalisées qui déterminent le contenu d'un Pointage (et donc ses anomalies)
+FINGERPRINT_COLUMNS = [
+    *TEXT_COLUMNS.values(), *DIMENSION_COLUMNS.values(), "date", *TIME_COLUMNS.values(),
+    *DURATION_COLUMNS.values(), *FLOAT_COLUMNS.values(), *FLAG_COLUMNS.values(),
+]
+
+
+def fingerprints(frame):
+    """
+    Empreinte 64 bits (signée, pour un BigIntegerField) de chaque ligne typée. Elle est calculée
+    sur les valeurs normalisées : "0:25" et "00:25:00" donnent la même empreinte. Si une mise à
+    jour de pandas changeait le hachage, le prochain import réécrirait simplement tout.
+    """
+    # Même résolution (ns) quelle que soit la source : pandas choisit l'unité selon le format lu.
+    columns = frame[FINGERPRINT_COLUMNS].astype({
+        name: "timedelta64[ns]" for name in [*TIME_COLUMNS.values(), *DURATION_COLUMNS.values()]
+    } | {"date": "datetime64[ns]"})
+    hashes = pd.util.hash_pandas_object(columns, index=False)
+    return hashes.to_numpy().view(np.int64)
+
+
+# ─────────────────────────────────────────────
+# Conversion colonnes typées -> objets Python (pour l'ORM)
+# ─────────────────────────────────────────────
+def to_dates(col):
+    return col.dt.date.tolist()
+
+
+def to_timedeltas(col):
+    return [None if np.isnan(s) else timedelta(seconds=s) for s in col.dt.total_seconds().tolist()]
+
+
+def to_times(col):
+    return [
+        None if np.isnan(s) else time(int(s) // 3600, int(s) % 3600 // 60, int(s) % 60)
+        for s in col.dt.total_seconds().tolist()
+    ]
@@ -0,0 +1,171 @@
+# ==============================================================================
+# FICHIER : core/utils/redetection.py
+# (Nouvelle détection des pointages en base, sans réimport : écart ajoutées / supprimées)
+# ==============================================================================
+from collections import Counter
+
+import pandas as pd
+from django.db import transaction
+
+from ..models import Anomalie, Pointage
+from .business_calendar import get_calendar
+from .cube import refresh_cells
+from .day_context import DayContext
+from .etl import anomaly_summary, detect_chunk, write_anomaly_summary
+from .parsing import DURATION_COLUMNS, FLAG_COLUMNS, FLOAT_COLUMNS, to_dates
+from .rules import get_rules
+
+# Pointages relus et ré-analysés par transaction : des transactions courtes, pour ne jamais
+# bloquer longtemps les tables lues par les tableaux de bord.
+REDETECTION_CHUNK_SIZE = 5000
+
+# Colonnes d'un Pointage relues pour une nouvelle détection (sans repasser par le fichier source)
+DETECTION_FIELDS = [
+    "id", "collaborateur_id", "direction_id", "departement_id", "date",
+    *DURATION_COLUMNS.values(), *FLOAT_COLUMNS.values(), *FLAG_COLUMNS.values(),
+]
+
+
+class DetectionDiff:
+    """Écart entre les anomalies en base et celles recalculées (par type pour les ajouts et suppressions)."""
+
+    def __init__(self):
+        self.pointages = 0
+        self.unchanged = 0
+        self.added = Counter()
+        self.removed = Counter()
+
+    def __iadd__(self, other):
+        self.pointages += other.pointages
+        self.unchanged += other.unchanged
+        self.added.update(other.added)
+        self.removed.update(other.removed)
+        return self
+
+    def as_dict(self):
+        return {
+            "pointages": self.pointages, "unchanged": self.unchanged,
+            "added": dict(self.added), "removed": dict(self.removed),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.pointages} pointage(s) : {sum(self.added.values())} anomalie(s) ajoutée(s), "
+            f"{sum(self.removed.values())} supprimée(s), {self.unchanged} inchangée(s)"
+        )
+
+
+def pointage_frame(rows):
+    """Tuples (DETECTION_FIELDS) -> frame aux types de parse_frame."""
+    frame = pd.DataFrame.from_records(rows, columns=DETECTION_FIELDS)
+    frame["date"] = pd.to_datetime(frame["date"])
+    for name in DURATION_COLUMNS.values():
+        frame[name] = pd.to_timedelta(frame[name])
+    for name in FLOAT_COLUMNS.values():
+        frame[name] = frame[name].astype(float)
+    for name in FLAG_COLUMNS.values():
+        frame[name] = frame[name].astype(bool)
+    return frame
+
+
+def sync_anomalies(pointage_ids, anomalies, dry_run=False, cells=None):
+    """
+    Aligne les anomalies en base des pointages donnés sur `anomalies` (recalculées) : seules
+    les anomalies disparues sont supprimées et les nouvelles insérées ; une anomalie identique
+    (type, ampleur, sévérité, jour férié) est laissée telle quelle, comme le résumé (masque, nombre) d'un
+    pointage inchangé. `cells` : pointage_id -> cellule (jour, département) du cube, recalculée
+    pour les seuls pointages modifiés. Retourne le DetectionDiff.
+    """
+    diff = DetectionDiff()
+    existantes, avant = {}, dict.fromkeys(pointage_ids, (0, 0))
+    for pk, pointage_id, type_code, magnitude, severity, is_holiday in (
+        Anomalie.objects.filter(pointage_id__in=pointage_ids).order_by()
+        .values_list("id", "pointage_id", "type", "magnitude", "severity", "is_holiday")
+    ):
+        existantes.setdefault((pointage_id, type_code, magnitude, severity, is_holiday), []).append(pk)
+        mask, count = avant[pointage_id]
+        avant[pointage_id] = (mask | Anomalie.TYPE_BITS[type_code], count + 1)
+
+    nouvelles, modifies = [], set()
+    for anomalie in anomalies:
+        ids = existantes.get(
+            (anomalie.pointage_id, anomalie.type, anomalie.magnitude, anomalie.severity, anomalie.is_holiday)
+        )
+        if ids:
+            ids.pop()
+            diff.unchanged += 1
+        else:
+            nouvelles.append(anomalie)
+            modifies.add(anomalie.pointage_id)
+            diff.added[anomalie.type] += 1
+    supprimees = []
+    for (pointage_id, type_code, *_), ids in existantes.items():
+        if ids:
+            supprimees += ids
+            modifies.add(pointage_id)
+            diff.removed[type_code] += len(ids)
+
+    if not dry_run:
+        if supprimees:
+            Anomalie.objects.filter(id__in=supprimees).delete()
+        Anomalie.objects.bulk_create(nouvelles, batch_size=1000)
+        write_anomaly_summary({
+            pk: value for pk, value in anomaly_summary(pointage_ids, anomalies).items() if value != avant[pk]
+        })
+        if cells is not None:
+            refresh_cells({cells[pk] for pk in modifies})
+    diff.pointages = len(pointage_ids)
+    return diff
+
+
+def reevaluate_frame(frame, calendar, rules, dry_run=False):
+    """Détection d'un lot de pointages relus (pointage_frame) et synchronisation de leurs anomalies."""
+    if frame.empty:
+        return DetectionDiff()
+    collaborateurs = frame["collaborateur_id"].tolist()
+    context = DayContext.load(collaborateurs, frame["date"].to_numpy())
+    pointage_ids = frame["id"].tolist()
+    _, anomalies = detect_chunk(frame, pointage_ids, collaborateurs, calendar, context, rules)
+    departements = [None if pd.isna(s) else int(s) for s in frame["departement_id"].tolist()]
+    cells = dict(zip(pointage_ids, zip(to_dates(frame["date"]), departements)))
+    return sync_anomalies(pointage_ids, anomalies, dry_run, cells)
+
+
+def reevaluate_pointages(pointages, calendar=None, rules=None):
+    """
+    Nouvelle détection des pointages existants (queryset) après un changement de contexte
+    (congés, télétravail) : une requête de lecture, deux pour le contexte, une pour les
+    anomalies en place, puis les seules écritures nécessaires. Retourne le DetectionDiff.
+    """
+    frame = pointage_frame(pointages.order_by().values_list(*DETECTION_FIELDS))
+    return reevaluate_frame(frame, calendar or get_calendar(), rules or get_rules())
+
+
+def redetect(date_from=None, date_to=None, direction_id=None, chunk_size=REDETECTION_CHUNK_SIZE,
+             dry_run=False, progress=None):
+    """
+    Recalcule les anomalies des pointages en base sur une période et/ou une direction, avec les
+    règles, le calendrier et les congés actuels (après un férié saisi en retard, une règle
+    modifiée...). Les pointages sont parcourus par id croissant (pagination par clé), par lots
+    de `chunk_size`, chacun dans sa propre transaction courte. `progress(diff)` est appelé après
+    chaque lot. Avec dry_run, rien n'est écrit : seul l'écart est calculé.
+    """
+    pointages = Pointage.objects.order_by("id")
+    if date_from:
+        pointages = pointages.filter(date__gte=date_from)
+    if date_to:
+        pointages = pointages.filter(date__lte=date_to)
+    if direction_id:
+        pointages = pointages.filter(direction_id=direction_id)
+
+    calendar, rules = get_calendar(), get_rules()
+    diff, last_id = DetectionDiff(), 0
+    while True:
+        frame = pointage_frame(pointages.filter(id__gt=last_id).values_list(*DETECTION_FIELDS)[:chunk_size])
+        if frame.empty:
+            return diff
+        last_id = int(frame["id"].iloc[-1])
+        with transaction.atomic():
+            diff += reevaluate_frame(frame, calendar, rules, dry_run)
+        if progress:
+            progress(diff)
@@ -0,0 +1,101 @@
+# ==============================================================================
+# FICHIER : core/utils/rules.py
+# (Registre des règles d'anomalie : seuils et portées en base, compilés en tableaux NumPy)
+# ==============================================================================
+import numpy as np
+
+from ..models import Anomalie, AnomalyRule
+from .versioning import VersionedCache
+
+VERSION_KEY = "rules:version"
+
+# Ordre d'évaluation des règles (et donc des anomalies d'un même pointage)
+RULE_TYPES = [Anomalie.LATE, Anomalie.EARLY_LEAVE, Anomalie.ABS_UNJ, Anomalie.BADGE, Anomalie.INSUF_PRES]
+
+# Seuils par défaut en minutes (comportement de detect_anomalies) : toute entrée tardive, sortie
+# anticipée ou absence compte ; la présence insuffisante tolère une minute.
+DEFAULT_THRESHOLDS = {
+    Anomalie.LATE: 0, Anomalie.EARLY_LEAVE: 0, Anomalie.ABS_UNJ: 0, Anomalie.BADGE: 0, Anomalie.INSUF_PRES: 1,
+}
+
+
+class CompiledRule:
+    """
+    Une règle compilée : activation et seuil (en secondes) globaux, plus les surcharges par
+    direction et par département rangées en tableaux triés. resolve() donne l'activation et le
+    seuil de chaque ligne d'un lot par recherche dichotomique, sans boucle Python.
+    """
+
+    def __init__(self, type, enabled=True, threshold=0.0, by_direction=None, by_departement=None):
+        self.type = type
+        self.enabled, self.threshold = enabled, threshold
+        self.scopes = [self._table(by_direction or {}), self._table(by_departement or {})]
+
+    @staticmethod
+    def _table(overrides):
+        keys = np.array(sorted(overrides), dtype=np.int64)
+        return (
+            keys,
+            np.array([overrides[k][0] for k in keys.tolist()], dtype=bool),
+            np.array([overrides[k][1] for k in keys.tolist()], dtype=float),
+        )
+
+    def resolve(self, direction_ids, departement_ids):
+        """(activée, seuil en secondes) par ligne : département, sinon direction, sinon règle globale."""
+        n = len(direction_ids)
+        enabled = np.full(n, self.enabled, dtype=bool)
+        threshold = np.full(n, self.threshold, dtype=float)
+        for ids, (keys, on, values) in zip((direction_ids, departement_ids), self.scopes):
+            if len(keys) and n:
+                pos = np.searchsorted(keys, ids).clip(max=len(keys) - 1)
+                hit = keys[pos] == ids
+                enabled[hit] = on[pos[hit]]
+                threshold[hit] = values[pos[hit]]
+        return enabled, threshold
+
+
+class RuleSet:
+    """Les règles compilées, dans l'ordre de RULE_TYPES."""
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    @classmethod
+    def default(cls):
+        return cls([CompiledRule(t, True, DEFAULT_THRESHOLDS[t] * 60.0) for t in RULE_TYPES])
+
+    @classmethod
+    def from_rules(cls, rules):
+        """Compile des AnomalyRule (à portée égale, la dernière l'emporte)."""
+        config = {t: {"enabled": True, "threshold": DEFAULT_THRESHOLDS[t] * 60.0, "by_direction": {}, "by_departement": {}}
+                  for t in RULE_TYPES}
+        for rule in rules:
+            target = config[rule.type]
+            value = (rule.enabled, float(rule.threshold_minutes) * 60.0)
+            if rule.departement_id:
+                target["by_departement"][rule.departement_id] = value
+            elif rule.direction_id:
+                target["by_direction"][rule.direction_id] = value
+            else:
+                target["enabled"], target["threshold"] = value
+        return cls([CompiledRule(t, **config[t]) for t in RULE_TYPES])
+
+    @classmethod
+    def load(cls):
+        return cls.from_rules(AnomalyRule.objects.order_by("id"))
+
+
+# Règles du processus, recompilées quand AnomalyRule change (numéro de version partagé)
+rule_service = VersionedCache(VERSION_KEY, RuleSet.load)
+
+
+def get_rules():
+    return rule_service.get()
+
+
+def invalidate_rules(sender=None, **kwargs):
+    """Récepteur des signaux post_save / post_delete d'AnomalyRule (voir CoreConfig.ready)."""
+    rule_service.invalidate()
@@ -0,0 +1,367 @@
+# ==============================================================================
+# FICHIER : core/utils/sources.py
+# (Formats d'entrée de l'import : lecture par lots et écriture des partitions)
+# ==============================================================================
+import gzip
+import io
+import os
+import tempfile
+import zipfile
+from contextlib import closing
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+from .parsing import CSV_READ_OPTIONS, DATE_FORMAT, DURATION_COLUMNS, SOURCE_LINE_COLUMN, SOURCE_MEMBER_COLUMN
+
+# Extension -> format. Parquet et Arrow IPC arrivent déjà typés : pas d'analyse de texte.
+# Excel (.xlsx) est lu ligne à ligne et remis au format texte du CSV.
+FORMATS = {
+    ".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow", ".xlsx": "xlsx",
+}
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow", "xlsx": ".xlsx"}
+# Format des fichiers de partition (un classeur Excel est découpé en CSV)
+PARTITION_FORMATS = {"xlsx": "csv"}
+
+# Compression de l'upload (.csv.gz, .csv.zst, .zip) : décompressée en flux, jamais en entier.
+# Parquet/Arrow sont déjà compressés en interne et doivent être lus en accès direct : CSV seulement.
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd", ".zip": "zip"}
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def _split_name(filename):
+    """"rapport.csv.gz" -> (".csv", ".gz") ; "rapport.zip" -> (".csv", ".zip") ; "x.parquet" -> (".parquet", "")."""
+    base, ext = os.path.splitext((filename or "").lower())
+    if ext not in COMPRESSIONS:
+        return ext, ""
+    if ext == ".zip":
+        return ".csv", ext
+    return os.path.splitext(base)[1], ext
+
+
+def detect_format(filename):
+    """Retourne (format, compression ou None) d'après le nom du fichier."""
+    ext, compression = _split_name(filename)
+    if ext not in FORMATS:
+        raise UnsupportedFormat(f"Format de fichier non pris en charge : « {ext or filename} ».")
+    if compression and FORMATS[ext] != "csv":
+        raise UnsupportedFormat("Seuls les fichiers CSV peuvent être compressés (.csv.gz, .csv.zst, .zip).")
+    return FORMATS[ext], COMPRESSIONS.get(compression)
+
+
+def source_extension(filename):
+    """Extension complète à conserver en zone de transit (ex. ".csv.gz")."""
+    ext, compression = _split_name(filename)
+    return compression if compression == ".zip" else ext + compression
+
+
+def file_format(file):
+    """(format, compression) d'un fichier ouvert d'après son nom (CSV brut par défaut, ex. BytesIO sans nom)."""
+    try:
+        return detect_format(getattr(file, "name", None))
+    except UnsupportedFormat:
+        return "csv", None
+
+
+def _pyarrow():
+    """pyarrow n'est requis que pour Parquet/Arrow : import à la demande."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise UnsupportedFormat("La lecture des fichiers Parquet/Arrow nécessite le paquet pyarrow.") from e
+    return pyarrow
+
+
+def _openpyxl():
+    """openpyxl n'est requis que pour Excel : import à la demande."""
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise UnsupportedFormat("La lecture des fichiers Excel (.xlsx) nécessite le paquet openpyxl.") from e
+    return openpyxl
+
+
+def _cell_text(value, duration=False, epoch=None):
+    """
+    Valeur de cellule Excel -> texte au format du CSV source (les dates ne passent jamais par un
+    nombre). Dans une colonne de durée, une valeur de 24 h ou plus au format « h:mm:ss » est lue
+    par openpyxl comme une date proche de l'origine du classeur (1899-12-30/31) : elle est
+    ramenée à une durée depuis cette origine (`epoch` du classeur).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Oui" if value else "Non"
+    if duration and isinstance(value, datetime):
+        from openpyxl.utils.datetime import to_excel
+        value = timedelta(days=to_excel(value, epoch) if epoch else to_excel(value))  # 1.25 -> 30:00:00
+    if isinstance(value, (datetime, date)):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, time):
+        return f"{value.hour}:{value.minute:02d}:{value.second:02d}"
+    if isinstance(value, timedelta):
+        seconds = round(value.total_seconds())
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _xlsx_rows(file):
+    """
+    Lignes de la première feuille, en texte, lues en flux (mode read_only : le classeur n'est
+    jamais chargé en entier). La première ligne est l'en-tête.
+    """
+    workbook = _openpyxl().load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(value) for value in next(rows, ())]
+        yield header
+        durations = {i for i, name in enumerate(header) if name in DURATION_COLUMNS}
+        for row in rows:
+            yield [_cell_text(value, i in durations, workbook.epoch) for i, value in enumerate(row)]
+    finally:
+        workbook.close()
+
+
+def _xlsx_frames(file, chunk_size):
+    # closing : le classeur est fermé même si la lecture est abandonnée en cours de route
+    with closing(_xlsx_rows(file)) as rows:
+        header = next(rows, [])
+        width = len(header)
+        chunk = []
+        for row in rows:
+            chunk.append((row + [""] * width)[:width])
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header, dtype=str)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, dtype=str)
+
+
+def _members(file, compression):
+    """Flux binaires décompressés, un par fichier CSV (plusieurs pour un zip mensuel)."""
+    if compression == "gzip":
+        yield gzip.GzipFile(fileobj=file, mode="rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise UnsupportedFormat("La lecture des fichiers .zst nécessite le paquet zstandard.") from e
+        yield io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+    elif compression == "zip":
+        with zipfile.ZipFile(file) as archive:
+            for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                    continue
+                if not info.filename.lower().endswith(".csv"):
+                    raise UnsupportedFormat(f"L'archive contient un fichier non CSV : « {info.filename} ».")
+                with archive.open(info) as member:
+                    yield member
+    else:
+        yield file
+
+
+def _arrow_source(file):
+    """Fichier local -> projection mémoire (memory map) ; sinon l'objet fichier tel quel."""
+    pa = _pyarrow()
+    path = getattr(getattr(file, "file", file), "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return pa.memory_map(path, "r")
+    return file
+
+
+def _arrow_frame(record_batch):
+    """RecordBatch -> DataFrame aux types attendus par parse_frame (voir _is_typed)."""
+    pa = _pyarrow()
+    columns = {}
+    for field, array in zip(record_batch.schema, record_batch.columns):
+        if pa.types.is_time(field.type):
+            # time32/time64 -> timedelta64 depuis minuit
+            unit = field.type.unit
+            columns[field.name] = pd.to_timedelta(array.cast(pa.int64()).to_pandas(), unit=unit)
+        elif pa.types.is_boolean(field.type):
+            columns[field.name] = array.fill_null(False).to_pandas()
+        elif pa.types.is_decimal(field.type):
+            columns[field.name] = array.cast(pa.float64()).to_pandas()
+        else:
+            columns[field.name] = array.to_pandas(date_as_object=False)
+    return pd.DataFrame(columns)
+
+
+def _record_batches(file, fmt, chunk_size):
+    pa = _pyarrow()
+    source = _arrow_source(file)
+    if fmt == "parquet":
+        yield from pa.parquet.ParquetFile(source).iter_batches(batch_size=chunk_size)
+        return
+    try:
+        reader = pa.ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        batches = pa.ipc.open_stream(source)  # format « stream » (sans pied de fichier)
+    for batch in batches:
+        # Les lots d'un fichier Arrow sont ceux de l'écrivain : on les redécoupe à chunk_size.
+        for start in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(start, chunk_size)
+
+
+def read_frames(file, fmt="csv", chunk_size=5000, skip=0, compression=None):
+    """
+    Lit le fichier par lots de `chunk_size` lignes, en sautant les `skip` premières lignes de
+    données (reprise). L'index de chaque DataFrame est le numéro de la ligne de données dans
+    le fichier (0 = première ligne après l'en-tête), comme pour un CSV.
+
+    Un fichier compressé est décompressé au fil de la lecture. Les CSV d'un zip sont lus à la
+    suite (par ordre de nom), chacun avec son en-tête : l'index (la reprise) court sur toute
+    l'archive, mais chaque ligne porte son fichier et son numéro de ligne dans ce fichier
+    (colonnes SOURCE_MEMBER_COLUMN et SOURCE_LINE_COLUMN), repris par les erreurs et la quarantaine.
+    Un classeur Excel est lu en flux (première feuille), chaque cellule remise en texte CSV.
+    """
+    if fmt == "csv" and not compression:
+        # skiprows garde l'en-tête (ligne 0) et saute les lignes déjà importées
+        for raw in pd.read_csv(file, chunksize=chunk_size, skiprows=range(1, skip + 1), **CSV_READ_OPTIONS):
+            raw.index = raw.index + skip
+            yield raw
+        return
+
+    if fmt in ("csv", "xlsx"):
+        # Flux décompressé ou classeur Excel : on ne connaît pas la taille de chaque membre, les
+        # lignes déjà importées sont donc relues puis écartées (sans aucune écriture en base).
+        position = 0
+        if fmt == "xlsx":
+            members = [("", _xlsx_frames(file, chunk_size))]
+        else:
+            members = (
+                (os.path.basename(member.name) if compression == "zip" else "",
+                 pd.read_csv(member, chunksize=chunk_size, **CSV_READ_OPTIONS))
+                for member in _members(file, compression)
+            )
+        for name, frames in members:
+            start = position
+            for raw in frames:
+                raw.index = pd.RangeIndex(position, position + len(raw))
+                if name:
+                    raw.insert(0, SOURCE_MEMBER_COLUMN, name)
+                    raw.insert(0, SOURCE_LINE_COLUMN, raw.index - start + 2)
+                position += len(raw)
+                if position > skip:
+                    yield raw[raw.index >= skip]
+        return
+
+    position = 0
+    for batch in _record_batches(file, fmt, chunk_size):
+        start, position = position, position + batch.num_rows
+        if position <= skip:
+            continue
+        if start < skip:
+            batch, start = batch.slice(skip - start), skip
+        frame = _arrow_frame(batch)
+        frame.index = pd.RangeIndex(start, start + len(frame))
+        yield frame
+
+
+def _csv_header(stream):
+    head = stream.read(4096).decode("utf-8-sig", errors="ignore").splitlines()[0]
+    return [c.strip().strip('"') for c in head.split(",")]
+
+
+def source_columns(file, fmt, compression=None):
+    """
+    En-têtes du fichier (validation du formulaire d'upload), sans lire les données : une liste
+    (nom, colonnes) par fichier CSV d'une archive zip, un seul élément sinon. Pour un fichier
+    compressé, seul le début du flux décompressé est lu. Le fichier est rembobiné.
+    """
+    if fmt == "xlsx":
+        # Seul l'en-tête est lu : le générateur est fermé aussitôt, et avec lui le classeur
+        with closing(_xlsx_rows(file)) as rows:
+            names = [(getattr(file, "name", ""), next(rows, []))]
+        file.seek(0)
+        return names
+    if fmt == "csv":
+        if compression == "zip":
+            names = [(os.path.basename(member.name), _csv_header(member)) for member in _members(file, compression)]
+        else:
+            names = [(getattr(file, "name", ""), _csv_header(next(_members(file, compression))))]
+        file.seek(0)
+        return names
+    pa = _pyarrow()
+    if fmt == "parquet":
+        schema = pa.parquet.read_schema(file)
+    else:
+        try:
+            schema = pa.ipc.open_file(file).schema
+        except pa.ArrowInvalid:
+            file.seek(0)
+            schema = pa.ipc.open_stream(file).schema
+    file.seek(0)
+    return [(getattr(file, "name", ""), schema.names)]
+
+
+# ─────────────────────────────────────────────
+# Écriture des partitions (import parallèle)
+# ─────────────────────────────────────────────
+class PartitionWriter:
+    """
+    Fichier temporaire d'une partition, dans le format de la source : une partition Parquet
+    ou Arrow reste typée et n'est jamais repassée par du texte.
+    """
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.file = tempfile.TemporaryFile(mode="w+b")
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._columns = None
+
+    def write(self, frame):
+        if frame.empty:
+            return
+        # Toutes les lignes suivent l'en-tête écrit au premier lot : un membre d'archive aux colonnes
+        # dans un autre ordre est réaligné, un membre aux colonnes différentes est refusé.
+        if self._columns is None:
+            self._columns = list(frame.columns)
+        elif set(frame.columns) != set(self._columns):
+            raise ValueError(
+                f"Colonnes incompatibles avec le premier fichier : {sorted(set(frame.columns) ^ set(self._columns))}"
+            )
+        else:
+            frame = frame.reindex(columns=self._columns)
+        if self.fmt == "csv":
+            if self._writer is None:
+                self._writer = io.TextIOWrapper(self.file, encoding="utf-8", newline="")
+            frame.to_csv(self._writer, header=(self.rows == 0), index=False)
+        else:
+            pa = _pyarrow()
+            if self._writer is None:
+                # Une colonne entièrement vide dans le premier lot serait de type « null » : texte.
+                schema = pa.Schema.from_pandas(frame, preserve_index=False)
+                self._schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+                new = pa.parquet.ParquetWriter if self.fmt == "parquet" else pa.ipc.new_file
+                self._writer = new(self.file, self._schema)
+            self._writer.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+        self.rows += len(frame)
+
+    def finish(self):
+        """Termine l'écriture et retourne le fichier rembobiné (prêt pour save_staged)."""
+        if self.fmt == "csv":
+            if self._writer is not None:
+                self._writer.flush()
+        elif self._writer is not None:
+            self._writer.close()
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        if self.fmt == "csv" and self._writer is not None:
+            self._writer.close()
+        self.file.close()
+
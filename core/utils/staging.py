@@ -0,0 +1,125 @@
+# ==============================================================================
+# FICHIER : core/utils/staging.py
+# (Zone de transit des fichiers d'import, dans le stockage Django configuré)
+# ==============================================================================
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from ..models import UploadSession
+from .sources import source_extension
+
+STAGING_DIR = "imports"
+
+
+def staging_name(batch_id, filename):
+    return f"{STAGING_DIR}/{batch_id}/{filename}"
+
+
+def save_staged(name, fileobj):
+    """Enregistre un fichier (objet fichier ouvert en binaire) et retourne son nom réel."""
+    return default_storage.save(name, File(fileobj))
+
+
+class _HashingReader:
+    """Enveloppe de lecture qui calcule le SHA-256 et la taille au fil de l'écriture."""
+
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+class _ConcatReader:
+    """Lecture séquentielle de plusieurs fichiers de la zone de transit, comme d'un seul."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.current = None
+
+    def read(self, size=-1):
+        while self.names or self.current:
+            if self.current is None:
+                self.current = open_staged(self.names.pop(0))
+            data = self.current.read(size)
+            if data:
+                return data
+            self.current.close()
+            self.current = None
+        return b""
+
+
+def file_checksum(fileobj, block_size=1024 * 1024):
+    """SHA-256 d'un fichier ouvert en binaire, lu par blocs ; le fichier est rembobiné."""
+    fileobj.seek(0)
+    sha256 = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        sha256.update(block)
+    fileobj.seek(0)
+    return sha256.hexdigest()
+
+
+def stage_stream(batch, fileobj, filename):
+    """
+    Copie un flux binaire dans la zone de transit, par blocs (jamais entièrement en mémoire),
+    et renseigne source, checksum et size sur l'ImportBatch.
+    """
+    reader = _HashingReader(fileobj)
+    # L'extension complète (ex. ".csv.gz") est gardée : elle indique le format et la compression.
+    extension = source_extension(filename) or ".csv"
+    batch.source = save_staged(staging_name(batch.id, f"source{extension}"), reader)
+    batch.checksum, batch.size = reader.sha256.hexdigest(), reader.size
+    batch.save(update_fields=["source", "checksum", "size", "updated_at"])
+    return batch
+
+
+def stage_upload(batch, uploaded_file):
+    uploaded_file.seek(0)
+    return stage_stream(batch, uploaded_file, uploaded_file.name)
+
+
+def stage_chunks(batch, names, filename):
+    """Assemble les morceaux d'un upload reprenable (dans l'ordre donné) en fichier source du lot."""
+    return stage_stream(batch, _ConcatReader(names), filename)
+
+
+def save_chunk(name, stream):
+    """Enregistre un morceau d'upload lu en flux ; retourne (nom réel, taille reçue)."""
+    reader = _HashingReader(stream)
+    return save_staged(name, reader), reader.size
+
+
+def open_staged(name):
+    return default_storage.open(name, "rb")
+
+
+def delete_staged(*names):
+    for name in names:
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def purge_upload_sessions(expiry_hours=None):
+    """
+    Supprime les sessions d'upload reprenable sans activité depuis `expiry_hours` heures
+    (UPLOAD_SESSION_EXPIRY_HOURS par défaut), avec leurs morceaux encore dans la zone de
+    transit : uploads abandonnés, mais aussi sessions terminées ou en échec. Le lot d'import
+    éventuel n'est pas touché. Retourne (sessions, morceaux) supprimés.
+    """
+    if expiry_hours is None:
+        expiry_hours = settings.UPLOAD_SESSION_EXPIRY_HOURS
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=expiry_hours))
+    names = [name for chunks in expired.values_list("chunks", flat=True) for _, name in chunks]
+    delete_staged(*names)
+    sessions, _ = expired.delete()
+    return sessions, len(names)
@@ -0,0 +1,69 @@
+# ==============================================================================
+# FICHIER : core/utils/validation.py
+# (Pré-validation complète du fichier, avant la mise en file de l'import)
+# ==============================================================================
+import time
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+
+from .metrics import stage_memory
+from .parsing import parse_frame
+from .sources import read_frames
+
+# Aucune écriture en base : on peut lire par gros lots, la mémoire reste bornée par le lot.
+VALIDATION_CHUNK_SIZE = 50_000
+VALIDATION_MAX_ERRORS = 20
+
+
+class ValidationSummary(NamedTuple):
+    rows: int  # lignes avec matricule (les lignes sans matricule sont ignorées par l'import)
+    date_min: date | None
+    date_max: date | None
+    matricules: int
+    error_count: int
+    errors: list  # au plus VALIDATION_MAX_ERRORS ParseError, par ordre de ligne
+    seconds: float
+    memory_mb: float  # hausse du pic de mémoire résidente pendant la validation (voir stage_memory)
+
+    @property
+    def ok(self):
+        return self.error_count == 0
+
+    def __str__(self):
+        periode = f" du {self.date_min:%d/%m/%Y} au {self.date_max:%d/%m/%Y}" if self.date_min else ""
+        return f"{self.rows} ligne(s){periode}, {self.matricules} matricule(s), {self.error_count} erreur(s)"
+
+
+def validate_rows(file, fmt="csv", compression=None, chunk_size=VALIDATION_CHUNK_SIZE, max_errors=VALIDATION_MAX_ERRORS):
+    """
+    Vérifie le type et les bornes de chaque ligne du fichier, par gros lots vectorisés (même
+    typage que l'import, sans aucune requête), et retourne un ValidationSummary. Le fichier
+    est rembobiné. Seuls les `max_errors` premiers exemples d'erreur sont conservés.
+    """
+    start = time.perf_counter()
+    rows, error_count, errors = 0, 0, []
+    date_min = date_max = None
+    matricules = set()
+    with stage_memory() as memory:
+        for raw in read_frames(file, fmt, chunk_size=chunk_size, compression=compression):
+            # Types et bornes : la même définition d'une ligne valide que l'import (parse_frame)
+            frame, chunk_errors = parse_frame(raw)
+            error_count += len(chunk_errors)
+            if len(errors) < max_errors:
+                errors.extend(sorted(chunk_errors, key=lambda e: e.position)[:max_errors - len(errors)])
+            # Comptés sur toutes les lignes avec matricule, valides ou non
+            mat = raw["MATRICULE"].fillna("").astype(str).str.strip().to_numpy() if "MATRICULE" in raw else np.array([], dtype=object)
+            mat = mat[mat != ""]
+            rows += len(mat)
+            matricules.update(np.unique(mat).tolist())
+            if not frame.empty:
+                lo, hi = frame["date"].min().date(), frame["date"].max().date()
+                date_min = min(date_min or lo, lo)
+                date_max = max(date_max or hi, hi)
+    file.seek(0)
+    return ValidationSummary(
+        rows, date_min, date_max, len(matricules), error_count, errors, time.perf_counter() - start,
+        memory["mb"],
+    )
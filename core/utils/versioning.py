@@ -0,0 +1,102 @@
+# ==============================================================================
+# FICHIER : core/utils/versioning.py
+# (Invalidation des caches en mémoire du processus via un numéro de version partagé)
+# ==============================================================================
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+def when_committed(func):
+    """
+    Exécute func maintenant, ou au commit si l'on est dans une transaction : une valeur lue ou
+    écrite dans une transaction qui sera annulée n'entre jamais dans un cache partagé.
+    """
+    if connection.in_atomic_block:
+        transaction.on_commit(func)
+    else:
+        func()
+
+
+class SharedVersion:
+    """
+    Numéro de version stocké dans le cache Django (Redis en production : commun au web et aux
+    workers). Un processus le relit au plus toutes les `check_seconds` secondes (par défaut
+    DIMENSION_CACHE_CHECK_SECONDS) : entre deux vérifications, son cache local sert sans requête.
+    """
+
+    def __init__(self, key, check_seconds=None):
+        self.key = key
+        self._check_seconds = check_seconds
+        self._seen = None
+        self._checked_at = None
+
+    @property
+    def check_seconds(self):
+        return settings.DIMENSION_CACHE_CHECK_SECONDS if self._check_seconds is None else self._check_seconds
+
+    def changed(self):
+        """Vrai si la version a changé depuis la dernière vérification (ou à la première)."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return False
+        self._checked_at = now
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid.uuid4().hex, None)
+            version = cache.get(self.key)
+        if version == self._seen:
+            return False
+        self._seen = version
+        return True
+
+    def reset(self):
+        """La prochaine vérification relit la version, quel que soit le délai écoulé."""
+        self._checked_at = None
+
+    def bump(self):
+        """Nouvelle version (au commit) : les autres processus se videront à leur prochaine vérification."""
+        when_committed(lambda: cache.set(self.key, uuid.uuid4().hex, None))
+
+
+class VersionedCache:
+    """
+    Une valeur par processus, calculée par `loader()` et recalculée quand la version partagée
+    change (invalidate() dans ce processus ou dans un autre). Une valeur lue dans une transaction
+    n'est conservée qu'au commit.
+    """
+
+    def __init__(self, key, loader, check_seconds=None):
+        self._version = SharedVersion(key, check_seconds)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+
+    def get(self):
+        with self._lock:
+            if self._version.changed():
+                self._value = None
+            if self._value is not None:
+                return self._value
+        value = self._loader()
+
+        def install():
+            with self._lock:
+                self._value = value
+
+        when_committed(install)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+            self._version.reset()
+
+    def invalidate(self, **kwargs):
+        self.clear()
+        self._version.bump()
+        when_committed(self.clear)
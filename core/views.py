@@ -2,33 +2,47 @@
 # FICHIER : core/views.py (Version finale, complète et organisée)
 # ==============================================================================
 import traceback
-import base64
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime, time, timedelta
 
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
 from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.template.loader import render_to_string
 from weasyprint import HTML
 
 # --- Imports des modèles et formulaires ---
-from .forms import CSVUploadForm
-from .models import Collaborateur, Anomalie, EmailHistory, Pointage, Direction, Departement
+from .forms import CSVUploadForm, DayUploadForm, validate_content, validate_source
+from .models import Collaborateur, Anomalie, EmailHistory, Pointage, ImportBatch, UploadSession
 
 # --- Imports des fonctions métier et de service ---
+from .utils.anomaly import parse_magnitude_query
+from .utils.day_import import DAY_KINDS
+from .utils.dimensions import dimension_cache
 from .utils.etl import import_csv
+from .utils.metrics import ImportMetrics
+from .utils.sources import UnsupportedFormat, detect_format
+from .utils.staging import (
+    delete_staged, open_staged, save_chunk, save_staged, stage_chunks, stage_upload, staging_name,
+)
 from analytics.services import generate_rh_dashboard_stats, generate_performance_dashboard_stats
-from .tasks import process_csv_import_task, send_email_task
+from .tasks import import_days_task, process_csv_import_task, reprocess_quarantine_task, send_email_task
 
 # ----------------------------
 # Constantes
 # ----------------------------
 PDF_EXPORT_LIMIT = 500  # Limite le nombre de lignes dans les exports PDF
+ANOMALY_PAGE_SIZE = 50  # Pointages par page de la liste des anomalies
+QUARANTINE_DISPLAY_LIMIT = 200  # Lignes en quarantaine affichées sur la page d'un import
 
 # ----------------------------
 # Fonctions de vérification des permissions
@@ -56,34 +70,251 @@ def rh_dashboard(request):
     context = generate_rh_dashboard_stats()
     return render(request, "core/rh_dashboard.html", context)
 
+def enqueue_import(batch, force=False):
+    """
+    Lance l'import d'un lot déjà en zone de transit. Si un fichier identique a déjà été importé
+    (et que force est faux), le lot est abandonné et le lot précédent est retourné.
+    """
+    previous = batch.previous_upload()
+    if previous and not force:
+        delete_staged(batch.source)
+        batch.delete()
+        return previous
+    if previous:
+        batch.duplicate_of = previous
+        batch.save(update_fields=['duplicate_of', 'updated_at'])
+    process_csv_import_task.delay(str(batch.id))
+    return None
+
+def validation_metrics(summary):
+    """Métriques initiales du lot : l'étape de pré-validation, faite avant la mise en file."""
+    metrics = ImportMetrics()
+    metrics.add("validate", summary.seconds, summary.rows, 0, summary.memory_mb)
+    return metrics.as_dict()
+
+def duplicate_message(previous):
+    return (
+        f"Ce fichier a déjà été importé le {previous.created_at:%d/%m/%Y à %H:%M}. "
+        "Cochez « Forcer la réimportation » pour le traiter à nouveau."
+    )
+
 @login_required
 @user_passes_test(is_rh)
 def upload_csv(request):
     """Gère l'upload de CSV et lance la tâche de traitement en arrière-plan."""
     if request.method == 'POST':
         form = CSVUploadForm(request.POST, request.FILES)
-        if form.is_valid():
+        if form.is_valid() and form.previous:
+            # Fichier déjà importé : détecté avant la validation complète, aucun lot n'est créé
+            messages.warning(request, duplicate_message(form.previous))
+            return redirect('core:import_batch_detail', batch_id=form.previous.id)
+        elif form.is_valid():
             csv_file = form.cleaned_data['file']
             try:
-                file_content_b64 = base64.b64encode(csv_file.read()).decode('utf-8')
-                process_csv_import_task.delay(
-                    file_content_b64, request.user.id, csv_file.name
+                # Le lot est créé ici pour que la tâche (et ses reprises) travaille toujours sur le même.
+                # Le fichier est copié par blocs dans la zone de transit : seul l'id du lot part dans Celery.
+                batch = ImportBatch.objects.create(
+                    uploaded_by=request.user, filename=csv_file.name, lenient=form.cleaned_data['lenient'],
+                    metrics=validation_metrics(form.summary),
                 )
-                messages.success(request, "Fichier reçu. Le traitement a commencé en arrière-plan.")
+                stage_upload(batch, csv_file)
+                previous = enqueue_import(batch, form.cleaned_data['force'])
+                if previous:
+                    messages.warning(request, duplicate_message(previous))
+                    return redirect('core:import_batch_detail', batch_id=previous.id)
+                messages.success(request, f"Fichier reçu ({form.summary}). Le traitement a commencé en arrière-plan.")
                 return redirect('core:liste_anomalies')
             except Exception as e:
                 messages.error(request, f"Une erreur est survenue avant le traitement : {e}")
     else:
         form = CSVUploadForm()
-    return render(request, 'core/upload_csv.html', {'form': form})
+    recent_batches = ImportBatch.objects.select_related('uploaded_by').order_by('-created_at')[:10]
+    return render(request, 'core/upload_csv.html', {
+        'form': form, 'recent_batches': recent_batches, 'upload_chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'day_kinds': [(kind, spec.label) for kind, spec in DAY_KINDS.items()],
+    })
 
 @login_required
 @user_passes_test(is_rh)
-def liste_anomalies(request):
-    """Affiche la liste des anomalies avec options de filtrage."""
-    pointages_qs = Pointage.objects.filter(anomalies__isnull=False).distinct()
-    filters = request.GET
-    
+@require_POST
+def upload_days(request, kind):
+    """Import en masse des congés ou du télétravail planifié, traité en arrière-plan."""
+    if kind not in DAY_KINDS:
+        raise Http404("Type de fichier inconnu.")
+    form = DayUploadForm(request.POST, request.FILES)
+    if form.is_valid():
+        f = form.cleaned_data['file']
+        source = save_staged(staging_name(uuid.uuid4(), f.name), f)
+        import_days_task.delay(kind, source)
+        messages.success(request, f"Fichier de {DAY_KINDS[kind].label} reçu. L'import a commencé en arrière-plan.")
+    else:
+        for error in form.errors.get('file', []):
+            messages.error(request, error)
+    return redirect('core:upload_csv')
+
+# ----------------------------
+# Upload reprenable (par morceaux)
+# ----------------------------
+def upload_session_state(session):
+    state = {
+        "id": str(session.id), "offset": session.received, "size": session.size,
+        "status": session.status, "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+    }
+    if session.error:
+        state["error"] = session.error
+    if session.batch_id:
+        state["batch_url"] = reverse('core:import_batch_detail', args=[session.batch_id])
+    return state
+
+@login_required
+@user_passes_test(is_rh)
+@require_POST
+def upload_session_create(request):
+    """Ouvre un upload reprenable : POST filename, size (octets), lenient, force."""
+    filename = request.POST.get('filename', '')
+    try:
+        size = int(request.POST.get('size', ''))
+        detect_format(filename)
+    except ValueError as e:
+        return JsonResponse({"error": str(e) if isinstance(e, UnsupportedFormat) else "Taille invalide."}, status=400)
+    if size <= 0:
+        return JsonResponse({"error": "Le fichier est vide."}, status=400)
+    if size > settings.UPLOAD_MAX_SIZE:
+        return JsonResponse(
+            {"error": f"Fichier trop volumineux (maximum {settings.UPLOAD_MAX_SIZE // 1024 ** 2} Mo)."}, status=413
+        )
+    session = UploadSession.objects.create(
+        created_by=request.user, filename=filename, size=size,
+        lenient=request.POST.get('lenient') in ('1', 'true', 'on'), force=request.POST.get('force') in ('1', 'true', 'on'),
+    )
+    return JsonResponse(upload_session_state(session), status=201)
+
+@login_required
+@user_passes_test(is_rh)
+def upload_session_chunk(request, session_id):
+    """
+    GET : état de l'upload (offset à partir duquel reprendre).
+    PUT : un morceau brut (corps de la requête), à l'offset donné par l'en-tête Upload-Offset.
+    Un morceau à un autre offset que celui attendu est refusé (409) avec l'offset courant.
+    Le dernier morceau déclenche l'assemblage, la validation des en-têtes et l'import.
+    """
+    session = get_object_or_404(UploadSession, id=session_id, created_by=request.user)
+    if request.method == 'GET':
+        return JsonResponse(upload_session_state(session))
+    if request.method != 'PUT':
+        return HttpResponseNotAllowed(['GET', 'PUT'])
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session.id)
+        if session.status != UploadSession.OPEN:
+            return JsonResponse(upload_session_state(session), status=409)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return JsonResponse({"error": "En-tête Upload-Offset manquant."}, status=400)
+        if offset != session.received:
+            return JsonResponse(upload_session_state(session), status=409)
+
+        # Le corps est lu en flux (jamais request.body : pas de limite DATA_UPLOAD_MAX_MEMORY_SIZE)
+        name, received = save_chunk(staging_name(session.id, f"chunk-{offset:015d}"), request)
+        expected = int(request.headers.get('Content-Length') or received)
+        if received != expected or offset + received > session.size:
+            delete_staged(name)
+            return JsonResponse({"error": "Morceau incomplet ou trop long.", **upload_session_state(session)}, status=400)
+        session.chunks.append([offset, name])
+        session.received += received
+        session.save(update_fields=['chunks', 'received', 'updated_at'])
+
+    if session.received == session.size:
+        return complete_upload_session(request, session)
+    return JsonResponse(upload_session_state(session))
+
+def complete_upload_session(request, session):
+    """Assemble les morceaux dans la zone de transit, valide le fichier puis lance l'import."""
+    names = [name for _, name in sorted(session.chunks)]
+    batch = ImportBatch.objects.create(uploaded_by=request.user, filename=session.filename, lenient=session.lenient)
+    stage_chunks(batch, names, session.filename)
+    delete_staged(*names)
+    previous = None if session.force else batch.previous_upload()
+    if previous:
+        # Doublon : ni validation ni import, la session renvoie au lot existant
+        delete_staged(batch.source)
+        batch.delete()
+        return finish_upload_session(session, batch, previous)
+    try:
+        with open_staged(batch.source) as f:
+            validate_source(f, batch.source)
+            summary = validate_content(f, batch.source, session.lenient)
+    except ValidationError as e:
+        delete_staged(batch.source)
+        batch.delete()
+        session.status, session.error = UploadSession.FAILED, " ".join(e.messages)
+        session.save(update_fields=['status', 'error', 'updated_at'])
+        return JsonResponse(upload_session_state(session), status=400)
+
+    batch.metrics = validation_metrics(summary)
+    batch.save(update_fields=['metrics', 'updated_at'])
+    return finish_upload_session(session, batch, enqueue_import(batch, session.force))
+
+def finish_upload_session(session, batch, previous):
+    """Clôt la session : sur le lot lancé, ou sur le lot précédent si le fichier est un doublon."""
+    session.status = UploadSession.DONE
+    session.batch = previous or batch
+    if previous:
+        session.error = duplicate_message(previous)
+    session.save(update_fields=['status', 'batch', 'error', 'updated_at'])
+    return JsonResponse(upload_session_state(session), status=200 if previous else 201)
+
+@login_required
+@user_passes_test(is_rh)
+def import_batch_detail(request, batch_id):
+    """Affiche l'état d'un import et ses métriques par étape (temps, débit, mémoire, requêtes)."""
+    batch = get_object_or_404(ImportBatch.objects.select_related('uploaded_by', 'duplicate_of'), id=batch_id)
+    metrics = ImportMetrics(batch.metrics)
+    labels = dict(Anomalie.TYPE_CHOICES)
+    context = {
+        "batch": batch,
+        "stages": metrics.report(),
+        "anomaly_counts": sorted(
+            ((labels.get(code, code), n) for code, n in metrics.anomalies.items()), key=lambda item: -item[1]
+        ),
+        # Coût de chaque règle de détection (voir AnomalyRule)
+        "rule_costs": [{"label": labels.get(code, code), **values} for code, values in metrics.rules.items()],
+        "partitions": batch.partitions.order_by('index'),
+        "quarantine": batch.quarantine.all()[:QUARANTINE_DISPLAY_LIMIT],
+    }
+    return render(request, 'core/import_batch.html', context)
+
+@login_required
+@user_passes_test(is_rh)
+@require_POST
+def reprocess_quarantine(request, batch_id):
+    """Relance l'import des seules lignes en quarantaine du lot, une fois corrigées."""
+    batch = get_object_or_404(ImportBatch, id=batch_id)
+    if batch.quarantine.exists():
+        reprocess_quarantine_task.delay(str(batch.id))
+        messages.success(request, "Re-traitement des lignes en quarantaine lancé en arrière-plan.")
+    else:
+        messages.info(request, "Aucune ligne en quarantaine pour cet import.")
+    return redirect('core:import_batch_detail', batch_id=batch.id)
+
+def day_range(day, days=1):
+    """
+    Bornes [début, fin) des `days` jours locaux à partir de `day`, pour filtrer un DateTimeField
+    par plage : contrairement à __date, la comparaison reste directe et profite de l'index.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+
+def filter_anomaly_pointages(filters):
+    """
+    Pointages présentant des anomalies, filtrés selon les paramètres de la liste (liste, envoi
+    groupé, export PDF). Les filtres "a des anomalies" et "type" portent sur Pointage.anomaly_mask
+    (indexé) : ni jointure sur les anomalies ni DISTINCT ; une durée dans la recherche libre
+    (parse_magnitude_query) passe par une sous-requête EXISTS sur l'ampleur.
+    """
+    pointages_qs = Pointage.objects.filter(anomaly_mask__gt=0)
+
     start_date = filters.get('start', '')
     end_date = filters.get('end', '')
     matricule = filters.get('matricule', '')
@@ -95,18 +326,48 @@ def liste_anomalies(request):
     if start_date: pointages_qs = pointages_qs.filter(date__gte=start_date)
     if end_date: pointages_qs = pointages_qs.filter(date__lte=end_date)
     if matricule: pointages_qs = pointages_qs.filter(collaborateur__matricule__icontains=matricule)
-    if anomaly_type: pointages_qs = pointages_qs.filter(anomalies__type=anomaly_type)
+    if anomaly_type in Anomalie.TYPE_BITS: pointages_qs = pointages_qs.filter(anomaly_mask__in=Anomalie.masks_with(anomaly_type))
     if direction_id: pointages_qs = pointages_qs.filter(collaborateur__direction_id=direction_id)
     if departement_id: pointages_qs = pointages_qs.filter(collaborateur__departement_id=departement_id)
     if query:
-        pointages_qs = pointages_qs.filter(
-            Q(collaborateur__nom__icontains=query) | Q(collaborateur__prenom__icontains=query) | Q(anomalies__detail__icontains=query)
-        ).distinct()
+        # Le détail n'est plus stocké (il est rendu depuis l'ampleur) : le texte porte sur le nom,
+        # le prénom et le libellé des types (masque) ; une durée saisie devient un seuil d'ampleur.
+        text, min_magnitude = parse_magnitude_query(query)
+        types = [code for code, label in Anomalie.TYPE_CHOICES if text and text.lower() in label.lower()]
+        if text:
+            pointages_qs = pointages_qs.filter(
+                Q(collaborateur__nom__icontains=text) | Q(collaborateur__prenom__icontains=text)
+                | Q(anomaly_mask__in=sorted({mask for code in types for mask in Anomalie.masks_with(code)}))
+            )
+        if min_magnitude is not None:
+            ampleurs = Anomalie.objects.filter(pointage=OuterRef('pk'), magnitude__gte=min_magnitude)
+            if types:
+                ampleurs = ampleurs.filter(type__in=types)
+            pointages_qs = pointages_qs.filter(Exists(ampleurs))
+    return pointages_qs
+
+@login_required
+@user_passes_test(is_rh)
+def liste_anomalies(request):
+    """Affiche la liste des anomalies avec options de filtrage."""
+    filters = request.GET
+    pointages_qs = filter_anomaly_pointages(filters)
 
+    paginator = Paginator(
+        pointages_qs.select_related("collaborateur__departement", "collaborateur__direction").prefetch_related('anomalies').order_by('-date', 'id'),
+        ANOMALY_PAGE_SIZE,
+    )
+    page_obj = paginator.get_page(filters.get('page'))
+    # Filtres de la page, encodés pour les liens de pagination (recherche libre avec « & », « + »...)
+    params = filters.copy()
+    params.pop('page', None)
+    dimensions = dimension_cache.dimensions()
     context = {
-        "pointages": pointages_qs.select_related("collaborateur__departement", "collaborateur__direction").prefetch_related('anomalies').order_by('-date'),
-        "directions": Direction.objects.all(),
-        "departements": Departement.objects.all(),
+        "pointages": page_obj,
+        "page_obj": page_obj,
+        "query": params.urlencode(),
+        "directions": dimensions.direction_list,
+        "departements": dimensions.departement_list,
         "anomalie_types": Anomalie.TYPE_CHOICES,
         "filters": filters
     }
@@ -134,32 +395,13 @@ def send_single_email(request, pointage_id):
 @require_POST
 def send_pending_emails(request):
     """Met en file d'attente Celery les emails pour tous les pointages filtrés."""
-    pointages_qs = Pointage.objects.filter(anomalies__isnull=False).distinct()
     filters = request.GET
+    pointages_qs = filter_anomaly_pointages(filters)
     
-    start_date = filters.get('start', '')
-    end_date = filters.get('end', '')
-    matricule = filters.get('matricule', '')
-    anomaly_type = filters.get('type', '')
-    direction_id = filters.get('direction', '')
-    departement_id = filters.get('departement', '')
-    query = filters.get('q', '')
-
-    if start_date: pointages_qs = pointages_qs.filter(date__gte=start_date)
-    if end_date: pointages_qs = pointages_qs.filter(date__lte=end_date)
-    if matricule: pointages_qs = pointages_qs.filter(collaborateur__matricule__icontains=matricule)
-    if anomaly_type: pointages_qs = pointages_qs.filter(anomalies__type=anomaly_type)
-    if direction_id: pointages_qs = pointages_qs.filter(collaborateur__direction_id=direction_id)
-    if departement_id: pointages_qs = pointages_qs.filter(collaborateur__departement_id=departement_id)
-    if query:
-        pointages_qs = pointages_qs.filter(
-            Q(collaborateur__nom__icontains=query) | Q(collaborateur__prenom__icontains=query) | Q(anomalies__detail__icontains=query)
-        ).distinct()
-    
-    pointages_a_notifier = pointages_qs.exclude(email_history__status="SENT")
+    pointages_a_notifier = pointages_qs.exclude(email_history__status="SENT").order_by().values_list('id', flat=True)
     task_count = 0
-    for pointage in pointages_a_notifier:
-        send_email_task.delay(pointage.id)
+    for pointage_id in pointages_a_notifier.iterator():
+        send_email_task.delay(pointage_id)
         task_count += 1
     
     if task_count > 0:
@@ -200,10 +442,8 @@ def historique_emails(request):
         if date_query_str:
             print(f"Filtrage par Date : '{date_query_str}'")
             try:
-                # On crée un objet datetime au début de la journée
-                start_of_day = datetime.strptime(date_query_str, '%Y-%m-%d')
-                # On crée un objet datetime à la fin de la journée
-                end_of_day = start_of_day + timedelta(days=1)
+                # Plage [début de la journée, lendemain) en heure locale
+                start_of_day, end_of_day = day_range(datetime.strptime(date_query_str, '%Y-%m-%d').date())
                 
                 # On filtre sur la plage de 24h
                 historiques_list = historiques_list.filter(created_at__gte=start_of_day, created_at__lt=end_of_day)
@@ -215,8 +455,7 @@ def historique_emails(request):
         if week_query_str:
             try:
                 year_str, week_str = week_query_str.split('-W')
-                start_of_week = datetime.fromisocalendar(int(year_str), int(week_str), 1)
-                end_of_week = start_of_week + timedelta(days=7)
+                start_of_week, end_of_week = day_range(datetime.fromisocalendar(int(year_str), int(week_str), 1).date(), days=7)
                 historiques_list = historiques_list.filter(created_at__gte=start_of_week, created_at__lt=end_of_week)
             except: pass
 
@@ -244,31 +483,14 @@ def statistiques_view(request):
 @user_passes_test(is_rh)
 def export_anomalies_pdf(request):
     """Génère un export PDF des anomalies filtrées."""
-    pointages_qs = Pointage.objects.filter(anomalies__isnull=False).distinct()
     filters = request.GET
+    pointages_qs = filter_anomaly_pointages(filters)
     
-    start_date = filters.get('start', '')
-    end_date = filters.get('end', '')
-    matricule = filters.get('matricule', '')
-    anomaly_type = filters.get('type', '')
-    direction_id = filters.get('direction', '')
-    departement_id = filters.get('departement', '')
-    query = filters.get('q', '')
-
-    if start_date: pointages_qs = pointages_qs.filter(date__gte=start_date)
-    if end_date: pointages_qs = pointages_qs.filter(date__lte=end_date)
-    if matricule: pointages_qs = pointages_qs.filter(collaborateur__matricule__icontains=matricule)
-    if anomaly_type: pointages_qs = pointages_qs.filter(anomalies__type=anomaly_type)
-    if direction_id: pointages_qs = pointages_qs.filter(collaborateur__direction_id=direction_id)
-    if departement_id: pointages_qs = pointages_qs.filter(collaborateur__departement_id=departement_id)
-    if query:
-        pointages_qs = pointages_qs.filter(
-            Q(collaborateur__nom__icontains=query) | Q(collaborateur__prenom__icontains=query) | Q(anomalies__detail__icontains=query)
-        ).distinct()
-    
-    pointages_filtres = pointages_qs.order_by('-date')
+    pointages_filtres = pointages_qs.order_by('-date', 'id')
     total_results = pointages_filtres.count()
-    pointages_a_exporter = pointages_filtres[:PDF_EXPORT_LIMIT]
+    pointages_a_exporter = pointages_filtres.select_related(
+        "collaborateur__departement", "collaborateur__direction"
+    ).prefetch_related('anomalies')[:PDF_EXPORT_LIMIT]
     
     context = {
         'pointages': pointages_a_exporter,
@@ -301,15 +523,15 @@ def export_email_pdf(request):
         
     elif mode == 'date' and date_val:
         try:
-            date_query = datetime.strptime(date_val, '%Y-%m-%d').date()
-            historiques_list = historiques_list.filter(created_at__date=date_query)
+            # Plage de datetimes plutôt que created_at__date : la comparaison utilise l'index
+            start_of_day, end_of_day = day_range(datetime.strptime(date_val, '%Y-%m-%d').date())
+            historiques_list = historiques_list.filter(created_at__gte=start_of_day, created_at__lt=end_of_day)
         except (ValueError, TypeError): pass
     elif mode == 'week' and week_val:
         try:
             year, week_num_str = week_val.split('-W')
-            start_of_week = datetime.fromisocalendar(int(year), int(week_num_str), 1).date()
-            end_of_week = start_of_week + timedelta(days=6)
-            historiques_list = historiques_list.filter(created_at__date__range=[start_of_week, end_of_week])
+            start_of_week, end_of_week = day_range(datetime.fromisocalendar(int(year), int(week_num_str), 1).date(), days=7)
+            historiques_list = historiques_list.filter(created_at__gte=start_of_week, created_at__lt=end_of_week)
         except (ValueError, TypeError): pass
 
     emails_filtres = historiques_list
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # ==========================
 # Répertoires de base
 # ==========================
@@ -167,5 +169,45 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
-
-
+# Tâches périodiques (worker lancé avec -B, ou processus celery beat dédié)
+CELERY_BEAT_SCHEDULE = {
+    "purge-upload-sessions": {"task": "core.tasks.purge_upload_sessions_task", "schedule": 3600.0},
+}
+
+# Import parallèle : nombre de partitions (par matricule) traitées en parallèle par les
+# workers Celery. 1 = import séquentiel dans une seule tâche.
+IMPORT_PARTITIONS = int(os.getenv("IMPORT_PARTITIONS", "1"))
+
+
+
+# Upload reprenable : taille (octets) des morceaux envoyés par le client pour les gros fichiers,
+# taille totale maximale annoncée à l'ouverture d'une session, et délai (heures) sans nouveau
+# morceau après lequel une session est purgée avec ses morceaux (purge_upload_sessions).
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(5 * 1024 * 1024)))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(2 * 1024 ** 3)))
+UPLOAD_SESSION_EXPIRY_HOURS = float(os.getenv("UPLOAD_SESSION_EXPIRY_HOURS", "24"))
+
+# Cache Django : Redis en production (partagé entre le web et les workers Celery, nécessaire
+# pour le numéro de version du cache de dimensions), mémoire locale en développement seulement.
+# Un cache local à chaque processus laisserait les partitions d'un import parallèle et le web
+# sur des versions différentes : il est refusé hors DEBUG et dès que IMPORT_PARTITIONS > 1.
+if os.getenv("CACHE_URL"):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.getenv("CACHE_URL")}}
+elif IN_BUILD_MODE or (DEBUG and IMPORT_PARTITIONS <= 1):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    raise ImproperlyConfigured(
+        "CACHE_URL est requis (cache partagé entre le web et les workers) quand DEBUG=False ou IMPORT_PARTITIONS > 1."
+    )
+
+# Cache de dimensions (core.utils.dimensions) : taille du LRU des collaborateurs et délai
+# maximal (secondes) avant qu'un processus voie une écriture faite par un autre.
+DIMENSION_CACHE_MAX_COLLABORATEURS = int(os.getenv("DIMENSION_CACHE_MAX_COLLABORATEURS", "100000"))
+DIMENSION_CACHE_CHECK_SECONDS = float(os.getenv("DIMENSION_CACHE_CHECK_SECONDS", "5"))
+
+# Calendrier ouvré précalculé (core.utils.business_calendar) : années couvertes par le tableau
+# jour par jour (une date hors période reste correcte, calculée à la volée) et jours de week-end
+# (0 = lundi).
+CALENDAR_FIRST_YEAR = int(os.getenv("CALENDAR_FIRST_YEAR", "2015"))
+CALENDAR_LAST_YEAR = int(os.getenv("CALENDAR_LAST_YEAR", "2035"))
+CALENDAR_WEEKEND_DAYS = (5, 6)
@@ -1,14 +1,14 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Count, Prefetch
-from core.models import Anomalie, EmailHistory, Collaborateur, Pointage
+from core.models import Anomalie, AnomalyDailyStat, EmailHistory, Collaborateur, Pointage
 
 # managers/views.py
 # Fichier : managers/views.py
 
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from core.models import Collaborateur, Pointage, Departement
 
 def is_manager(user):
@@ -29,10 +29,9 @@ def manager_dashboard(request):
     total_collaborateurs = collaborateurs_actuels_equipe.count()
 
     # 3. Identifier les collaborateurs (actuels ou passés) ayant eu des anomalies DANS CES DÉPARTEMENTS
-    collaborateurs_avec_anomalies = Collaborateur.objects.filter(
-        pointage__anomalies__isnull=False,
-        pointage__departement__in=departements_equipe
-    ).distinct()
+    # (résumé Pointage.anomaly_count : pas de jointure sur les anomalies)
+    pointages_anormaux = Pointage.objects.filter(departement__in=departements_equipe, anomaly_count__gt=0)
+    collaborateurs_avec_anomalies = Collaborateur.objects.filter(id__in=pointages_anormaux.values('collaborateur_id'))
     
     nombre_avec_anomalies = collaborateurs_avec_anomalies.count()
     
@@ -46,8 +45,8 @@ def manager_dashboard(request):
     # 5. Préparer les données pour le graphique et la liste
     # On annote les collaborateurs avec le compte de leurs anomalies UNIQUEMENT dans les départements du manager
     collaborateurs_par_anomalie = collaborateurs_avec_anomalies.annotate(
-        total_anomalies=Count(
-            'pointage__anomalies', 
+        total_anomalies=Sum(
+            'pointage__anomaly_count', 
             filter=Q(pointage__departement__in=departements_equipe)
         )
     ).order_by('-total_anomalies')
@@ -68,12 +67,14 @@ def team_anomalies_list(request):
     """
     Affiche un dashboard interactif des anomalies pour l'équipe du manager.
     """
-    # 1. Identifier les collaborateurs de l'équipe
+    # 1. Identifier les collaborateurs de l'équipe et les départements gérés
     collaborateurs_equipe = Collaborateur.objects.filter(departement__manager=request.user)
+    departements_equipe = Departement.objects.filter(manager=request.user)
     
-    # 2. Récupérer la base de toutes les anomalies de l'équipe
+    # 2. Récupérer la base de toutes les anomalies de l'équipe : celles des pointages rattachés aux
+    #    départements du manager (même périmètre que le cube et que manager_dashboard)
     anomalies_equipe_qs = Anomalie.objects.filter(
-        pointage__collaborateur__in=collaborateurs_equipe
+        pointage__departement__in=departements_equipe
     ).select_related('pointage__collaborateur')
 
     # 3. Appliquer les filtres de la page
@@ -81,25 +82,43 @@ def team_anomalies_list(request):
     selected_collab_id = filters.get('collaborateur')
     start_date = filters.get('start_date')
 
+    pointages_equipe = Pointage.objects.filter(departement__in=departements_equipe, anomaly_mask__gt=0)
+    cellules = AnomalyDailyStat.objects.filter(departement__in=departements_equipe)
     if selected_collab_id:
         anomalies_equipe_qs = anomalies_equipe_qs.filter(pointage__collaborateur_id=selected_collab_id)
+        pointages_equipe = pointages_equipe.filter(collaborateur_id=selected_collab_id)
     if start_date:
         try:
             anomalies_equipe_qs = anomalies_equipe_qs.filter(pointage__date__gte=start_date)
+            pointages_equipe = pointages_equipe.filter(date__gte=start_date)
+            cellules = cellules.filter(date__gte=start_date)
         except: pass # Ignorer les dates invalides
 
-    # 4. Calculer les KPIs basés sur la sélection filtrée
-    total_anomalies_filtrees = anomalies_equipe_qs.count()
+    # 4. Calculer les KPIs basés sur la sélection filtrée. Pour toute l'équipe, ils sont lus dans les
+    #    cellules du cube (jour, département, type) ; le cube ne porte pas le collaborateur, la
+    #    sélection d'un collaborateur retombe donc sur le résumé de ses pointages (masque : un
+    #    pointage porte au plus une anomalie de chaque type).
+    if selected_collab_id:
+        kpis = pointages_equipe.aggregate(
+            **{code: Count('id', filter=Q(anomaly_mask__in=Anomalie.masks_with(code))) for code in Anomalie.TYPE_BITS},
+        )
+    else:
+        kpis = {code: 0 for code in Anomalie.TYPE_BITS}
+        kpis.update(cellules.values_list('type').annotate(total=Sum('count')).order_by())
+    total_anomalies_filtrees = sum(kpis.values())
     
-    type_plus_frequent_query = anomalies_equipe_qs.values('type').annotate(count=Count('type')).order_by('-count').first()
-    type_plus_frequent = dict(Anomalie.TYPE_CHOICES).get(type_plus_frequent_query['type']) if type_plus_frequent_query else "N/A"
+    type_plus_frequent_code = max(kpis, key=kpis.get) if total_anomalies_filtrees else None
+    type_plus_frequent = dict(Anomalie.TYPE_CHOICES).get(type_plus_frequent_code, "N/A")
 
     # 5. Préparer les données pour le graphique (collaborateurs avec le plus d'anomalies)
-    chart_data = list(anomalies_equipe_qs
-        .values('pointage__collaborateur__prenom', 'pointage__collaborateur__nom')
-        .annotate(count=Count('id'))
+    chart_data = [
+        {'pointage__collaborateur__prenom': row['collaborateur__prenom'],
+         'pointage__collaborateur__nom': row['collaborateur__nom'], 'count': row['count']}
+        for row in pointages_equipe
+        .values('collaborateur_id', 'collaborateur__prenom', 'collaborateur__nom')
+        .annotate(count=Sum('anomaly_count'))
         .order_by('-count')[:10] # Top 10
-    )
+    ]
     
     context = {
         'anomalies': anomalies_equipe_qs.order_by('-pointage__date', 'pointage__collaborateur__nom'),